@@ -0,0 +1,213 @@
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import Executor
+from typing import List
+
+import numpy as np
+import onnxruntime as ort
+
+from .metrics import observe_inference
+
+
+class BatchStats:
+    """
+    Running statistics for a MicroBatcher: batch size distribution and
+    time spent waiting in the queue before dispatch.
+    """
+
+    def __init__(self, window: int = 1024):
+        self.batches_total = 0
+        self.items_total = 0
+        self.errors_total = 0
+        self.batch_sizes = {}
+        self._waits_ms = deque(maxlen=window)
+
+    def record(self, batch_size: int, waits_ms: List[float]):
+        self.batches_total += 1
+        self.items_total += batch_size
+        self.batch_sizes[batch_size] = self.batch_sizes.get(batch_size, 0) + 1
+        self._waits_ms.extend(waits_ms)
+
+    def snapshot(self) -> dict:
+        waits = np.asarray(self._waits_ms, dtype=np.float64)
+        return {
+            "batches_total": self.batches_total,
+            "items_total": self.items_total,
+            "errors_total": self.errors_total,
+            "avg_batch_size": self.items_total / self.batches_total if self.batches_total else 0.0,
+            "batch_size_counts": {str(k): v for k, v in sorted(self.batch_sizes.items())},
+            "queue_wait_ms": {
+                "mean": float(waits.mean()) if waits.size else 0.0,
+                "p95": float(np.percentile(waits, 95)) if waits.size else 0.0,
+                "max": float(waits.max()) if waits.size else 0.0,
+            },
+        }
+
+
+class MicroBatcher:
+    """
+    Collect concurrent single-frame inference requests against one ONNX session
+    into NCHW batches.
+
+    A batch is dispatched as soon as it holds `max_batch_size` frames or the
+    oldest queued frame has waited `max_wait_ms`. Outputs are split back along
+    the batch axis so each caller gets results shaped like a batch of one.
+
+    Batches run on `executor` (the default loop executor if None). When the
+    session is a SessionPool, up to `pool.size` batches (or `max_concurrency`,
+    for pools that are still being filled) are in flight at once.
+    `name` labels the batcher's inference metrics.
+
+    Frames are stacked into reused batch buffers, and with `io_binding` the
+    session writes its outputs straight into numpy arrays (see
+    model_loader.run_bound).
+    """
+
+    def __init__(self, session: ort.InferenceSession, max_batch_size: int = 8, max_wait_ms: float = 5.0, executor: Executor = None,
+                 name: str = "model", max_concurrency: int = None, io_binding: bool = False):
+        self.session = session
+        self.io_binding = io_binding and hasattr(session, "run_bound")
+        self.name = name
+        self.executor = executor
+        self.max_concurrency = max_concurrency or getattr(session, "size", 1)
+        self.input_name = session.get_inputs()[0].name
+
+        # Models exported with a fixed batch dimension cannot take larger batches
+        batch_dim = session.get_inputs()[0].shape[0]
+        if isinstance(batch_dim, int) and batch_dim > 0:
+            max_batch_size = min(max_batch_size, batch_dim)
+
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self.stats = BatchStats()
+
+        self._queue: asyncio.Queue = None
+        self._worker: asyncio.Task = None
+        self._slots: asyncio.Semaphore = None
+        self._in_flight = set()
+        self._buffers = {}  # (frame shape, dtype) -> free batch buffers; only touched on the event loop
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+        while self._queue is not None and not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Inference batcher stopped"))
+
+    async def submit(self, input_tensor: np.ndarray) -> List[np.ndarray]:
+        """
+        Queue one preprocessed frame (1xCxHxW or CxHxW) and wait for its outputs.
+
+        Returns:
+            List of model outputs, each with a leading batch dimension of 1.
+        """
+        if self._worker is None:
+            raise RuntimeError("Inference batcher is not running")
+
+        if input_tensor.ndim == 3:
+            input_tensor = input_tensor[np.newaxis]
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((input_tensor, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self) -> list:
+        batch = [await self._queue.get()]
+        deadline = batch[0][2] + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                # Take whatever is already queued, but don't wait any longer
+                while len(batch) < self.max_batch_size and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+
+            # Frames of different shapes cannot share a tensor
+            groups = {}
+            for item in batch:
+                groups.setdefault(item[0].shape, []).append(item)
+
+            for items in groups.values():
+                await self._slots.acquire()
+                task = asyncio.create_task(self._dispatch(items))
+                self._in_flight.add(task)
+                task.add_done_callback(self._in_flight.discard)
+
+    async def _dispatch(self, items: list):
+        try:
+            await self._execute(items)
+        finally:
+            self._slots.release()
+
+    async def _execute(self, items: list):
+        items = [item for item in items if not item[1].cancelled()]
+        if not items:
+            return
+
+        dispatched_at = time.perf_counter()
+        self.stats.record(len(items), [(dispatched_at - item[2]) * 1000.0 for item in items])
+
+        buffer = None
+        if len(items) == 1:
+            tensor = items[0][0]
+        else:
+            buffer = self._acquire_buffer(items[0][0])
+            tensor = np.concatenate([item[0] for item in items], axis=0, out=buffer[:len(items)])
+
+        run = self.session.run_bound if self.io_binding else self.session.run
+        try:
+            loop = asyncio.get_running_loop()
+            with observe_inference(self.name, len(items)):
+                outputs = await loop.run_in_executor(self.executor, run, None, {self.input_name: tensor})
+        except Exception as e:
+            self.stats.errors_total += 1
+            for _, future, _ in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            if buffer is not None:
+                self._buffers[(buffer.shape[1:], buffer.dtype)].append(buffer)
+
+        batch_size = len(items)
+        for i, (_, future, _) in enumerate(items):
+            if future.done():
+                continue
+            future.set_result([
+                output[i:i + 1] if output.ndim and output.shape[0] == batch_size else output
+                for output in outputs
+            ])
+
+    def _acquire_buffer(self, frame: np.ndarray) -> np.ndarray:
+        # One buffer per concurrently running batch of this frame shape
+        free = self._buffers.setdefault((frame.shape[1:], frame.dtype), [])
+        if free:
+            return free.pop()
+        return np.empty((self.max_batch_size, *frame.shape[1:]), dtype=frame.dtype)
@@ -0,0 +1,235 @@
+import hashlib
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import cv2
+
+from .metrics import MASK_REUSE
+
+
+def frame_hash(image: np.ndarray, hash_size: int = 16, mode: str = "dhash") -> str:
+    """
+    Cheap fingerprint of a decoded frame, computed on a downscaled grayscale copy.
+
+    - "dhash": difference hash. Frames that differ only by sensor noise or
+      compression artifacts usually get the same hash.
+    - "exact": digest of the downscaled pixels. Only matches identical content.
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+
+    if mode == "exact":
+        small = cv2.resize(gray, (hash_size * 4, hash_size * 4), interpolation=cv2.INTER_AREA)
+        return hashlib.blake2b(small.tobytes(), digest_size=16).hexdigest()
+
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = small[:, 1:] > small[:, :-1]
+    return np.packbits(bits).tobytes().hex()
+
+
+def scene_signature(image: np.ndarray, size: int = 32) -> np.ndarray:
+    """
+    Downscaled grayscale thumbnail of a frame, compared between frames to detect scene changes.
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    return cv2.resize(gray, (size, size), interpolation=cv2.INTER_AREA)
+
+
+def _estimate_size(value) -> int:
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_estimate_size(k) + _estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(_estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    """
+    LRU cache of model results with per-entry TTL and a memory cap.
+
+    Entries are evicted least-recently-used first once either `max_entries`
+    or `max_bytes` (estimated) is exceeded. Expired entries count as misses.
+    """
+
+    def __init__(self, max_entries: int = 4096, max_bytes: int = 256 * 1024 * 1024, ttl_seconds: float = 5.0,
+                 hash_size: int = 16, hash_mode: str = "dhash", model_version: str = "v1"):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl_seconds
+        self.hash_size = hash_size
+        self.hash_mode = hash_mode
+        self.model_version = model_version
+
+        self._entries = OrderedDict()  # key -> (value, size, expires_at)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def key(self, kind: str, camera_id: str, image_shape: tuple, fingerprint: str, roi: tuple = None) -> tuple:
+        """
+        Cache key for one model's result on a frame, or None (not cached) for
+        frames without a camera id: near-duplicates from different clients
+        must not share results. The frame shape and the detection ROI are part
+        of the key because detections are scaled and cropped to them.
+        """
+        if not camera_id or fingerprint is None:
+            return None
+        return (kind, camera_id, self.model_version, tuple(image_shape), fingerprint, roi)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, size, expires_at = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, time.monotonic() + self.ttl)
+            self.bytes += size
+
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "model_version": self.model_version,
+            "hash_mode": self.hash_mode,
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class MaskCache:
+    """
+    Latest road segmentation mask per fixed camera, reused on later frames.
+
+    A camera's mask is recomputed once it is `interval_seconds` old, or when a
+    frame's scene signature differs from the one the mask was computed on by
+    more than `scene_threshold` (mean absolute difference as a fraction of
+    full scale): the camera moved, zoomed or the lighting changed.
+    """
+
+    RESULTS = ("hit", "cold", "interval", "scene_change")
+
+    def __init__(self, interval_seconds: float = 30.0, scene_threshold: float = 0.1, signature_size: int = 32):
+        self.interval = interval_seconds
+        self.scene_threshold = scene_threshold
+        self.signature_size = signature_size
+        self._entries = {}  # camera id -> (mask, signature, image shape, computed at)
+        self._lock = threading.Lock()
+        self.counts = dict.fromkeys(self.RESULTS, 0)
+
+    def lookup(self, camera_id: str, signature: np.ndarray, image_shape: tuple):
+        """
+        The camera's cached mask if it is still valid for this frame, else None.
+        """
+        entry = self._entries.get(camera_id)
+        if entry is None or entry[2] != tuple(image_shape):
+            result = "cold"
+        elif time.monotonic() - entry[3] > self.interval:
+            result = "interval"
+        elif np.abs(signature.astype(np.int16) - entry[1]).mean() / 255.0 > self.scene_threshold:
+            result = "scene_change"
+        else:
+            result = "hit"
+
+        self.counts[result] += 1
+        MASK_REUSE.inc(1, result)
+        return entry[0] if result == "hit" else None
+
+    def store(self, camera_id: str, signature: np.ndarray, image_shape: tuple, mask: np.ndarray):
+        with self._lock:
+            self._entries[camera_id] = (mask, signature, tuple(image_shape), time.monotonic())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = sum(self.counts.values())
+        return {
+            "cameras": len(self._entries),
+            "interval_seconds": self.interval,
+            "scene_threshold": self.scene_threshold,
+            **self.counts,
+            "hit_ratio": self.counts["hit"] / lookups if lookups else 0.0,
+        }
+
+
+async def reusable_mask(masks: MaskCache, executors, camera_id: str, image: np.ndarray, frame_shape: tuple = None) -> tuple:
+    """
+    (cached mask or None, scene signature) for a frame from `camera_id`. The
+    signature is None when mask reuse is off or the frame has no camera id.
+    """
+    if masks is None or not camera_id:
+        return None, None
+    signature = await executors.run_codec(scene_signature, image, masks.signature_size, stage="scene_change")
+    return masks.lookup(camera_id, signature, frame_shape or image.shape), signature
+
+
+async def fingerprint_frame(cache: ResultCache, executors, image: np.ndarray, camera_id: str):
+    """
+    Hash a frame for cache lookups on the codec executor, or None when caching
+    is off or the frame has no camera id.
+    """
+    if cache is None or not camera_id:
+        return None
+    return await executors.run_codec(frame_hash, image, cache.hash_size, cache.hash_mode, stage="fingerprint")
+
+
+async def cached(cache: ResultCache, key, compute):
+    """
+    Return the cached value for `key`, or await `compute()` and cache its result.
+    """
+    if cache is None or key is None:
+        return await compute()
+
+    value = cache.get(key)
+    if value is None:
+        value = await compute()
+        cache.put(key, value)
+    return value
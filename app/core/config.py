@@ -0,0 +1,117 @@
+import getpass
+import os
+import tempfile
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+# Micro-batching of concurrent inference requests
+BATCH_MAX_SIZE = _env_int("BATCH_MAX_SIZE", 8)
+BATCH_MAX_WAIT_MS = _env_float("BATCH_MAX_WAIT_MS", 5.0)
+
+# Executors and ONNX Runtime threading
+CPU_COUNT = os.cpu_count() or 1
+
+# "thread" or "process"; applies to image decode/encode work
+CODEC_EXECUTOR = os.getenv("CODEC_EXECUTOR", "thread")
+CODEC_WORKERS = _env_int("CODEC_WORKERS", max(1, CPU_COUNT // 2))
+
+# Sessions kept per model; each can run one batch at a time
+SESSIONS_PER_MODEL = _env_int("SESSIONS_PER_MODEL", 2)
+
+# Split the cores between every session of both models by default
+ORT_INTRA_OP_THREADS = _env_int("ORT_INTRA_OP_THREADS", max(1, CPU_COUNT // (2 * SESSIONS_PER_MODEL)))
+ORT_INTER_OP_THREADS = _env_int("ORT_INTER_OP_THREADS", 1)
+# Bind inputs/outputs with IOBinding so outputs are written straight into numpy arrays
+ORT_IO_BINDING = os.getenv("ORT_IO_BINDING", "1") == "1"
+
+# Uploaded JPEGs are decoded at 1/2, 1/4 or 1/8 scale while the shorter side stays >= this (0 = full decode).
+# Only where no full-resolution image is rendered; results stay in full-frame coordinates.
+DECODE_MIN_SIDE = _env_int("DECODE_MIN_SIDE", 480)
+
+# Detection post-processing
+DETECTION_IOU_THRESHOLD = _env_float("DETECTION_IOU_THRESHOLD", 0.45)
+DETECTION_MAX_CANDIDATES = _env_int("DETECTION_MAX_CANDIDATES", 3000)  # top-k by score before NMS
+DETECTION_MAX_DETECTIONS = _env_int("DETECTION_MAX_DETECTIONS", 300)  # top-k kept after NMS
+
+# Per-camera detection ROI: "auto" (from road masks), "manual" (hand-set ROIs only) or "off"
+DETECTION_ROI = os.getenv("DETECTION_ROI", "auto")
+DETECTION_ROI_REFRESH_SECONDS = _env_float("DETECTION_ROI_REFRESH_SECONDS", 60.0)
+DETECTION_ROI_MARGIN = _env_float("DETECTION_ROI_MARGIN", 0.1)  # fraction of the frame added on each side
+DETECTION_ROI_MAX_AREA = _env_float("DETECTION_ROI_MAX_AREA", 0.8)  # larger road boxes are not worth cropping
+
+# Video/RTSP stream ingestion
+STREAM_DEFAULT_FPS = _env_float("STREAM_DEFAULT_FPS", 5.0)
+STREAM_QUEUE_SIZE = _env_int("STREAM_QUEUE_SIZE", 2)
+
+# Multi-object tracking between detection keyframes
+TRACK_DETECTION_INTERVAL = _env_int("TRACK_DETECTION_INTERVAL", 3)
+TRACK_IOU_THRESHOLD = _env_float("TRACK_IOU_THRESHOLD", 0.3)
+TRACK_MAX_AGE = _env_int("TRACK_MAX_AGE", 3)
+TRACK_MIN_HITS = _env_int("TRACK_MIN_HITS", 2)
+
+# Versioned model registry: one directory per version under MODEL_DIR
+MODEL_DIR = os.getenv("MODEL_DIR", os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "models")))
+MODEL_VERSION = os.getenv("MODEL_VERSION", "v1")  # version deployed at startup
+MODEL_WARMUP_RUNS = _env_int("MODEL_WARMUP_RUNS", 3)  # dummy inferences per session before a version takes traffic
+MODEL_DRAIN_TIMEOUT_SECONDS = _env_float("MODEL_DRAIN_TIMEOUT_SECONDS", 30.0)
+
+# "local": every worker loads the models; "remote": workers call `python -m app.core.inference_server` over shared memory
+INFERENCE_MODE = os.getenv("INFERENCE_MODE", "local")
+# Socket and generated authkey live in a directory only this user can enter
+INFERENCE_RUNTIME_DIR = os.getenv("INFERENCE_RUNTIME_DIR", os.path.join(tempfile.gettempdir(), f"smart-traffic-analyzer-{getpass.getuser()}"))
+INFERENCE_SERVER_ADDRESS = os.getenv("INFERENCE_SERVER_ADDRESS", os.path.join(INFERENCE_RUNTIME_DIR, "inference.sock"))  # Unix socket path or loopback host:port
+INFERENCE_SERVER_AUTHKEY = os.getenv("INFERENCE_SERVER_AUTHKEY", "")  # empty: per-host key in INFERENCE_SERVER_AUTHKEY_FILE
+INFERENCE_SERVER_AUTHKEY_FILE = os.getenv("INFERENCE_SERVER_AUTHKEY_FILE", os.path.join(INFERENCE_RUNTIME_DIR, "authkey"))
+INFERENCE_SHM_SLOTS = _env_int("INFERENCE_SHM_SLOTS", 4)  # concurrent calls per worker
+INFERENCE_SHM_SLOT_MB = _env_int("INFERENCE_SHM_SLOT_MB", 48)  # inputs + outputs of one call
+INFERENCE_CALL_TIMEOUT_SECONDS = _env_float("INFERENCE_CALL_TIMEOUT_SECONDS", 60.0)  # unanswered calls drop the connection
+
+# Cold start: serialized ORT-optimized graphs ("" disables) and lazily filled session pools
+MODEL_OPTIMIZED_CACHE_DIR = os.getenv("MODEL_OPTIMIZED_CACHE_DIR", os.path.join(MODEL_DIR, ".ort-cache"))
+MODEL_LAZY_SESSIONS = os.getenv("MODEL_LAZY_SESSIONS", "1") == "1"
+# fp32, int8-dynamic or int8-static; quantized variants are built with `python -m app.core.quantization`
+MODEL_PRECISION = os.getenv("MODEL_PRECISION", "fp32")
+# Operator profiles captured with POST /system/profile?save=true
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join("data", "profiles"))
+
+# Near-duplicate frame result cache
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "1") == "1"
+CACHE_MAX_ENTRIES = _env_int("CACHE_MAX_ENTRIES", 4096)
+CACHE_MAX_BYTES = _env_int("CACHE_MAX_BYTES", 256 * 1024 * 1024)
+CACHE_TTL_SECONDS = _env_float("CACHE_TTL_SECONDS", 5.0)
+CACHE_HASH_MODE = os.getenv("CACHE_HASH_MODE", "dhash")  # "dhash" or "exact"
+CACHE_HASH_SIZE = _env_int("CACHE_HASH_SIZE", 16)
+
+# Per-camera road mask reuse: segmentation reruns after the interval or on a scene change
+MASK_REUSE_ENABLED = os.getenv("MASK_REUSE_ENABLED", "1") == "1"
+MASK_REUSE_INTERVAL_SECONDS = _env_float("MASK_REUSE_INTERVAL_SECONDS", 30.0)
+MASK_REUSE_SCENE_THRESHOLD = _env_float("MASK_REUSE_SCENE_THRESHOLD", 0.1)  # mean abs thumbnail difference, 0-1
+
+# Per-road congestion history: raw results in memory, 1-minute/1-hour rollups also persisted to SQLite
+TIMESERIES_RAW_CAPACITY = _env_int("TIMESERIES_RAW_CAPACITY", 3000)  # results kept per road
+TIMESERIES_MINUTE_CAPACITY = _env_int("TIMESERIES_MINUTE_CAPACITY", 1440)  # 1 day
+TIMESERIES_HOUR_CAPACITY = _env_int("TIMESERIES_HOUR_CAPACITY", 2160)  # 90 days
+TIMESERIES_DB_PATH = os.getenv("TIMESERIES_DB_PATH", os.path.join("data", "congestion.sqlite"))  # "" disables persistence
+TIMESERIES_FLUSH_SECONDS = _env_float("TIMESERIES_FLUSH_SECONDS", 5.0)
+TIMESERIES_RETENTION_DAYS = _env_float("TIMESERIES_RETENTION_DAYS", 365.0)  # 0 keeps everything
+
+# Alert webhooks: pooled async delivery with retries
+ALERT_WEBHOOK_CONCURRENCY = _env_int("ALERT_WEBHOOK_CONCURRENCY", 16)  # concurrent deliveries / pooled connections
+ALERT_WEBHOOK_QUEUE_SIZE = _env_int("ALERT_WEBHOOK_QUEUE_SIZE", 10000)  # pending notifications before new ones are dropped
+ALERT_WEBHOOK_TIMEOUT_SECONDS = _env_float("ALERT_WEBHOOK_TIMEOUT_SECONDS", 5.0)
+ALERT_WEBHOOK_RETRIES = _env_int("ALERT_WEBHOOK_RETRIES", 3)
+ALERT_WEBHOOK_BACKOFF_SECONDS = _env_float("ALERT_WEBHOOK_BACKOFF_SECONDS", 0.5)  # doubled after every retry
+
+# Off-road violation checks
+ROAD_MASK_THRESHOLD = _env_int("ROAD_MASK_THRESHOLD", 128)  # mask values are 0-255
+VIOLATION_OFF_ROAD_FRACTION = _env_float("VIOLATION_OFF_ROAD_FRACTION", 0.5)
+
+# Batch upload endpoints
+BATCH_UPLOAD_CHUNK_SIZE = _env_int("BATCH_UPLOAD_CHUNK_SIZE", 16)  # frames decoded and inferred together
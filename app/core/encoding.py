@@ -0,0 +1,141 @@
+import base64
+import json
+import uuid
+from typing import Literal
+
+import numpy as np
+import cv2
+from fastapi import HTTPException
+from fastapi.responses import Response
+
+try:
+    import msgpack
+except ImportError:  # optional: only needed for format=msgpack
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:  # optional: faster JSON bodies, numpy arrays serialized without tolist()
+    orjson = None
+
+from .utils import encode_image
+
+# What image, if any, a route renders into its response
+RenderMode = Literal["none", "jpeg", "png", "mask"]
+
+# How the response body is serialized
+ResponseFormat = Literal["json", "msgpack", "multipart"]
+
+# How detections are laid out: one object per box, or one array per field
+DetectionLayout = Literal["rows", "columns"]
+
+
+def encode_detections(detections: np.ndarray, layout: str = "rows"):
+    """
+    Response form of a DETECTION_DTYPE array.
+
+    - rows: [{"box": [x1, y1, x2, y2], "score": float, "class": int}, ...]
+    - columns: {"boxes": Nx4, "scores": N, "classes": N}; the columns stay
+      numpy arrays, so no per-box objects are built before serialization
+    """
+    if layout == "columns":
+        return {
+            "boxes": np.ascontiguousarray(detections["box"]),
+            "scores": np.ascontiguousarray(detections["score"]),
+            "classes": np.ascontiguousarray(detections["class"]),
+        }
+    return [
+        {"box": box, "score": score, "class": class_id}
+        for box, score, class_id in zip(detections["box"].tolist(), detections["score"].tolist(), detections["class"].tolist())
+    ]
+
+
+def _builtin(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps_json(content) -> bytes:
+    """
+    Compact JSON, with orjson when installed. numpy arrays and scalars are allowed.
+    """
+    if orjson is not None:
+        return orjson.dumps(content, default=_builtin, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_builtin, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def encode_visual(visual: np.ndarray, render: str, quality: int = 90) -> bytes:
+    """
+    Encode a rendered BGR image (overlay, annotated frame) for the response.
+    """
+    if render == "jpeg":
+        return encode_image(visual, ".jpg", [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+    if render == "png":
+        return encode_image(visual, ".png")
+    raise ValueError(f"Render mode {render!r} does not encode an image")
+
+
+def encode_mask(mask: np.ndarray) -> bytes:
+    """
+    PNG-encode a segmentation mask at model resolution (single channel, road = 255).
+    Far smaller and cheaper than a full-resolution overlay.
+    """
+    if mask.ndim == 3:
+        mask = mask.squeeze()
+    return encode_image(mask.astype(np.uint8), ".png", [cv2.IMWRITE_PNG_COMPRESSION, 1])
+
+
+def _image_media_type(data: bytes) -> str:
+    if data.startswith(b"\x89PNG"):
+        return "image/png"
+    if data.startswith(b"\xff\xd8"):
+        return "image/jpeg"
+    return "application/octet-stream"
+
+
+def build_response(payload: dict, response_format: str = "json") -> Response:
+    """
+    Serialize a route's result. Top-level `bytes` values are encoded images:
+
+    - json: base64 strings inside the JSON body
+    - msgpack: raw binary fields inside a msgpack map
+    - multipart: a multipart/mixed body with the JSON result first and one
+      raw image part per bytes field, named after the field
+
+    Other values may be numpy arrays (see `encode_detections`).
+    """
+    if response_format == "json":
+        content = {
+            key: base64.b64encode(value).decode("utf-8") if isinstance(value, bytes) else value
+            for key, value in payload.items()
+        }
+        return Response(content=dumps_json(content), media_type="application/json")
+
+    if response_format == "msgpack":
+        if msgpack is None:
+            raise HTTPException(status_code=400, detail="format=msgpack requires the 'msgpack' package")
+        return Response(content=msgpack.packb(payload, use_bin_type=True, default=_builtin), media_type="application/msgpack")
+
+    if response_format == "multipart":
+        boundary = uuid.uuid4().hex
+        fields = {key: value for key, value in payload.items() if not isinstance(value, bytes)}
+        images = {key: value for key, value in payload.items() if isinstance(value, bytes)}
+
+        parts = [(
+            b'Content-Type: application/json\r\nContent-Disposition: inline; name="result"\r\n\r\n'
+            + dumps_json(fields)
+        )]
+        for name, data in images.items():
+            parts.append(
+                f'Content-Type: {_image_media_type(data)}\r\nContent-Disposition: inline; name="{name}"\r\n\r\n'.encode("utf-8")
+                + data
+            )
+
+        delimiter = f"--{boundary}\r\n".encode("utf-8")
+        body = b"".join(delimiter + part + b"\r\n" for part in parts) + f"--{boundary}--\r\n".encode("utf-8")
+        return Response(content=body, media_type=f"multipart/mixed; boundary={boundary}")
+
+    raise HTTPException(status_code=400, detail=f"Unknown response format: {response_format}")
@@ -0,0 +1,48 @@
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+from .metrics import observe_stage
+
+
+class Executors:
+    """
+    Executor pools that keep blocking work off the asyncio event loop.
+
+    - `inference`: threads that call session.run. ONNX Runtime releases the GIL,
+      so one thread per pooled session is enough to keep every session busy.
+    - `codec`: image decode/encode and overlay rendering. Either a thread pool
+      (cheap handoff, OpenCV releases the GIL) or a process pool (no GIL
+      contention, at the cost of pickling frames across processes).
+    """
+
+    def __init__(self, inference_workers: int, codec_workers: int, codec_kind: str = "thread"):
+        if codec_kind not in ("thread", "process"):
+            raise ValueError(f"Unknown codec executor kind: {codec_kind}")
+
+        self.inference: Executor = ThreadPoolExecutor(max_workers=inference_workers, thread_name_prefix="inference")
+        if codec_kind == "process":
+            self.codec: Executor = ProcessPoolExecutor(max_workers=codec_workers)
+        else:
+            self.codec: Executor = ThreadPoolExecutor(max_workers=codec_workers, thread_name_prefix="codec")
+        self.codec_kind = codec_kind
+
+    async def run_inference(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.inference, partial(func, *args, **kwargs))
+
+    async def run_codec(self, func, *args, stage: str = None, **kwargs):
+        """
+        Run `func` on the codec pool. With `stage` set, the call (queueing
+        included) is recorded in that stage's latency histogram.
+        """
+        loop = asyncio.get_running_loop()
+        call = partial(func, *args, **kwargs)
+        if stage is None:
+            return await loop.run_in_executor(self.codec, call)
+        with observe_stage(stage):
+            return await loop.run_in_executor(self.codec, call)
+
+    def shutdown(self):
+        self.inference.shutdown(wait=True)
+        self.codec.shutdown(wait=True)
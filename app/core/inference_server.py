@@ -0,0 +1,590 @@
+"""
+Dedicated inference process for multi-worker deployments.
+
+With `INFERENCE_MODE=remote`, HTTP workers (`uvicorn --workers N`) load no
+models. They decode, preprocess and encode, and run every model call on an
+inference server started once per host:
+
+    python -m app.core.inference_server                 # listens on INFERENCE_SERVER_ADDRESS
+    INFERENCE_MODE=remote uvicorn app.main:app --workers 4
+
+Each worker creates a shared-memory ring of `INFERENCE_SHM_SLOTS` slots.
+A call copies its input tensors into a free slot and sends only the slot
+number and tensor layout over a local socket. The server runs the model on
+views of that memory, writes the outputs into the same slot (through an
+IOBinding where output shapes are static) and answers with their layout.
+Frames and outputs are never pickled.
+
+Control messages are pickled, so the channel must only be reachable by
+trusted processes: the Unix socket is created with mode 0600 (in a 0700
+directory by default), TCP listens on loopback only, and connections must
+present an authkey that is either set explicitly or generated per host
+into a 0600 file (see `load_authkey`).
+"""
+import argparse
+import ipaddress
+import itertools
+import os
+import queue
+import secrets
+import socket
+import stat
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from multiprocessing import resource_tracker
+from multiprocessing.connection import Client, Listener
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from . import config
+from .metrics import INFERENCE_HANDOFF
+
+_ALIGN = 64
+# Explicit authkeys shorter than this, or the key earlier releases shipped as default, are refused
+_MIN_AUTHKEY_LENGTH = 16
+_PUBLISHED_AUTHKEYS = {"smart-traffic-analyzer"}
+
+
+def _aligned(offset: int) -> int:
+    return (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def parse_address(address: str):
+    """
+    "host:port" for TCP, anything else is a Unix socket path.
+    """
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit() and "/" not in address:
+        return (host or "127.0.0.1", int(port))
+    return address
+
+
+def check_listen_address(address):
+    """
+    Refuse TCP addresses other than loopback: the control channel unpickles its messages.
+    """
+    if not isinstance(address, tuple):
+        return
+    host = address[0]
+    try:
+        loopback = host == "localhost" or ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        loopback = False
+    if not loopback:
+        raise ValueError(f"The inference server only listens on a Unix socket or a loopback address, not {host}")
+
+
+def _private_directory(path: str):
+    """
+    Create `path` (0700) if needed and refuse it if other users could swap the files in it.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    status = os.stat(path)
+    shared = status.st_mode & 0o022 and not status.st_mode & stat.S_ISVTX
+    if status.st_uid not in (os.getuid(), 0) or shared:
+        raise RuntimeError(f"{path} must be owned by this user and not writable by others (chmod 700)")
+
+
+def load_authkey(key: str, key_file: str) -> bytes:
+    """
+    Authkey of the control channel: `key` if set, otherwise the per-host key in
+    `key_file`, generated (mode 0600) by whichever process needs it first.
+    """
+    if key:
+        if len(key) < _MIN_AUTHKEY_LENGTH or key in _PUBLISHED_AUTHKEYS:
+            raise RuntimeError(f"INFERENCE_SERVER_AUTHKEY must be a private secret of at least {_MIN_AUTHKEY_LENGTH} "
+                               "characters; leave it empty to use a generated per-host key")
+        return key.encode()
+
+    directory = os.path.dirname(os.path.abspath(key_file))
+    _private_directory(directory)
+    if not os.path.exists(key_file):
+        fd, staged = tempfile.mkstemp(prefix=".authkey-", dir=directory)  # created with mode 0600
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(secrets.token_hex(32))
+            try:
+                os.link(staged, key_file)
+            except FileExistsError:
+                pass  # written by another process meanwhile
+        finally:
+            os.unlink(staged)
+
+    with open(key_file, "rb") as f:
+        status = os.fstat(f.fileno())
+        if status.st_uid != os.getuid() or status.st_mode & 0o077:
+            raise RuntimeError(f"{key_file} must be owned by this user and private to it (chmod 600)")
+        key = f.read().strip()
+    if not key:
+        raise RuntimeError(f"{key_file} is empty")
+    return key
+
+
+class _NodeArg:
+    """
+    Stand-in for onnxruntime.NodeArg in workers: name, shape and type of a model input/output.
+    """
+
+    def __init__(self, name: str, shape: list, type: str):
+        self.name, self.shape, self.type = name, shape, type
+
+    def __repr__(self):
+        return f"NodeArg(name={self.name!r}, type={self.type!r}, shape={self.shape!r})"
+
+
+def _signature(args) -> list:
+    return [(arg.name, list(arg.shape), arg.type) for arg in args]
+
+
+class SlotAllocator:
+    """
+    Bump allocator of numpy arrays inside one shared-memory slot.
+    """
+
+    def __init__(self, buffer, start: int, end: int):
+        self.buffer = buffer
+        self.offset = start
+        self.end = end
+        self.layout = []  # (offset, shape, dtype str) of every allocated array
+        self.arrays = []
+
+    def __call__(self, shape, dtype) -> np.ndarray:
+        dtype = np.dtype(dtype)
+        offset = _aligned(self.offset)
+        nbytes = int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+        if offset + nbytes > self.end:
+            raise MemoryError(f"Tensor of {nbytes} bytes does not fit the shared-memory slot; raise INFERENCE_SHM_SLOT_MB")
+        self.offset = offset + nbytes
+        self.layout.append((offset, tuple(shape), dtype.str))
+        self.arrays.append(np.ndarray(shape, dtype=dtype, buffer=self.buffer, offset=offset))
+        return self.arrays[-1]
+
+
+# -- server ------------------------------------------------------------------
+
+def _attach(name: str) -> SharedMemory:
+    shm = SharedMemory(name=name)
+    # The worker owns the segment; keep this process's tracker from unlinking it on exit
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+class InferenceServer:
+    """
+    Serve the models of a ModelRegistry to worker processes.
+
+    Every worker connection gets a reader thread; calls run on a shared
+    thread pool sized to the session pools, so calls from all workers
+    share (and queue for) the same sessions.
+    """
+
+    def __init__(self, registry, address, authkey: bytes, io_binding: bool = True, threads: int = None):
+        self.registry = registry
+        self.address = address
+        self.authkey = authkey
+        self.io_binding = io_binding
+        check_listen_address(address)
+        self.executor = ThreadPoolExecutor(max_workers=threads or sum(slot.size for slot in registry.slots.values()),
+                                           thread_name_prefix="inference-server")
+        self._listener = None
+        self._stop = threading.Event()
+
+    def describe(self) -> dict:
+        return {
+            "version": self.registry.active_version,
+            "precision": self.registry.precision,
+            "cache_tag": self.registry.cache_tag,
+            "max_batch_size": self.registry.max_batch_size,
+            "models": {
+                name: {"inputs": _signature(slot.get_inputs()), "outputs": _signature(slot.get_outputs()), "size": slot.size}
+                for name, slot in self.registry.slots.items()
+            },
+        }
+
+    def serve_forever(self):
+        if isinstance(self.address, str):
+            _private_directory(os.path.dirname(os.path.abspath(self.address)))
+            if os.path.exists(self.address):
+                os.unlink(self.address)
+        # The socket file is created 0600: only this user's processes may connect
+        umask = os.umask(0o177)
+        try:
+            self._listener = Listener(self.address, authkey=self.authkey)
+        finally:
+            os.umask(umask)
+        print(f"Inference server listening on {self.address}")
+        while not self._stop.is_set():
+            try:
+                connection = self._listener.accept()
+            except OSError:
+                if self._stop.is_set():
+                    break
+                continue
+            threading.Thread(target=self._serve_connection, args=(connection,), daemon=True).start()
+
+    def close(self):
+        self._stop.set()
+        if self._listener is not None:
+            self._listener.close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _serve_connection(self, connection):
+        send_lock = threading.Lock()
+        shm = None
+
+        def reply(message):
+            with send_lock:
+                connection.send(message)
+
+        try:
+            kind, shm_name, slot_bytes = connection.recv()
+            if kind != "hello":
+                return
+            shm = _attach(shm_name)
+            reply(("ready", self.describe()))
+            while True:
+                request = connection.recv()
+                self.executor.submit(self._run, shm, slot_bytes, request, reply)
+        except (EOFError, OSError):
+            pass
+        finally:
+            connection.close()
+            if shm is not None:
+                try:
+                    shm.close()
+                except BufferError:  # a call on this connection still holds views
+                    pass
+
+    def _run(self, shm: SharedMemory, slot_bytes: int, request: tuple, reply):
+        request_id, model, slot, inputs, output_names, used = request
+        try:
+            started = time.perf_counter()
+            base = slot * slot_bytes
+            feed = {name: np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=base + offset)
+                    for name, offset, shape, dtype in inputs}
+            allocate = SlotAllocator(shm.buf, base + used, base + slot_bytes)
+            session = self.registry.slots[model]
+            if self.io_binding:
+                outputs = session.run_bound(output_names, feed, None, allocate)
+            else:
+                outputs = session.run(output_names, feed)
+            layout = []
+            for output in outputs:
+                # Outputs not bound into the slot (dynamic shapes, or no IOBinding) are copied in
+                position = next((i for i, array in enumerate(allocate.arrays) if array is output), None)
+                if position is None:
+                    np.copyto(allocate(output.shape, output.dtype), output)
+                    position = -1
+                offset, shape, dtype = allocate.layout[position]
+                layout.append((offset - base, shape, dtype))
+            del feed, outputs, allocate
+            reply(("ok", request_id, layout, time.perf_counter() - started))
+        except Exception as e:
+            reply(("error", request_id, f"{type(e).__name__}: {e}", 0.0))
+
+
+# -- worker side -------------------------------------------------------------
+
+class _Ring:
+    """
+    One shared-memory region of `slots` equal slots and the queue of free ones.
+    """
+
+    def __init__(self, slots: int, slot_bytes: int):
+        self.shm = SharedMemory(create=True, size=slots * slot_bytes)
+        self.free = queue.Queue()
+        for slot in range(slots):
+            self.free.put(slot)
+        self.retired = []  # slots the server may still write into
+
+    def close(self):
+        try:
+            self.shm.close()
+        except BufferError:  # a call still holds views; the mapping goes with the process
+            pass
+        self.shm.unlink()
+
+
+class InferenceClient:
+    """
+    A worker's connection to the inference server and its shared-memory ring.
+
+    `sessions` maps model names to RemoteSession objects, which batchers,
+    routes and stream pipelines use like local session pools. Calls block an
+    executor thread until a slot is free and the server has answered, at most
+    `call_timeout` seconds each.
+
+    A call the server has not answered within `call_timeout` drops the
+    connection, as if it were lost. A slot whose call got no answer is
+    retired, since the server may still write into it. Reconnecting starts a
+    fresh ring.
+    """
+
+    def __init__(self, address, authkey: bytes, slots: int = 4, slot_bytes: int = 48 * 1024 * 1024,
+                 connect_timeout: float = 30.0, call_timeout: float = 60.0):
+        self.address = address
+        self.authkey = authkey
+        self.slots = slots
+        self.slot_bytes = _aligned(slot_bytes)
+        self.connect_timeout = connect_timeout
+        self.call_timeout = call_timeout
+        self._ring = _Ring(slots, self.slot_bytes)
+        self._ids = itertools.count()
+        self._pending = {}  # request id -> (connection, future)
+        self._send_lock = threading.Lock()
+        self._connect_lock = threading.Lock()
+        self._connection = None
+        self.server = {}
+        self.sessions = {}
+        self.stats = {"calls": 0, "errors": 0, "handoff_ms_total": 0.0, "server_ms_total": 0.0}
+
+    @property
+    def shm(self) -> SharedMemory:
+        return self._ring.shm
+
+    def connect(self):
+        """
+        Connect (retrying until `connect_timeout`) and fetch the served models.
+        """
+        with self._connect_lock:
+            self._connect()
+
+    def _connect(self):
+        if self._connection is not None:
+            return
+        deadline = time.monotonic() + self.connect_timeout
+        while True:
+            try:
+                connection = Client(self.address, authkey=self.authkey)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"Inference server not reachable at {self.address}")
+                time.sleep(0.5)
+        if self._ring.retired:
+            self._ring.close()
+            self._ring = _Ring(self.slots, self.slot_bytes)
+        connection.send(("hello", self._ring.shm.name, self.slot_bytes))
+        kind, self.server = connection.recv()
+        if kind != "ready":
+            connection.close()
+            raise RuntimeError(f"Unexpected inference server handshake: {kind}")
+        self._connection = connection
+        for name, model in self.server["models"].items():
+            session = self.sessions.setdefault(name, RemoteSession(self, name))
+            session.update(model)
+        threading.Thread(target=self._read, args=(connection,), name="inference-client-reader", daemon=True).start()
+
+    def _current(self) -> tuple:
+        # The reader thread may drop the connection at any time: callers keep their own references
+        with self._connect_lock:
+            self._connect()
+            return self._connection, self._ring
+
+    @property
+    def cache_tag(self) -> str:
+        return self.server.get("cache_tag")
+
+    def _read(self, connection):
+        try:
+            while True:
+                status, request_id, payload, server_seconds = connection.recv()
+                _, future = self._pending.pop(request_id, (None, None))
+                if future is not None:
+                    future.set_result((status, payload, server_seconds))
+        except (EOFError, OSError):
+            pass
+        self._drop(connection)
+
+    def _drop(self, connection):
+        # Reader thread only: fail the calls still waiting on `connection`; the next call reconnects
+        self._detach(connection)
+        connection.close()
+        for request_id, (owner, future) in list(self._pending.items()):
+            if owner is connection and self._pending.pop(request_id, None) is not None:
+                future.set_exception(RuntimeError("Lost connection to the inference server"))
+
+    def _detach(self, connection):
+        with self._connect_lock:
+            if self._connection is connection:
+                self._connection = None
+
+    def _disconnect(self, connection):
+        # Wake the reader thread with EOF; closing the connection under a blocked recv is not safe
+        self._detach(connection)
+        try:
+            with socket.socket(fileno=os.dup(connection.fileno())) as sock:
+                sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass  # already closed
+
+    def run(self, model: str, output_names, input_feed: dict) -> list:
+        connection, ring = self._current()
+        try:
+            slot = ring.free.get(timeout=self.call_timeout)
+        except queue.Empty:
+            raise RuntimeError(f"No free shared-memory slot within {self.call_timeout:g}s") from None
+        request_id = next(self._ids)
+        sent = answered = False
+        try:
+            base = slot * self.slot_bytes
+            allocate = SlotAllocator(ring.shm.buf, base, base + self.slot_bytes)
+            inputs = []
+            for name, array in input_feed.items():
+                view = allocate(array.shape, array.dtype)
+                np.copyto(view, array)
+                offset, shape, dtype = allocate.layout[-1]
+                inputs.append((name, offset - base, shape, dtype))
+
+            future = Future()
+            self._pending[request_id] = (connection, future)
+            started = time.perf_counter()
+            sent = True
+            try:
+                with self._send_lock:
+                    connection.send((request_id, model, slot, inputs, output_names, _aligned(allocate.offset - base)))
+            except (OSError, ValueError) as e:
+                raise RuntimeError("Lost connection to the inference server") from e
+            try:
+                status, payload, server_seconds = future.result(timeout=self.call_timeout)
+            except FutureTimeoutError:
+                self._disconnect(connection)
+                raise RuntimeError(f"Inference server did not answer within {self.call_timeout:g}s") from None
+            answered = True
+            elapsed = time.perf_counter() - started
+
+            self.stats["calls"] += 1
+            if status != "ok":
+                self.stats["errors"] += 1
+                raise RuntimeError(f"Inference server error: {payload}")
+            outputs = [np.ndarray(shape, dtype=np.dtype(dtype), buffer=ring.shm.buf, offset=base + offset).copy()
+                       for offset, shape, dtype in payload]
+        finally:
+            self._pending.pop(request_id, None)
+            if sent and not answered:
+                ring.retired.append(slot)
+            else:
+                ring.free.put(slot)
+
+        handoff = max(0.0, elapsed - server_seconds)
+        self.stats["handoff_ms_total"] += handoff * 1000.0
+        self.stats["server_ms_total"] += server_seconds * 1000.0
+        INFERENCE_HANDOFF.observe(handoff, model)
+        return outputs
+
+    def describe(self) -> dict:
+        calls = self.stats["calls"] or 1
+        return {
+            "mode": "remote",
+            "address": str(self.address),
+            "connected": self._connection is not None,
+            "version": self.server.get("version"),
+            "precision": self.server.get("precision"),
+            "max_batch_size": self.server.get("max_batch_size"),
+            "sessions": {name: session.size for name, session in self.sessions.items()},
+            "retired_slots": len(self._ring.retired),
+            "calls": self.stats["calls"],
+            "errors": self.stats["errors"],
+            "mean_handoff_ms": round(self.stats["handoff_ms_total"] / calls, 3),
+            "mean_server_ms": round(self.stats["server_ms_total"] / calls, 3),
+        }
+
+    def close(self):
+        with self._connect_lock:
+            connection, self._connection = self._connection, None
+        if connection is not None:
+            connection.close()
+        self._ring.close()
+
+
+class RemoteSession:
+    """
+    Session-like handle to one model of the inference server.
+
+    Batches whose input takes more than half a slot are split along the
+    batch axis; the other half is left for the outputs.
+    """
+
+    def __init__(self, client: InferenceClient, name: str):
+        self.client = client
+        self.name = name
+        self._inputs, self._outputs, self._size = [], [], 1
+
+    def update(self, model: dict):
+        self._inputs = [_NodeArg(*arg) for arg in model["inputs"]]
+        self._outputs = [_NodeArg(*arg) for arg in model["outputs"]]
+        self._size = model["size"]
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def get_inputs(self):
+        return self._inputs
+
+    def get_outputs(self):
+        return self._outputs
+
+    def run(self, output_names, input_feed, run_options=None):
+        input_feed = {name: np.ascontiguousarray(array) for name, array in input_feed.items()}
+        batch = next(iter(input_feed.values())).shape[0]
+        per_item = sum(array.nbytes for array in input_feed.values()) / max(batch, 1)
+        step = max(1, int(self.client.slot_bytes // 2 // max(per_item, 1)))
+        if batch <= step:
+            return self.client.run(self.name, output_names, input_feed)
+        parts = [self.client.run(self.name, output_names, {name: array[i:i + step] for name, array in input_feed.items()})
+                 for i in range(0, batch, step)]
+        return [np.concatenate(outputs, axis=0) for outputs in zip(*parts)]
+
+    # The server binds outputs itself
+    run_bound = run
+
+
+def main(argv=None) -> int:
+    from .model_registry import ModelRegistry
+
+    parser = argparse.ArgumentParser(description="Serve the models to HTTP workers over shared memory")
+    parser.add_argument("--address", default=config.INFERENCE_SERVER_ADDRESS, help="Unix socket path or host:port")
+    parser.add_argument("--version", default=config.MODEL_VERSION)
+    parser.add_argument("--precision", default=config.MODEL_PRECISION)
+    parser.add_argument("--sessions", type=int, default=config.SESSIONS_PER_MODEL, help="sessions per model")
+    parser.add_argument("--max-batch-size", type=int, default=config.BATCH_MAX_SIZE,
+                        help="largest batch the workers send (their BATCH_MAX_SIZE)")
+    args = parser.parse_args(argv)
+
+    # Fail on an unsafe address or key before spending time on the models
+    address = parse_address(args.address)
+    check_listen_address(address)
+    authkey = load_authkey(config.INFERENCE_SERVER_AUTHKEY, config.INFERENCE_SERVER_AUTHKEY_FILE)
+
+    registry = ModelRegistry(
+        config.MODEL_DIR,
+        pool_size=args.sessions,
+        use_gpu=True,
+        warmup_runs=config.MODEL_WARMUP_RUNS,
+        drain_timeout=config.MODEL_DRAIN_TIMEOUT_SECONDS,
+        precision=args.precision,
+        max_batch_size=args.max_batch_size,
+        intra_op_num_threads=config.ORT_INTRA_OP_THREADS,
+        inter_op_num_threads=config.ORT_INTER_OP_THREADS,
+        optimized_cache_dir=config.MODEL_OPTIMIZED_CACHE_DIR or None,
+    )
+    registry.deploy(args.version)
+    print(f"Models {args.version} ({registry.precision}) loaded and ready.")
+
+    server = InferenceServer(registry, address, authkey, io_binding=config.ORT_IO_BINDING)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,252 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from sub-millisecond post-processing up to slow 4K requests
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self) -> list:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount: float = 1.0, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0.0)
+
+    def total(self) -> float:
+        return sum(self._values.values())
+
+    def render(self) -> list:
+        lines = self.header()
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def dec(self, amount: float = 1.0, *labels):
+        self.inc(-amount, *labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def render(self) -> list:
+        lines = self.header()
+        for labels, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {series[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {series[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+START_TIME = time.time()
+
+HTTP_REQUESTS = REGISTRY.register(Counter("http_requests_total", "HTTP requests by route, method and status", ("route", "method", "status")))
+HTTP_ERRORS = REGISTRY.register(Counter("http_request_errors_total", "HTTP requests that failed with a 5xx or an unhandled exception", ("route",)))
+HTTP_LATENCY = REGISTRY.register(Histogram("http_request_duration_seconds", "HTTP request latency by route", ("route",)))
+HTTP_IN_FLIGHT = REGISTRY.register(Gauge("http_requests_in_flight", "HTTP requests currently being served"))
+LAST_REQUEST = REGISTRY.register(Gauge("http_last_request_timestamp_seconds", "Unix time of the last HTTP request"))
+
+STAGE_LATENCY = REGISTRY.register(Histogram("pipeline_stage_duration_seconds", "Per-stage processing latency", ("stage",)))
+INFERENCE_LATENCY = REGISTRY.register(Histogram("inference_duration_seconds", "session.run latency per batch", ("model",)))
+INFERENCE_BATCH_SIZE = REGISTRY.register(Histogram("inference_batch_size", "Frames per inference call", ("model",), buckets=(1, 2, 4, 8, 16, 32, 64)))
+INFERENCE_ERRORS = REGISTRY.register(Counter("inference_errors_total", "Failed inference calls", ("model",)))
+INFERENCE_IN_FLIGHT = REGISTRY.register(Gauge("inference_in_flight", "Inference calls currently running", ("model",)))
+INFERENCE_HANDOFF = REGISTRY.register(Histogram("inference_handoff_duration_seconds", "Worker <-> inference server round trip minus the model run (INFERENCE_MODE=remote)", ("model",)))
+
+MASK_REUSE = REGISTRY.register(Counter("segmentation_mask_reuse_total", "Per-camera road mask lookups: hit, or why the mask was recomputed", ("result",)))
+
+CAMERA_FRAMES = REGISTRY.register(Counter("camera_frames_total", "Frames analyzed per camera", ("camera",)))
+CAMERA_FPS = REGISTRY.register(Gauge("camera_fps", "Recent frames per second per camera (exponential moving average)", ("camera",)))
+
+WEBSOCKET_FRAMES = REGISTRY.register(Counter("websocket_frames_total", "Frames on /analyze WebSocket connections: received, processed, dropped or failed", ("result",)))
+WEBSOCKET_LAG = REGISTRY.register(Histogram("websocket_frame_lag_seconds", "Time from receiving a WebSocket frame to sending its result"))
+
+ALERT_EVENTS = REGISTRY.register(Counter("alert_events_total", "Alert state changes that sent a notification", ("event",)))
+WEBHOOK_DELIVERIES = REGISTRY.register(Counter("webhook_deliveries_total", "Webhook notifications by outcome", ("result",)))
+WEBHOOK_LATENCY = REGISTRY.register(Histogram("webhook_request_duration_seconds", "Latency of single webhook POST attempts"))
+
+_camera_last_seen = {}
+_camera_lock = threading.Lock()
+
+
+def observe_stage(stage: str):
+    """
+    Context manager timing one pipeline stage (decode, preprocess, postprocess, nms, encode, ...).
+    """
+    return STAGE_LATENCY.time(stage)
+
+
+@contextmanager
+def observe_inference(model: str, batch_size: int):
+    INFERENCE_BATCH_SIZE.observe(batch_size, model)
+    INFERENCE_IN_FLIGHT.inc(1, model)
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        INFERENCE_ERRORS.inc(1, model)
+        raise
+    finally:
+        INFERENCE_LATENCY.observe(time.perf_counter() - start, model)
+        INFERENCE_IN_FLIGHT.dec(1, model)
+
+
+def record_camera_frame(camera_id: str, smoothing: float = 0.2):
+    """
+    Count a frame for `camera_id` and update its smoothed frames/sec gauge.
+    """
+    if not camera_id:
+        return
+    CAMERA_FRAMES.inc(1, camera_id)
+
+    now = time.monotonic()
+    with _camera_lock:
+        last = _camera_last_seen.get(camera_id)
+        _camera_last_seen[camera_id] = now
+    if last is not None and now > last:
+        previous = CAMERA_FPS.value(camera_id)
+        instant = 1.0 / (now - last)
+        CAMERA_FPS.set(instant if previous == 0 else previous + smoothing * (instant - previous), camera_id)
+
+
+def render() -> str:
+    uptime = [
+        "# HELP process_uptime_seconds Seconds since the API started",
+        "# TYPE process_uptime_seconds gauge",
+        f"process_uptime_seconds {time.time() - START_TIME}",
+    ]
+    return REGISTRY.render() + "\n".join(uptime) + "\n"
+
+
+def _route_template(scope) -> str:
+    """
+    Full path template of the matched route, e.g. /api/v1/traffic/roads/{road_id}:
+    path parameter values are put back as their names to keep label cardinality bounded.
+    """
+    if "endpoint" not in scope:
+        return "unmatched"
+    path_params = scope.get("path_params") or {}
+    if not path_params:
+        return scope["path"]
+    names = {str(value): name for name, value in path_params.items()}
+    return "/".join(f"{{{names[part]}}}" if part in names else part for part in scope["path"].split("/"))
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware counting requests, errors, in-flight requests and latency
+    per route template (e.g. /roads/{road_id}, never the raw path).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        LAST_REQUEST.set(time.time())
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            status["code"] = 500
+            raise
+        finally:
+            route = _route_template(scope)
+            HTTP_IN_FLIGHT.dec()
+            HTTP_LATENCY.observe(time.perf_counter() - start, route)
+            HTTP_REQUESTS.inc(1, route, scope.get("method", ""), str(status["code"]))
+            if status["code"] >= 500:
+                HTTP_ERRORS.inc(1, route)
@@ -1,13 +1,95 @@
 import onnxruntime as ort
+import numpy as np
+import hashlib
 import os
+import platform
+import queue
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 
-def load_onnx_model(model_path: str, use_gpu: bool = False) -> ort.InferenceSession:
+_hash_cache = {}  # (path, size, mtime) -> sha256
+
+# Model precisions; quantized variants are stored next to the FP32 file
+PRECISIONS = ("fp32", "int8-dynamic", "int8-static")
+
+ORT_DTYPES = {
+    "tensor(float)": np.float32,
+    "tensor(float16)": np.float16,
+    "tensor(double)": np.float64,
+    "tensor(uint8)": np.uint8,
+    "tensor(int8)": np.int8,
+    "tensor(int32)": np.int32,
+    "tensor(int64)": np.int64,
+}
+
+
+def variant_path(model_path: str, precision: str = "fp32") -> str:
+    """
+    Path of a model's `precision` variant: object-detection.onnx ->
+    object-detection.int8-static.onnx. FP32 is the model itself.
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown model precision: {precision}")
+    if precision == "fp32":
+        return model_path
+    stem, ext = os.path.splitext(model_path)
+    return f"{stem}.{precision}{ext}"
+
+
+def select_providers(use_gpu: bool = False) -> list:
+    """
+    Execution providers to request, limited to those this onnxruntime build
+    actually offers, so CPU-only nodes never ask for CUDA.
+    """
+    available = ort.get_available_providers()
+    providers = ['CUDAExecutionProvider'] if use_gpu and 'CUDAExecutionProvider' in available else []
+    return providers + ['CPUExecutionProvider']
+
+
+def file_sha256(path: str) -> str:
+    """
+    SHA-256 of a file, memoized per (size, mtime) so pooled sessions hash a model once.
+    """
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _hash_cache:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        _hash_cache[key] = digest.hexdigest()
+    return _hash_cache[key]
+
+
+def optimized_model_path(model_path: str, providers: list, cache_dir: str) -> str:
+    """
+    Where the ORT-optimized graph of `model_path` is cached. The name covers the
+    source model hash, the onnxruntime version, the providers and the CPU
+    architecture, so a changed model or runtime never picks up a stale graph.
+    Fully optimized graphs can contain hardware-specific kernels: keep the
+    cache on the node (or image) that produced it.
+    """
+    parts = [file_sha256(model_path), ort.__version__, platform.machine(), *providers]
+    key = hashlib.sha256("|".join(parts).encode()).hexdigest()[:20]
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    return os.path.join(cache_dir, f"{stem}.{key}.ort.onnx")
+
+
+def load_onnx_model(model_path: str, use_gpu: bool = False, intra_op_num_threads: int = 0, inter_op_num_threads: int = 0,
+                    optimized_cache_dir: str = None, profile_prefix: str = None) -> ort.InferenceSession:
     """
     Load an ONNX model with the appropriate execution provider
 
     Args:
         model_path (str): path to the .onnx file
         use_gpu (bool): Whether to use CUDAExecutionProvider if available
+        intra_op_num_threads (int): Threads used inside a single operator (0 = ORT default)
+        inter_op_num_threads (int): Threads used across independent operators (0 = ORT default)
+        optimized_cache_dir (str): Reuse/store the fully optimized graph here, skipping
+            graph optimization on later loads of the same model (None = optimize every time)
+        profile_prefix (str): Record an ORT operator profile to `<profile_prefix>_<timestamp>.json`
+            (written by session.end_profiling()). Only for diagnostic sessions: profiling slows every run.
 
     Returns:
         ort.InferenceSession
@@ -15,26 +97,236 @@ def load_onnx_model(model_path: str, use_gpu: bool = False) -> ort.InferenceSess
 
     if not os.path.exists(model_path):
         raise FileNotFoundError(f"ONNX model not found at: {model_path}")
-    
-    providers = ['CPUExecutionProvider']
-    if use_gpu:
-        providers = ['CUDAExecutionProvider', 'CPUExecutionProvider']
+
+    providers = select_providers(use_gpu)
 
     session_options = ort.SessionOptions()
     session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if intra_op_num_threads > 0:
+        session_options.intra_op_num_threads = intra_op_num_threads
+    if inter_op_num_threads > 0:
+        session_options.inter_op_num_threads = inter_op_num_threads
+    if profile_prefix:
+        session_options.enable_profiling = True
+        session_options.profile_file_prefix = profile_prefix
 
+    if not optimized_cache_dir:
+        return ort.InferenceSession(model_path, sess_options=session_options, providers=providers)
+
+    cached_path = optimized_model_path(model_path, providers, optimized_cache_dir)
+    if os.path.isfile(cached_path):
+        # Already optimized offline: load as-is
+        session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+        return ort.InferenceSession(cached_path, sess_options=session_options, providers=providers)
+
+    # Optimize once and serialize the result; the rename makes concurrent writers safe
+    os.makedirs(optimized_cache_dir, exist_ok=True)
+    staging_path = f"{cached_path}.{uuid.uuid4().hex}.tmp"
+    session_options.optimized_model_filepath = staging_path
     session = ort.InferenceSession(model_path, sess_options=session_options, providers=providers)
-    
+    if os.path.isfile(staging_path):
+        os.replace(staging_path, cached_path)
     return session
 
-def load_detection_model(model_path: str = None, use_gpu: bool = False) -> ort.InferenceSession:
+
+def run_bound(session: ort.InferenceSession, output_names, input_feed: dict, run_options=None, allocate=np.empty) -> list:
+    """
+    Same as session.run, through an IOBinding. Inputs are bound in place, and
+    outputs whose shape is known up front (static apart from the batch axis)
+    are written by ONNX Runtime straight into numpy arrays from `allocate`
+    (shape, dtype), skipping the copy session.run makes of every output. Other
+    outputs are fetched as usual.
+    """
+    binding = session.io_binding()
+    inputs = {name: np.ascontiguousarray(array) for name, array in input_feed.items()}  # alive until the run completes
+    for name, array in inputs.items():
+        binding.bind_cpu_input(name, array)
+    batch_size = next(iter(inputs.values())).shape[0]
+
+    outputs = []
+    for meta in session.get_outputs():
+        if output_names and meta.name not in output_names:
+            continue
+        shape = [batch_size if i == 0 and not (isinstance(dim, int) and dim > 0) else dim for i, dim in enumerate(meta.shape)]
+        if all(isinstance(dim, int) and dim > 0 for dim in shape) and meta.type in ORT_DTYPES:
+            out = allocate(shape, ORT_DTYPES[meta.type])
+            binding.bind_ortvalue_output(meta.name, ort.OrtValue.ortvalue_from_numpy(out))
+        else:
+            out = None
+            binding.bind_output(meta.name)
+        outputs.append(out)
+
+    session.run_with_iobinding(binding, run_options)
+    if any(out is None for out in outputs):
+        fetched = binding.copy_outputs_to_cpu()
+        outputs = [fetched[i] if out is None else out for i, out in enumerate(outputs)]
+    return outputs
+
+
+class SessionPool:
+    """
+    A fixed set of InferenceSessions for the same model.
+
+    `run` checks out a free session, blocking until one is available, so up to
+    `size` inferences can execute in parallel on executor threads. The pool
+    exposes the same `run`/`get_inputs`/`get_outputs` surface as a single
+    InferenceSession and can be used wherever one is expected.
+    """
+
+    def __init__(self, sessions: list):
+        if not sessions:
+            raise ValueError("SessionPool needs at least one session")
+        self.sessions = sessions
+        self._free = queue.Queue()
+        for session in sessions:
+            self._free.put(session)
+
+    @property
+    def size(self) -> int:
+        return len(self.sessions)
+
+    def get_inputs(self):
+        return self.sessions[0].get_inputs()
+
+    def get_outputs(self):
+        return self.sessions[0].get_outputs()
+
+    def run(self, output_names, input_feed, run_options=None):
+        session = self._free.get()
+        try:
+            return session.run(output_names, input_feed, run_options)
+        finally:
+            self._free.put(session)
+
+    def run_bound(self, output_names, input_feed, run_options=None, allocate=np.empty):
+        """
+        `run` through an IOBinding (see run_bound).
+        """
+        session = self._free.get()
+        try:
+            return run_bound(session, output_names, input_feed, run_options, allocate)
+        finally:
+            self._free.put(session)
+
+    def add(self, session):
+        """
+        Grow the pool by one session (e.g. built in the background after startup).
+        """
+        self.sessions.append(session)
+        self._free.put(session)
+
+    def close(self):
+        """
+        Drop every session so ONNX Runtime frees its memory now rather than at
+        some later garbage collection. The pool must be idle.
+        """
+        while not self._free.empty():
+            self._free.get_nowait()
+        self.sessions = []
+
+
+class ModelSlot:
+    """
+    A stable handle to the currently deployed SessionPool of one model.
+
+    Batchers, routes and stream pipelines hold the slot, never the pool, so a
+    new model version is deployed by swapping the pool in one assignment.
+    Calls that started on the old pool finish on it; `drain` waits for them
+    before the old pool is released.
+    """
+
+    def __init__(self, pool: SessionPool, version: str = None, lock: threading.Condition = None):
+        self.pool = pool
+        self.version = version
+        # Slots sharing `lock` can be swapped together (see ModelRegistry.deploy)
+        self._cond = lock or threading.Condition()
+        self._in_flight = {}  # pool -> running calls
+
+    @property
+    def size(self) -> int:
+        return self.pool.size
+
+    def get_inputs(self):
+        return self.pool.get_inputs()
+
+    def get_outputs(self):
+        return self.pool.get_outputs()
+
+    def run(self, output_names, input_feed, run_options=None):
+        return self._call("run", output_names, input_feed, run_options)
+
+    def run_bound(self, output_names, input_feed, run_options=None, allocate=np.empty):
+        return self._call("run_bound", output_names, input_feed, run_options, allocate)
+
+    def _call(self, method: str, *args):
+        with self._cond:
+            pool = self.pool
+            self._in_flight[pool] = self._in_flight.get(pool, 0) + 1
+        try:
+            return getattr(pool, method)(*args)
+        finally:
+            with self._cond:
+                self._in_flight[pool] -= 1
+                if not self._in_flight[pool]:
+                    del self._in_flight[pool]
+                    self._cond.notify_all()
+
+    def swap(self, pool: SessionPool, version: str = None) -> SessionPool:
+        """
+        Make `pool` the target of all new calls and return the previous pool.
+        """
+        with self._cond:
+            previous, self.pool, self.version = self.pool, pool, version
+        return previous
+
+    def drain(self, pool: SessionPool, timeout: float = None) -> bool:
+        """
+        Block until no call is running on `pool`. Returns False on timeout.
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: pool not in self._in_flight, timeout)
+
+
+def get_input_size(session, default: tuple = (320, 320)) -> tuple:
+    """
+    Return the (width, height) a model expects, or `default` for dynamic spatial axes.
+    """
+    shape = session.get_inputs()[0].shape
+    height, width = shape[2], shape[3]
+    if isinstance(width, int) and isinstance(height, int):
+        return (width, height)
+    return default
+
+
+def load_session_pool(model_path: str, size: int = 1, use_gpu: bool = False, intra_op_num_threads: int = 0, inter_op_num_threads: int = 0,
+                      optimized_cache_dir: str = None) -> SessionPool:
+    """
+    Load `size` sessions of one model. The first one is built alone so it can
+    write the optimized-graph cache; the rest then load from it in parallel.
+    """
+    def load():
+        return load_onnx_model(model_path, use_gpu, intra_op_num_threads, inter_op_num_threads, optimized_cache_dir)
+
+    sessions = [load()]
+    if size > 1:
+        with ThreadPoolExecutor(max_workers=size - 1) as pool:
+            sessions += list(pool.map(lambda _: load(), range(size - 1)))
+    return SessionPool(sessions)
+
+def load_detection_model(model_path: str = None, use_gpu: bool = False, pool_size: int = None, precision: str = "fp32", **session_kwargs):
     if model_path is None:
         model_path = os.path.join(os.path.dirname(__file__), "..", "models", "v1", "object-detection.onnx")
         model_path = os.path.abspath(model_path)
-    return load_onnx_model(model_path, use_gpu)
+    model_path = variant_path(model_path, precision)
+    if pool_size is not None:
+        return load_session_pool(model_path, pool_size, use_gpu, **session_kwargs)
+    return load_onnx_model(model_path, use_gpu, **session_kwargs)
 
-def load_segmentation_model(model_path: str = None, use_gpu: bool = False) -> ort.InferenceSession:
+def load_segmentation_model(model_path: str = None, use_gpu: bool = False, pool_size: int = None, precision: str = "fp32", **session_kwargs):
     if model_path is None:
         model_path = os.path.join(os.path.dirname(__file__), "..", "models", "v1", "road-segmentation.onnx")
         model_path = os.path.abspath(model_path)
-    return load_onnx_model(model_path, use_gpu)
\ No newline at end of file
+    model_path = variant_path(model_path, precision)
+    if pool_size is not None:
+        return load_session_pool(model_path, pool_size, use_gpu, **session_kwargs)
+    return load_onnx_model(model_path, use_gpu, **session_kwargs)
@@ -0,0 +1,407 @@
+import gc
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .model_loader import (
+    ORT_DTYPES, PRECISIONS, ModelSlot, SessionPool, load_onnx_model, load_session_pool, optimized_model_path, select_providers, variant_path,
+)
+
+# Model name -> file name inside a version directory
+MODEL_FILES = {
+    "detection": "object-detection.onnx",
+    "segmentation": "road-segmentation.onnx",
+}
+
+_VERSION_ID = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]{0,63}$")
+
+
+class ModelVersionError(Exception):
+    """
+    A version id, upload or deployment request that cannot be honoured.
+    `status_code` says how the API should report it.
+    """
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def dummy_inputs(session, spatial: int = 320) -> dict:
+    """
+    Zero-filled input feed for warm-up runs. Dynamic axes get batch 1 and
+    `spatial` pixels.
+    """
+    feed = {}
+    for model_input in session.get_inputs():
+        shape = [
+            dim if isinstance(dim, int) and dim > 0 else (1 if axis == 0 else spatial)
+            for axis, dim in enumerate(model_input.shape)
+        ]
+        feed[model_input.name] = np.zeros(shape, dtype=ORT_DTYPES.get(model_input.type, np.float32))
+    return feed
+
+
+def _signature(session) -> dict:
+    return {
+        "inputs": [(i.name, i.type, list(i.shape)) for i in session.get_inputs()],
+        "outputs": [list(o.shape) for o in session.get_outputs()],
+    }
+
+
+def _fixed(dim) -> bool:
+    return isinstance(dim, int) and dim > 0
+
+
+def _dims_fit(dims: list, current: list) -> bool:
+    # A dimension fixed in the deployed model must stay the same; dynamic ones may become anything
+    return all(not _fixed(c) or d == c for d, c in zip(dims, current))
+
+
+class ModelRegistry:
+    """
+    Versioned model store with zero-downtime deployment.
+
+    Each version is a directory under `root` holding the detection and
+    segmentation models. Deploying a version builds fresh SessionPools, warms
+    every session with dummy inferences, then swaps them into the long-lived
+    ModelSlots under one lock, together with the active version. A call
+    started after the swap runs on the new version; a request that ran one
+    model before the swap and the other after it can still see both. Calls
+    already running on the previous pools finish there; the previous pools
+    are released once they have drained.
+
+    New versions must take the same inputs as the deployed one. A fixed
+    batch dimension is only accepted where the deployed model has the same
+    one, or where it is 1 and `max_batch_size` (the largest batch the
+    MicroBatchers in front of the slots send) is 1 too.
+
+    `precision` selects quantized variants stored next to the FP32 models
+    (see app/core/quantization.py); a model without that variant runs in FP32.
+    """
+
+    def __init__(self, root: str, pool_size: int = 1, use_gpu: bool = False, warmup_runs: int = 3,
+                 drain_timeout: float = 30.0, precision: str = "fp32", max_batch_size: int = 1, **session_kwargs):
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown model precision: {precision}")
+        self.root = root
+        self.precision = precision
+        self.pool_size = pool_size
+        self.use_gpu = use_gpu
+        self.warmup_runs = warmup_runs
+        self.drain_timeout = drain_timeout
+        self.max_batch_size = max_batch_size
+        self.session_kwargs = session_kwargs
+
+        self.slots = {}  # model name -> ModelSlot
+        self.model_precisions = {}  # model name -> precision actually deployed
+        self.active_version = None
+        self.deployed_at = None
+        self.deployment = {"state": "idle"}
+        self._deploy_lock = threading.Lock()
+        self._swap_lock = threading.Condition()  # shared by all slots, see deploy
+
+    def version_dir(self, version: str) -> str:
+        if not isinstance(version, str) or not _VERSION_ID.match(version):
+            raise ModelVersionError(f"Invalid model version id: {version!r}")
+        return os.path.join(self.root, version)
+
+    def model_path(self, version: str, name: str) -> str:
+        return os.path.join(self.version_dir(version), MODEL_FILES[name])
+
+    def resolve(self, version: str, name: str, precision: str) -> tuple:
+        """
+        (path, precision) of the file to load: the `precision` variant if it
+        exists, otherwise the FP32 model.
+        """
+        path = variant_path(self.model_path(version, name), precision)
+        if os.path.isfile(path):
+            return path, precision
+        print(f"No {precision} variant of the {name} model in {version}; using fp32")
+        return self.model_path(version, name), "fp32"
+
+    @property
+    def cache_tag(self) -> str:
+        """
+        Identifies the deployed weights in result cache keys.
+        """
+        return self.active_version if self.precision == "fp32" else f"{self.active_version}:{self.precision}"
+
+    def versions(self) -> list:
+        """
+        Every stored version with its model files, newest first.
+        """
+        if not os.path.isdir(self.root):
+            return []
+
+        versions = []
+        for version in os.listdir(self.root):
+            directory = os.path.join(self.root, version)
+            if not _VERSION_ID.match(version) or not os.path.isdir(directory):
+                continue
+            models = {
+                name: {
+                    "file": file_name,
+                    "size_bytes": os.path.getsize(os.path.join(directory, file_name)),
+                    "precisions": [p for p in PRECISIONS if os.path.isfile(variant_path(os.path.join(directory, file_name), p))],
+                }
+                for name, file_name in MODEL_FILES.items()
+                if os.path.isfile(os.path.join(directory, file_name))
+            }
+            if not models:
+                continue
+            versions.append({
+                "version": version,
+                "active": version == self.active_version,
+                "created_at": os.path.getmtime(directory),
+                "models": models,
+            })
+
+        return sorted(versions, key=lambda v: v["created_at"], reverse=True)
+
+    def describe(self) -> dict:
+        return {
+            "active_version": self.active_version,
+            "precision": self.precision,
+            "deployed_at": self.deployed_at,
+            "models": {
+                name: {
+                    "file": MODEL_FILES[name],
+                    "precision": self.model_precisions.get(name),
+                    "sessions": slot.size,
+                    "inputs": [{"name": i.name, "shape": i.shape, "type": i.type} for i in slot.get_inputs()],
+                    "outputs": [{"name": o.name, "shape": o.shape, "type": o.type} for o in slot.get_outputs()],
+                }
+                for name, slot in self.slots.items()
+            },
+            "deployment": dict(self.deployment),
+        }
+
+    def _build(self, version: str, sessions: int, precision: str) -> tuple:
+        """
+        Load and warm up a SessionPool of `sessions` sessions per model of
+        `version` at `precision`, both models in parallel.
+
+        Returns:
+            (pools, phases): model name -> SessionPool, and per-model timings.
+        """
+        for name in MODEL_FILES:
+            if not os.path.isfile(self.model_path(version, name)):
+                raise ModelVersionError(f"Version {version} has no {MODEL_FILES[name]}", status_code=404)
+
+        def build(name):
+            path, used_precision = self.resolve(version, name, precision)
+            cache_dir = self.session_kwargs.get("optimized_cache_dir")
+            phases = {"file": os.path.basename(path), "precision": used_precision, "optimized_cache": "off"}
+            if cache_dir:
+                cached = os.path.isfile(optimized_model_path(path, select_providers(self.use_gpu), cache_dir))
+                phases["optimized_cache"] = "hit" if cached else "miss"
+
+            started = time.perf_counter()
+            pool = load_session_pool(path, sessions, self.use_gpu, **self.session_kwargs)
+            loaded = time.perf_counter()
+            try:
+                self._check_compatible(name, pool)
+                self._warm_up(pool)
+            except Exception:
+                pool.close()
+                raise
+            phases["load_ms"] = round((loaded - started) * 1000.0, 1)
+            phases["warmup_ms"] = round((time.perf_counter() - loaded) * 1000.0, 1)
+            return pool, phases
+
+        with ThreadPoolExecutor(max_workers=len(MODEL_FILES)) as executor:
+            futures = {name: executor.submit(build, name) for name in MODEL_FILES}
+
+        pools, phases, errors = {}, {}, []
+        for name, future in futures.items():
+            try:
+                pools[name], phases[name] = future.result()
+            except Exception as e:
+                errors.append(e)
+        if errors:
+            for pool in pools.values():
+                pool.close()
+            raise errors[0]
+        return pools, phases
+
+    def _check_compatible(self, name: str, pool: SessionPool):
+        # Batchers and routes keep using the inputs, batch size and output layout of the current version
+        slot = self.slots.get(name)
+        if slot is None:
+            return
+        current, new = _signature(slot), _signature(pool)
+        current_names, new_names = [i[0] for i in current["inputs"]], [i[0] for i in new["inputs"]]
+        problems = []
+        if new_names != current_names:
+            problems.append(f"inputs {new_names} vs {current_names}")
+        else:
+            for (input_name, dtype, dims), (_, current_dtype, current_dims) in zip(new["inputs"], current["inputs"]):
+                if dtype != current_dtype or len(dims) != len(current_dims) or not _dims_fit(dims[1:], current_dims[1:]):
+                    problems.append(f"input {input_name!r} is {dtype} {dims}, deployed {current_dtype} {current_dims}")
+                # A fixed batch dimension only takes batches of exactly that size
+                elif _fixed(dims[0]) and dims[0] != current_dims[0] and not dims[0] == self.max_batch_size == 1:
+                    problems.append(f"input {input_name!r} has a fixed batch size of {dims[0]}, "
+                                    f"batches of up to {self.max_batch_size} are sent")
+        if [len(dims) for dims in new["outputs"]] != [len(dims) for dims in current["outputs"]]:
+            problems.append(f"output shapes {new['outputs']} vs {current['outputs']}")
+        if problems:
+            raise ModelVersionError(f"{name} model is incompatible with the deployed one: {'; '.join(problems)}")
+
+    def _warm_up(self, pool: SessionPool):
+        # First runs allocate arenas and pick kernels; pay for that before taking traffic
+        for session in pool.sessions:
+            feed = dummy_inputs(session)
+            for _ in range(self.warmup_runs):
+                session.run(None, feed)
+
+    def deploy(self, version: str, on_activate=None, lazy: bool = False, precision: str = None) -> dict:
+        """
+        Build, warm up and activate `version` (all slots are swapped under one
+        lock), then release the previous sessions. Blocking; run it off the event loop.
+
+        `on_activate(version)` is called right after the swap, e.g. to
+        invalidate results cached for the previous version. With `lazy`, the
+        version goes live with one session per model and the rest of each pool
+        is built in the background (fast cold start; hot reloads keep full capacity).
+        `precision` switches the deployed precision (default: keep the current one).
+        """
+        precision = precision or self.precision
+        if precision not in PRECISIONS:
+            raise ModelVersionError(f"Unknown model precision: {precision}")
+
+        if not self._deploy_lock.acquire(blocking=False):
+            raise ModelVersionError("Another model deployment is in progress", status_code=409)
+
+        started = time.time()
+        self.deployment = {"state": "loading", "version": version, "precision": precision, "started_at": started}
+        try:
+            pools, phases = self._build(version, 1 if lazy else self.pool_size, precision)
+
+            previous = {}
+            with self._swap_lock:
+                for name, pool in pools.items():
+                    if name in self.slots:
+                        previous[name] = self.slots[name].swap(pool, version)
+                    else:
+                        self.slots[name] = ModelSlot(pool, version, self._swap_lock)
+                self.active_version = version
+                self.precision = precision
+                self.model_precisions = {name: phases[name]["precision"] for name in pools}
+                self.deployed_at = time.time()
+                if on_activate is not None:
+                    on_activate(self.cache_tag)
+
+            released = self._release(previous)
+            self.deployment = {
+                "state": "ready",
+                "version": version,
+                "precision": precision,
+                "started_at": started,
+                "finished_at": time.time(),
+                "load_seconds": round(self.deployed_at - started, 3),
+                "providers": select_providers(self.use_gpu),
+                "phases": phases,
+                "previous_released": released,
+            }
+            if lazy and self.pool_size > 1:
+                for name, pool in pools.items():
+                    path = os.path.join(self.version_dir(version), phases[name]["file"])
+                    threading.Thread(target=self._grow, args=(name, path, pool), daemon=True, name=f"grow-{name}").start()
+            return self.describe()
+        except Exception as e:
+            self.deployment = {"state": "failed", "version": version, "precision": precision, "started_at": started, "finished_at": time.time(), "error": str(e)}
+            raise
+        finally:
+            self._deploy_lock.release()
+
+    def _grow(self, name: str, path: str, pool: SessionPool):
+        # Fill a lazily deployed pool up to pool_size, one warmed session at a time
+        while pool.size < self.pool_size and self.slots[name].pool is pool:
+            try:
+                session = load_onnx_model(path, self.use_gpu, **self.session_kwargs)
+                for _ in range(self.warmup_runs):
+                    session.run(None, dummy_inputs(session))
+            except Exception as e:
+                print(f"Could not add a {name} session: {e}")
+                return
+            if self.slots[name].pool is not pool:
+                return  # replaced by a newer deployment meanwhile
+            pool.add(session)
+
+    def _release(self, previous: dict) -> bool:
+        # Wait for calls still running on the old pools, then drop their sessions
+        drained = True
+        for name, pool in previous.items():
+            if self.slots[name].drain(pool, self.drain_timeout):
+                pool.close()
+            else:
+                drained = False  # still in use: left to the garbage collector once the calls return
+        previous.clear()
+        gc.collect()
+        return drained
+
+    def save_version(self, version: str, files: dict) -> dict:
+        """
+        Store uploaded model files as a new, immutable version.
+
+        Args:
+            version (str): new version id.
+            files (dict): model name -> readable binary file object. Models not
+                uploaded are copied from the active version.
+        """
+        directory = self.version_dir(version)
+        if os.path.exists(directory):
+            raise ModelVersionError(f"Version {version} already exists", status_code=409)
+        unknown = set(files) - set(MODEL_FILES)
+        if unknown:
+            raise ModelVersionError(f"Unknown model(s): {sorted(unknown)}")
+        if not files:
+            raise ModelVersionError("Upload at least one model file")
+
+        os.makedirs(self.root, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=f".{version}-", dir=self.root)
+        try:
+            for name, file_name in MODEL_FILES.items():
+                target = os.path.join(staging, file_name)
+                if name in files:
+                    with open(target, "wb") as out:
+                        shutil.copyfileobj(files[name], out, length=1024 * 1024)
+                elif self.active_version is not None:
+                    shutil.copy2(self.model_path(self.active_version, name), target)
+
+            # Fail fast on files ONNX Runtime cannot load or that do not fit the deployment
+            for name in files:
+                try:
+                    pool = load_session_pool(os.path.join(staging, MODEL_FILES[name]), 1, False)
+                except Exception as e:
+                    raise ModelVersionError(f"Invalid {name} model: ONNX Runtime could not load it") from e
+                try:
+                    self._check_compatible(name, pool)
+                finally:
+                    pool.close()
+
+            os.rename(staging, directory)
+        except ModelVersionError:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        except Exception as e:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise ModelVersionError(f"Invalid model upload: {e}") from e
+
+        return next(v for v in self.versions() if v["version"] == version)
+
+    def delete_version(self, version: str):
+        directory = self.version_dir(version)
+        deploying = self.deployment.get("state") == "loading" and self.deployment.get("version") == version
+        if version == self.active_version or deploying:
+            raise ModelVersionError(f"Version {version} is in use", status_code=409)
+        if not os.path.isdir(directory):
+            raise ModelVersionError(f"Version {version} not found", status_code=404)
+        shutil.rmtree(directory)
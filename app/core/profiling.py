@@ -0,0 +1,105 @@
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from .model_loader import load_onnx_model
+
+# ORT trace events of one operator execution are "<node name>_kernel_time"
+_KERNEL_SUFFIX = "_kernel_time"
+
+
+def capture_profile(model_path: str, feeds: list, runs: int = 20, warmup: int = 3, output_dir: str = None,
+                    top: int = 15, **session_kwargs) -> dict:
+    """
+    Run `feeds` (cycled) through a temporary profiling-enabled session of
+    `model_path` and aggregate the ONNX Runtime trace.
+
+    The session is built like the serving ones (`session_kwargs` go to
+    load_onnx_model) but is never shared. The first `warmup` runs are left
+    out of the aggregates. The trace file is written to `output_dir` and
+    kept; without one it goes to a temporary directory and is deleted.
+
+    Returns:
+        dict with the summary (see `summarize_trace`), the Chrome trace
+        events under "traceEvents" and, with `output_dir`, "trace_file".
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = output_dir or tmp
+        os.makedirs(directory, exist_ok=True)
+        stem = os.path.splitext(os.path.basename(model_path))[0]
+        session = load_onnx_model(model_path, profile_prefix=os.path.join(directory, f"{stem}-profile"), **session_kwargs)
+
+        started = time.perf_counter()
+        for i in range(warmup + runs):
+            session.run(None, feeds[i % len(feeds)])
+        elapsed = time.perf_counter() - started
+
+        trace_file = session.end_profiling()
+        del session
+        with open(trace_file) as f:
+            events = json.load(f)
+        if output_dir is None:
+            trace_file = None
+
+    return {
+        **summarize_trace(events, skip_runs=warmup, top=top),
+        "providers": sorted({event["args"]["provider"] for event in events
+                             if event.get("cat") == "Node" and "provider" in event.get("args", {})}),
+        "capture_seconds": round(elapsed, 3),
+        "trace_file": trace_file,
+        "traceEvents": events,
+    }
+
+
+def summarize_trace(events: list, skip_runs: int = 0, top: int = 15) -> dict:
+    """
+    Aggregate ORT profile events: run latency, and kernel time per operator
+    type and per node (top `top` of each), leaving out the first `skip_runs` runs.
+    """
+    model_runs = sorted((event for event in events if event.get("cat") == "Session" and event.get("name") == "model_run"),
+                        key=lambda event: event["ts"])
+    measured = model_runs[skip_runs:]
+    since = measured[0]["ts"] if measured else float("inf")
+
+    operators, nodes = {}, {}
+    for event in events:
+        name = event.get("name", "")
+        if event.get("cat") != "Node" or not name.endswith(_KERNEL_SUFFIX) or event["ts"] < since:
+            continue
+        args = event.get("args", {})
+        op_type = args.get("op_name", "?")
+        duration = event.get("dur", 0)
+
+        node_name = name[:-len(_KERNEL_SUFFIX)]
+        operator = operators.setdefault(op_type, {"op_type": op_type, "calls": 0, "total_us": 0})
+        node = nodes.setdefault(node_name, {"node": node_name, "op_type": op_type, "provider": args.get("provider"),
+                                            "calls": 0, "total_us": 0})
+        for entry in (operator, node):
+            entry["calls"] += 1
+            entry["total_us"] += duration
+
+    total_us = sum(operator["total_us"] for operator in operators.values())
+    run_ms = np.array([event["dur"] for event in measured], dtype=np.float64) / 1000.0
+
+    def ranked(entries: dict) -> list:
+        return [{
+            **{k: v for k, v in entry.items() if k != "total_us"},
+            "total_ms": round(entry["total_us"] / 1000.0, 3),
+            "mean_us": round(entry["total_us"] / entry["calls"], 1),
+            "share": round(entry["total_us"] / total_us, 4),
+        } for entry in sorted(entries.values(), key=lambda entry: entry["total_us"], reverse=True)[:top]]
+
+    return {
+        "runs": len(measured),
+        "run_ms": {
+            "mean": round(float(run_ms.mean()), 3),
+            "p50": round(float(np.percentile(run_ms, 50)), 3),
+            "p95": round(float(np.percentile(run_ms, 95)), 3),
+        } if run_ms.size else None,
+        "kernel_ms_per_run": round(total_us / 1000.0 / max(len(measured), 1), 3),
+        "operators": ranked(operators),
+        "nodes": ranked(nodes),
+    }
@@ -0,0 +1,147 @@
+"""
+Offline INT8 quantization of a stored model version.
+
+    python -m app.core.quantization --version v1 --precision int8-static --calibration-dir samples/frames/
+    python -m app.core.quantization --version v1 --precision int8-dynamic
+
+Variants are written next to the FP32 models (see model_loader.variant_path)
+and deployed with MODEL_PRECISION or POST /model/reload?precision=.
+Requires the `onnx` package in addition to onnxruntime.
+"""
+import argparse
+import glob
+import os
+import sys
+
+import cv2
+import onnxruntime as ort
+
+from .model_loader import PRECISIONS, get_input_size, variant_path
+
+try:
+    from onnxruntime.quantization import (
+        CalibrationDataReader, CalibrationMethod, QuantFormat, QuantType, quantize_dynamic, quantize_static,
+    )
+except ImportError:  # onnx is not installed
+    CalibrationDataReader = object
+    quantize_dynamic = quantize_static = None
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+class FrameCalibrationReader(CalibrationDataReader):
+    """
+    Feeds sample camera frames, preprocessed exactly as at serving time, to
+    the static quantization calibrator. Frames are read one at a time.
+    """
+
+    def __init__(self, model_path: str, calibration_dir: str, max_frames: int = 200):
+        from ..features.detect import preprocess_image
+
+        session = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+        self.input_name = session.get_inputs()[0].name
+        self.input_size = get_input_size(session)
+        self.preprocess = preprocess_image
+        self.paths = sorted(
+            path for path in glob.glob(os.path.join(calibration_dir, "*"))
+            if path.lower().endswith(IMAGE_EXTENSIONS)
+        )[:max_frames]
+        if not self.paths:
+            raise ValueError(f"No calibration frames in {calibration_dir}")
+        self._paths = iter(self.paths)
+
+    def get_next(self):
+        for path in self._paths:
+            image = cv2.imread(path, cv2.IMREAD_COLOR)
+            if image is not None:
+                return {self.input_name: self.preprocess(image, self.input_size)}
+        return None
+
+    def rewind(self):
+        self._paths = iter(self.paths)
+
+
+def quantize_model(model_path: str, precision: str, calibration_dir: str = None, max_frames: int = 200,
+                   calibrate_method: str = "MinMax", per_channel: bool = False) -> str:
+    """
+    Write the `precision` variant of `model_path` and return its path.
+
+    int8-dynamic quantizes weights to int8 and activations at run time.
+    int8-static inserts QDQ pairs with uint8 activations and int8 weights,
+    using ranges calibrated on the frames in `calibration_dir`.
+    """
+    if quantize_static is None:
+        raise RuntimeError("Quantization requires the onnx package: pip install onnx")
+    if precision == "fp32" or precision not in PRECISIONS:
+        raise ValueError(f"Not a quantized precision: {precision}")
+
+    output_path = variant_path(model_path, precision)
+    staging_path = f"{output_path}.tmp"
+
+    if precision == "int8-dynamic":
+        quantize_dynamic(model_path, staging_path, weight_type=QuantType.QInt8, per_channel=per_channel)
+    else:
+        if not calibration_dir:
+            raise ValueError("int8-static needs a calibration directory of sample frames")
+        reader = FrameCalibrationReader(model_path, calibration_dir, max_frames)
+        print(f"Calibrating {os.path.basename(model_path)} on {len(reader.paths)} frames ({calibrate_method})")
+        quantize_static(
+            model_path, staging_path, reader,
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=per_channel,
+            calibrate_method=CalibrationMethod[calibrate_method],
+        )
+
+    # Never leave a half-written variant where the registry would pick it up
+    os.replace(staging_path, output_path)
+    return output_path
+
+
+def quantize_version(root: str, version: str, precision: str, models: list = None, **kwargs) -> dict:
+    """
+    Quantize the models of a stored version; returns model name -> variant path.
+    """
+    from .model_registry import MODEL_FILES
+
+    written = {}
+    for name in models or list(MODEL_FILES):
+        model_path = os.path.join(root, version, MODEL_FILES[name])
+        if not os.path.isfile(model_path):
+            raise FileNotFoundError(f"ONNX model not found at: {model_path}")
+        written[name] = quantize_model(model_path, precision, **kwargs)
+    return written
+
+
+def main(argv=None) -> int:
+    from . import config
+
+    parser = argparse.ArgumentParser(description="Build INT8 variants of a stored model version")
+    parser.add_argument("--version", default=config.MODEL_VERSION)
+    parser.add_argument("--precision", required=True, choices=[p for p in PRECISIONS if p != "fp32"])
+    parser.add_argument("--model-dir", default=config.MODEL_DIR)
+    parser.add_argument("--models", nargs="+", choices=["detection", "segmentation"], help="default: both")
+    parser.add_argument("--calibration-dir", help="sample frames for int8-static")
+    parser.add_argument("--max-frames", type=int, default=200)
+    parser.add_argument("--calibrate-method", default="MinMax", choices=["MinMax", "Entropy", "Percentile"])
+    parser.add_argument("--per-channel", action="store_true", help="per-channel weight scales")
+    args = parser.parse_args(argv)
+
+    options = {"per_channel": args.per_channel}
+    if args.precision == "int8-static":
+        options.update(calibration_dir=args.calibration_dir, max_frames=args.max_frames, calibrate_method=args.calibrate_method)
+
+    try:
+        written = quantize_version(args.model_dir, args.version, args.precision, args.models, **options)
+    except (ValueError, RuntimeError, FileNotFoundError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+
+    for name, path in written.items():
+        print(f"{name}: {path} ({os.path.getsize(path)} bytes)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
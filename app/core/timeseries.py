@@ -0,0 +1,349 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from ..features.detect import COUNT_CLASSES
+
+# Every tier stores the same columns; raw samples have congestion_score_max == congestion_score and samples == 1
+COLUMNS = ("vehicle_count", *COUNT_CLASSES, "congestion_score", "congestion_score_max", "samples")
+_SCORE, _SCORE_MAX, _SAMPLES = COLUMNS.index("congestion_score"), COLUMNS.index("congestion_score_max"), COLUMNS.index("samples")
+
+# Tier name -> bucket width in seconds (0: one row per recorded result)
+TIERS = {"raw": 0, "1m": 60, "1h": 3600}
+ROLLUP_TIERS = ("1m", "1h")
+
+
+class RingSeries:
+    """
+    Fixed-capacity time series: a float64 timestamp ring and a float32 row per
+    timestamp. Appends are O(1) and overwrite the oldest row when full.
+
+    Timestamps must be appended in order, so the ring is two sorted runs and
+    a range lookup is a binary search in each.
+    """
+
+    def __init__(self, capacity: int, complete: bool = False):
+        self.capacity = max(1, int(capacity))
+        self.timestamps = np.zeros(self.capacity, dtype=np.float64)
+        self.values = np.zeros((self.capacity, len(COLUMNS)), dtype=np.float32)
+        self.head = 0  # next write position
+        self.size = 0
+        # Holds all history of the series until the first overwrite
+        self.complete = complete
+
+    def append(self, timestamp: float, row: np.ndarray):
+        if self.size == self.capacity:
+            self.complete = False
+        self.timestamps[self.head] = timestamp
+        self.values[self.head] = row
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def _runs(self) -> list:
+        """
+        Physical (start, stop) index runs in chronological order.
+        """
+        if self.size < self.capacity:
+            return [(0, self.size)]
+        return [(self.head, self.capacity), (0, self.head)]
+
+    @property
+    def oldest(self) -> float:
+        return float(self.timestamps[self._runs()[0][0]]) if self.size else None
+
+    def covers(self, start: float) -> bool:
+        """
+        Whether every row from `start` on is still in the ring.
+        """
+        return self.complete or (self.size > 0 and self.oldest <= start)
+
+    def range(self, start: float, end: float) -> tuple:
+        """
+        Copies of the timestamps and rows in [start, end].
+        """
+        timestamps, values = [], []
+        for lo, hi in self._runs():
+            run = self.timestamps[lo:hi]
+            i = lo + int(np.searchsorted(run, start, side="left"))
+            j = lo + int(np.searchsorted(run, end, side="right"))
+            if j > i:
+                timestamps.append(self.timestamps[i:j])
+                values.append(self.values[i:j])
+        if not timestamps:
+            return np.empty(0, dtype=np.float64), np.empty((0, len(COLUMNS)), dtype=np.float32)
+        return np.concatenate(timestamps), np.concatenate(values)
+
+
+class _Bucket:
+    """
+    Open rollup bucket: sample-weighted sums of the mean columns, max score and sample count.
+    """
+
+    __slots__ = ("start", "sums", "score_max", "samples")
+
+    def __init__(self, start: float):
+        self.start = start
+        self.sums = np.zeros(_SCORE + 1, dtype=np.float64)
+        self.score_max = 0.0
+        self.samples = 0.0
+
+    def add(self, row: np.ndarray):
+        weight = float(row[_SAMPLES])
+        self.sums += row[:_SCORE + 1] * weight
+        self.score_max = max(self.score_max, float(row[_SCORE_MAX]))
+        self.samples += weight
+
+    def row(self) -> np.ndarray:
+        return np.concatenate([self.sums / max(self.samples, 1.0), [self.score_max, self.samples]]).astype(np.float32)
+
+
+class _RoadSeries:
+    def __init__(self, capacities: dict):
+        self.tiers = {tier: RingSeries(capacities[tier], complete=True) for tier in TIERS}
+        self.buckets = dict.fromkeys(ROLLUP_TIERS)
+        self.last = None  # newest recorded timestamp
+        self.lock = threading.Lock()
+
+
+def summarize(values: np.ndarray) -> dict:
+    """
+    Sample-weighted aggregates of rows from any tier.
+    """
+    samples = values[:, _SAMPLES].astype(np.float64)
+    total = float(samples.sum())
+    if not total:
+        return {"samples": 0}
+    means = samples @ values[:, :_SCORE + 1].astype(np.float64) / total
+    return {
+        "samples": int(total),
+        "vehicle_count": round(float(means[0]), 2),
+        "vehicle_count_max": round(float(values[:, 0].max()), 2),
+        "vehicle_count_by_class": {name: round(float(v), 2) for name, v in zip(COUNT_CLASSES, means[1:_SCORE])},
+        "congestion_score": round(float(means[_SCORE]), 4),
+        "congestion_score_max": round(float(values[:, _SCORE_MAX].max()), 4),
+    }
+
+
+class CongestionStore:
+    """
+    In-process per-road time series of stream results.
+
+    Each road keeps three NumPy rings: every recorded result ("raw"), and
+    1-minute and 1-hour rollups with sample-weighted means, the max
+    congestion score and the sample count. Closed rollup rows are written to
+    SQLite by a background thread (raw rows are memory-only) and loaded back
+    on startup. Queries binary-search the sorted ring timestamps and only fall
+    back to SQLite for rollup history that has left memory.
+    """
+
+    def __init__(self, raw_capacity: int = 3000, minute_capacity: int = 1440, hour_capacity: int = 2160,
+                 path: str = None, flush_seconds: float = 5.0, retention_days: float = 365.0):
+        self.capacities = {"raw": raw_capacity, "1m": minute_capacity, "1h": hour_capacity}
+        self.path = path or None
+        self.flush_seconds = flush_seconds
+        self.retention_days = retention_days
+        self._roads = {}
+        self._lock = threading.Lock()
+        self._pending = queue.SimpleQueue()
+        self._stop = threading.Event()
+        self._writer = None
+
+    # -- lifecycle -----------------------------------------------------------
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30.0)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def open(self):
+        """
+        Create the database if needed, load recent rollups into memory and start the writer.
+        """
+        if self.path is None:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        columns = ", ".join(f"{name} REAL NOT NULL" for name in COLUMNS)
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute(
+                    f"CREATE TABLE IF NOT EXISTS congestion_rollups (road_id TEXT NOT NULL, tier TEXT NOT NULL, "
+                    f"ts REAL NOT NULL, {columns}, PRIMARY KEY (road_id, tier, ts)) WITHOUT ROWID"
+                )
+                road_ids = [row[0] for row in connection.execute("SELECT DISTINCT road_id FROM congestion_rollups")]
+                for road_id in road_ids:
+                    road = self._road(road_id)
+                    # Raw results of earlier runs were never persisted
+                    road.tiers["raw"].complete = False
+                    for tier in ROLLUP_TIERS:
+                        ring = road.tiers[tier]
+                        rows = connection.execute(
+                            f"SELECT ts, {', '.join(COLUMNS)} FROM congestion_rollups WHERE road_id = ? AND tier = ? "
+                            "ORDER BY ts DESC LIMIT ?", (road_id, tier, ring.capacity),
+                        ).fetchall()
+                        for row in reversed(rows):
+                            ring.append(row[0], np.asarray(row[1:], dtype=np.float32))
+                        # A full ring may have older rows left in the database
+                        ring.complete = len(rows) < ring.capacity
+                        if rows:
+                            road.last = max(road.last or 0.0, rows[0][0] + TIERS[tier])
+        finally:
+            connection.close()
+
+        self._stop.clear()
+        self._writer = threading.Thread(target=self._write_loop, name="congestion-store-writer", daemon=True)
+        self._writer.start()
+
+    def close(self):
+        """
+        Stop the writer after flushing queued rows. Open buckets are not persisted.
+        """
+        if self._writer is not None:
+            self._stop.set()
+            self._writer.join()
+            self._writer = None
+
+    def _write_loop(self):
+        connection = self._connect()
+        insert = (f"INSERT OR REPLACE INTO congestion_rollups (road_id, tier, ts, {', '.join(COLUMNS)}) "
+                  f"VALUES ({', '.join('?' * (len(COLUMNS) + 3))})")
+        last_prune = 0.0
+        try:
+            while True:
+                stopping = self._stop.wait(self.flush_seconds)
+                rows = []
+                while True:
+                    try:
+                        rows.append(self._pending.get_nowait())
+                    except queue.Empty:
+                        break
+                if rows:
+                    with connection:
+                        connection.executemany(insert, rows)
+
+                now = time.time()
+                if self.retention_days and now - last_prune > 3600:
+                    with connection:
+                        connection.execute("DELETE FROM congestion_rollups WHERE ts < ?", (now - self.retention_days * 86400,))
+                    last_prune = now
+                if stopping:
+                    break
+        finally:
+            connection.close()
+
+    # -- recording -----------------------------------------------------------
+
+    def _road(self, road_id: str) -> _RoadSeries:
+        road = self._roads.get(road_id)
+        if road is None:
+            with self._lock:
+                road = self._roads.setdefault(road_id, _RoadSeries(self.capacities))
+        return road
+
+    def record(self, road_id: str, timestamp: float, counts: dict, congestion_score: float):
+        """
+        Append one result of a road (wall-clock seconds, per-class counts, 0-1 score).
+        """
+        row = np.zeros(len(COLUMNS), dtype=np.float32)
+        for i, name in enumerate(COUNT_CLASSES, start=1):
+            row[i] = counts.get(name, 0)
+        row[0] = sum(counts.values())
+        row[_SCORE] = row[_SCORE_MAX] = congestion_score
+        row[_SAMPLES] = 1.0
+
+        road = self._road(road_id)
+        with road.lock:
+            # Keep the rings sorted if the wall clock steps back
+            if road.last is not None and timestamp < road.last:
+                timestamp = road.last
+            road.last = timestamp
+            road.tiers["raw"].append(timestamp, row)
+            self._roll(road_id, road, "1m", timestamp, row)
+
+    def _roll(self, road_id: str, road: _RoadSeries, tier: str, timestamp: float, row: np.ndarray):
+        width = TIERS[tier]
+        start = timestamp - timestamp % width
+        bucket = road.buckets[tier]
+        if bucket is not None and bucket.start != start:
+            closed = bucket.row()
+            road.tiers[tier].append(bucket.start, closed)
+            if self._writer is not None:
+                self._pending.put((road_id, tier, bucket.start, *closed.tolist()))
+            next_tier = ROLLUP_TIERS.index(tier) + 1
+            if next_tier < len(ROLLUP_TIERS):
+                self._roll(road_id, road, ROLLUP_TIERS[next_tier], bucket.start, closed)
+            bucket = None
+        if bucket is None:
+            bucket = road.buckets[tier] = _Bucket(start)
+        bucket.add(row)
+
+    # -- queries -------------------------------------------------------------
+
+    def has(self, road_id: str) -> bool:
+        return road_id in self._roads
+
+    def roads(self) -> list:
+        return list(self._roads)
+
+    def resolution_for(self, road_id: str, start: float) -> str:
+        """
+        Finest tier that still holds everything from `start` on.
+        """
+        road = self._roads.get(road_id)
+        if road is not None:
+            for tier in ("raw", "1m"):
+                if road.tiers[tier].covers(start):
+                    return tier
+        return "1h"
+
+    def query(self, road_id: str, start: float, end: float, resolution: str = "auto") -> dict:
+        """
+        Rows of a road in [start, end] at `resolution` ("raw", "1m", "1h" or "auto").
+
+        Rollup tiers include the still-open bucket as a partial last row.
+        """
+        if resolution == "auto":
+            resolution = self.resolution_for(road_id, start)
+        if resolution not in TIERS:
+            raise ValueError(f"Unknown resolution: {resolution}")
+
+        road = self._roads.get(road_id)
+        if road is None:
+            return {"resolution": resolution, "timestamps": np.empty(0), "values": np.empty((0, len(COLUMNS)), np.float32)}
+
+        with road.lock:
+            ring = road.tiers[resolution]
+            covered = ring.covers(start)
+            oldest = ring.oldest
+            timestamps, values = ring.range(start, end)
+            bucket = road.buckets.get(resolution)
+            if bucket is not None and start <= bucket.start <= end:
+                timestamps = np.append(timestamps, bucket.start)
+                values = np.vstack([values, bucket.row()])
+
+        if not covered and resolution != "raw" and self.path is not None:
+            older_ts, older_values = self._query_db(road_id, resolution, start, min(end, oldest) if oldest is not None else end)
+            if oldest is not None:
+                keep = older_ts < oldest
+                older_ts, older_values = older_ts[keep], older_values[keep]
+            timestamps = np.concatenate([older_ts, timestamps])
+            values = np.concatenate([older_values, values])
+
+        return {"resolution": resolution, "timestamps": timestamps, "values": values}
+
+    def _query_db(self, road_id: str, tier: str, start: float, end: float) -> tuple:
+        connection = sqlite3.connect(self.path, timeout=30.0)
+        try:
+            rows = connection.execute(
+                f"SELECT ts, {', '.join(COLUMNS)} FROM congestion_rollups "
+                "WHERE road_id = ? AND tier = ? AND ts >= ? AND ts <= ? ORDER BY ts", (road_id, tier, start, end),
+            ).fetchall()
+        finally:
+            connection.close()
+        data = np.asarray(rows, dtype=np.float64).reshape(-1, len(COLUMNS) + 1)
+        return data[:, 0], data[:, 1:].astype(np.float32)
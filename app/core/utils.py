@@ -0,0 +1,153 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import cv2
+
+_REDUCED_FLAGS = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+# Start-of-frame markers carrying the image size (SOF0-SOF15 except DHT, JPG and DAC)
+_JPEG_SOF = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+_scratch = threading.local()
+
+
+def decode_image(data: bytes, flags: int = cv2.IMREAD_COLOR):
+    """
+    Decode an uploaded image buffer. Returns None if the bytes are not a valid image.
+    """
+    nparr = np.frombuffer(data, np.uint8)
+    return cv2.imdecode(nparr, flags)
+
+
+def jpeg_dimensions(data: bytes) -> tuple:
+    """
+    (width, height) from a JPEG's frame header without decoding it, or None
+    for anything that is not a readable JPEG.
+    """
+    if data[:2] != b"\xff\xd8":
+        return None
+    i, end = 2, len(data)
+    while i + 4 <= end:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:  # fill byte
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:  # standalone markers
+            i += 2
+            continue
+        length = int.from_bytes(data[i + 2:i + 4], "big")
+        if marker in _JPEG_SOF:
+            if i + 9 > end:
+                return None
+            height = int.from_bytes(data[i + 5:i + 7], "big")
+            width = int.from_bytes(data[i + 7:i + 9], "big")
+            return (width, height) if width and height else None
+        i += 2 + length
+    return None
+
+
+def reduced_decode_factor(width: int, height: int, min_side: int) -> int:
+    """
+    Largest JPEG DCT scale-down (8, 4 or 2) that keeps the shorter side at
+    least `min_side` pixels, or 1 for a full decode.
+    """
+    for factor in (8, 4, 2):
+        if min(width, height) // factor >= min_side:
+            return factor
+    return 1
+
+
+def decode_image_reduced(data: bytes, min_side: int) -> tuple:
+    """
+    Decode an uploaded image no larger than needed. JPEGs whose shorter side
+    is at least twice `min_side` are decoded at 1/2, 1/4 or 1/8 scale, which
+    skips most of the IDCT and color conversion work for 4K frames.
+
+    Returns:
+        (image, frame_shape): the decoded image and the (height, width, 3)
+        of the full-resolution frame, which results are reported in.
+        (None, None) if the bytes are not a valid image.
+    """
+    size = jpeg_dimensions(data) if min_side > 0 else None
+    factor = reduced_decode_factor(*size, min_side) if size else 1
+    image = decode_image(data, _REDUCED_FLAGS[factor])
+    if image is None:
+        return None, None
+    if factor == 1:
+        return image, image.shape
+
+    width, height = size
+    # The decoder applies EXIF orientation, which can swap the axes
+    if abs(image.shape[0] * factor - height) >= factor:
+        width, height = height, width
+    return image, (height, width, image.shape[2])
+
+
+def scale_shape(shape: tuple, image: np.ndarray) -> tuple:
+    """
+    (scale_y, scale_x) from `image` pixels to a frame of `shape`.
+    """
+    return shape[0] / image.shape[0], shape[1] / image.shape[1]
+
+
+def _scratch_buffer(name: str, shape: tuple, dtype) -> np.ndarray:
+    buffers = getattr(_scratch, name, None)
+    if buffers is None:
+        buffers = {}
+        setattr(_scratch, name, buffers)
+    buffer = buffers.get(shape)
+    if buffer is None:
+        buffer = buffers[shape] = np.empty(shape, dtype=dtype)
+    return buffer
+
+
+def resize_normalize(image: np.ndarray, size: tuple, out: np.ndarray = None) -> np.ndarray:
+    """
+    Resize a BGR frame to `size` (width, height) and return it as a contiguous
+    1x3xHxW float32 tensor in [0, 1].
+
+    Resizing and scaling run on per-thread scratch buffers, and the HWC->CHW
+    transpose is a single copy into the output, so the output (or `out`, when
+    given) is the only per-frame allocation.
+    """
+    width, height = size
+    shape = (height, width, image.shape[2])
+    resized = _scratch_buffer("resized", shape, np.uint8)
+    scaled = _scratch_buffer("scaled", shape, np.float32)
+    cv2.resize(image, size, dst=resized)
+    np.divide(resized, np.float32(255.0), out=scaled)
+
+    if out is None:
+        out = np.empty((1, shape[2], height, width), dtype=np.float32)
+    out[0] = scaled.transpose(2, 0, 1)
+    return out
+
+
+def encode_image(image: np.ndarray, ext: str = ".png", params: list = None) -> bytes:
+    """
+    Encode an image to the given format and return the raw bytes.
+    """
+    ok, buffer = cv2.imencode(ext, image, params or [])
+    if not ok:
+        raise ValueError(f"Could not encode image as {ext}")
+    return buffer.tobytes()
+
+
+class StageTimings:
+    """
+    Collect wall-clock durations of named pipeline stages, in milliseconds.
+    """
+
+    def __init__(self):
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = round((time.perf_counter() - start) * 1000.0, 3)
@@ -0,0 +1,140 @@
+import asyncio
+import time
+
+import httpx
+
+from .metrics import WEBHOOK_DELIVERIES, WEBHOOK_LATENCY
+
+# Worth retrying: rate limiting, timeouts reported by the receiver and server errors
+RETRY_STATUSES = {408, 425, 429}
+
+
+class WebhookDispatcher:
+    """
+    Deliver JSON notifications with a pooled async HTTP client.
+
+    `submit` is thread-safe and never blocks: payloads are queued for
+    `max_concurrency` worker tasks sharing one keep-alive connection pool.
+    Failed deliveries (connection errors, 5xx, 408/425/429) are retried up to
+    `retries` times with exponential backoff; other 4xx responses are not.
+    When the queue is full new notifications are dropped.
+
+    `transport` replaces the network, e.g. `httpx.MockTransport` or an
+    `httpx.ASGITransport` around a local stand-in receiver.
+    """
+
+    def __init__(self, max_concurrency: int = 16, max_queue: int = 10000, timeout: float = 5.0,
+                 retries: int = 3, backoff: float = 0.5, transport: httpx.AsyncBaseTransport = None):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.transport = transport
+        self._loop = None
+        self._queue = None
+        self._client = None
+        self._workers = []
+        self.stats = {"queued": 0, "delivered": 0, "failed": 0, "retried": 0, "dropped": 0}
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(self.max_queue)
+        self._client = httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency),
+            transport=self.transport,
+            headers={"User-Agent": "smart-traffic-analyzer-webhooks"},
+        )
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.max_concurrency)]
+
+    async def stop(self, timeout: float = 5.0):
+        """
+        Give queued notifications up to `timeout` seconds to go out, then cancel the rest.
+        """
+        if self._queue is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        await self._client.aclose()
+        self._queue = None
+
+    def submit(self, url: str, payload: dict) -> bool:
+        """
+        Queue `payload` for delivery to `url`; callable from any thread.
+        """
+        if self._loop is None or self._loop.is_closed():
+            self._drop()
+            return False
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            return self._enqueue(url, payload)
+        self._loop.call_soon_threadsafe(self._enqueue, url, payload)
+        return True
+
+    def _enqueue(self, url: str, payload: dict) -> bool:
+        if self._queue is None:
+            self._drop()
+            return False
+        try:
+            self._queue.put_nowait((url, payload))
+        except asyncio.QueueFull:
+            self._drop()
+            return False
+        self.stats["queued"] += 1
+        return True
+
+    def _drop(self):
+        self.stats["dropped"] += 1
+        WEBHOOK_DELIVERIES.inc(1, "dropped")
+
+    async def _work(self):
+        while True:
+            url, payload = await self._queue.get()
+            try:
+                await self.deliver(url, payload)
+            finally:
+                self._queue.task_done()
+
+    async def deliver(self, url: str, payload: dict) -> bool:
+        """
+        POST `payload` to `url`, retrying transient failures. Returns whether it was accepted.
+        """
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.stats["retried"] += 1
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+            start = time.perf_counter()
+            try:
+                response = await self._client.post(url, json=payload)
+            except httpx.HTTPError:
+                continue
+            finally:
+                WEBHOOK_LATENCY.observe(time.perf_counter() - start)
+
+            if response.is_success:
+                self.stats["delivered"] += 1
+                WEBHOOK_DELIVERIES.inc(1, "delivered")
+                return True
+            if response.status_code < 500 and response.status_code not in RETRY_STATUSES:
+                break
+
+        self.stats["failed"] += 1
+        WEBHOOK_DELIVERIES.inc(1, "failed")
+        return False
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "max_concurrency": self.max_concurrency,
+        }
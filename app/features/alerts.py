@@ -0,0 +1,257 @@
+import bisect
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from ..core.metrics import ALERT_EVENTS
+from ..core.webhooks import WebhookDispatcher
+
+METRICS = ("congestion_score", "vehicle_count")
+CONDITIONS = ("above", "below")
+# Fields that decide when an alert matches; changing one re-indexes it and resets its state
+_MATCH_FIELDS = ("road_id", "metric", "condition", "threshold")
+
+
+class ThresholdIndex:
+    """
+    Alert ids of one road/metric/condition sorted by threshold.
+
+    The alerts matching a value are a prefix ("above": threshold <= value) or
+    a suffix ("below": threshold >= value) of the sorted list, found by
+    binary search.
+    """
+
+    def __init__(self):
+        self.thresholds = []
+        self.ids = []
+
+    def add(self, threshold: float, alert_id: str):
+        i = bisect.bisect_right(self.thresholds, threshold)
+        self.thresholds.insert(i, threshold)
+        self.ids.insert(i, alert_id)
+
+    def remove(self, threshold: float, alert_id: str):
+        i = bisect.bisect_left(self.thresholds, threshold)
+        while self.ids[i] != alert_id:
+            i += 1
+        del self.thresholds[i], self.ids[i]
+
+    def matching(self, value: float, condition: str) -> list:
+        if condition == "above":
+            return self.ids[:bisect.bisect_right(self.thresholds, value)]
+        return self.ids[bisect.bisect_left(self.thresholds, value):]
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class AlertEngine:
+    """
+    Congestion alert subscriptions, evaluated against every analyzed frame of a road.
+
+    An alert fires once its condition has held for `min_duration_seconds`
+    and resolves only when the value is back past the threshold by
+    `hysteresis`, so values hovering around the threshold do not flap. A
+    re-trigger within `cooldown_seconds` of the last notification changes the
+    state but sends nothing (nor the matching resolve).
+
+    Only alerts matched by the new value or already pending/firing are
+    visited: O(log n + matches) per road, metric and condition.
+    """
+
+    def __init__(self, dispatcher: WebhookDispatcher = None):
+        self.dispatcher = dispatcher
+        self._alerts = {}  # alert id -> subscription and state
+        self._indexes = {}  # road id -> {(metric, condition): ThresholdIndex}
+        self._armed = {}  # (road id, metric, condition) -> ids of pending/firing alerts
+        self._lock = threading.Lock()
+
+    # -- subscriptions -------------------------------------------------------
+
+    def create(self, road_id: str, threshold: float, metric: str = "congestion_score", condition: str = "above",
+               webhook_url: str = None, name: str = None, hysteresis: float = 0.0, min_duration_seconds: float = 0.0,
+               cooldown_seconds: float = 0.0, enabled: bool = True) -> dict:
+        alert = {
+            "alert_id": uuid.uuid4().hex,
+            "road_id": road_id,
+            "name": name,
+            "metric": metric,
+            "condition": condition,
+            "threshold": float(threshold),
+            "hysteresis": float(hysteresis),
+            "min_duration_seconds": float(min_duration_seconds),
+            "cooldown_seconds": float(cooldown_seconds),
+            "webhook_url": webhook_url,
+            "enabled": enabled,
+            "created_at": time.time(),
+        }
+        self._validate(alert)
+        self._reset(alert)
+        with self._lock:
+            self._alerts[alert["alert_id"]] = alert
+            if alert["enabled"]:
+                self._index(alert)
+        return self.describe(alert["alert_id"])
+
+    def update(self, alert_id: str, **fields) -> dict:
+        """
+        Change the given fields (None leaves a field as is).
+        """
+        with self._lock:
+            alert = self._get(alert_id)
+            changes = {k: v for k, v in fields.items() if v is not None and k in alert}
+            updated = {**alert, **changes}
+            self._validate(updated)
+
+            rematch = any(updated[k] != alert[k] for k in (*_MATCH_FIELDS, "enabled"))
+            if rematch and alert["enabled"]:
+                self._unindex(alert)
+            alert.update(changes)
+            if rematch:
+                self._reset(alert)
+                if alert["enabled"]:
+                    self._index(alert)
+        return self.describe(alert_id)
+
+    def delete(self, alert_id: str):
+        with self._lock:
+            alert = self._get(alert_id)
+            if alert["enabled"]:
+                self._unindex(alert)
+            del self._alerts[alert_id]
+
+    def describe(self, alert_id: str) -> dict:
+        alert = self._get(alert_id)
+        return {key: value for key, value in alert.items() if key != "notified"}
+
+    def list(self, road_id: str = None) -> list:
+        return [self.describe(alert_id) for alert_id, alert in list(self._alerts.items())
+                if road_id is None or alert["road_id"] == road_id]
+
+    def _get(self, alert_id: str) -> dict:
+        alert = self._alerts.get(alert_id)
+        if alert is None:
+            raise KeyError(f"Unknown alert: {alert_id}")
+        return alert
+
+    @staticmethod
+    def _validate(alert: dict):
+        if alert["metric"] not in METRICS:
+            raise ValueError(f"Unknown metric: {alert['metric']}")
+        if alert["condition"] not in CONDITIONS:
+            raise ValueError(f"Unknown condition: {alert['condition']}")
+        if min(alert["hysteresis"], alert["min_duration_seconds"], alert["cooldown_seconds"]) < 0:
+            raise ValueError("hysteresis, min_duration_seconds and cooldown_seconds must not be negative")
+
+    @staticmethod
+    def _reset(alert: dict):
+        alert.update(state="ok", since=None, last_value=None, last_event=None, last_notified_at=None, notified=False)
+
+    def _index(self, alert: dict):
+        key = (alert["metric"], alert["condition"])
+        self._indexes.setdefault(alert["road_id"], {}).setdefault(key, ThresholdIndex()).add(alert["threshold"], alert["alert_id"])
+
+    def _unindex(self, alert: dict):
+        road_id, key = alert["road_id"], (alert["metric"], alert["condition"])
+        indexes = self._indexes[road_id]
+        indexes[key].remove(alert["threshold"], alert["alert_id"])
+        if not indexes[key]:
+            del indexes[key]
+            if not indexes:
+                del self._indexes[road_id]
+        armed = self._armed.get((road_id, *key))
+        if armed is not None:
+            armed.discard(alert["alert_id"])
+
+    # -- evaluation ----------------------------------------------------------
+
+    def evaluate(self, road_id: str, values: dict, timestamp: float = None) -> list:
+        """
+        Step the alerts of `road_id` with new metric values; returns the events sent.
+        """
+        if road_id not in self._indexes:
+            return []
+        timestamp = time.time() if timestamp is None else timestamp
+        events = []
+        with self._lock:
+            for (metric, condition), index in self._indexes.get(road_id, {}).items():
+                value = values.get(metric)
+                if value is None:
+                    continue
+                armed = self._armed.setdefault((road_id, metric, condition), set())
+                matched = index.matching(value, condition)
+                for alert_id in matched:
+                    self._step(self._alerts[alert_id], True, value, timestamp, armed, events)
+                if armed:
+                    for alert_id in armed.difference(matched):
+                        self._step(self._alerts[alert_id], False, value, timestamp, armed, events)
+
+        for event, url in events:
+            ALERT_EVENTS.inc(1, event["event"])
+            if url and self.dispatcher is not None:
+                self.dispatcher.submit(url, event)
+        return [event for event, _ in events]
+
+    def evaluate_result(self, road_id: str, result: dict, tracks: list = None):
+        """
+        StreamPipeline `on_result` hook.
+        """
+        self.evaluate(road_id, {
+            "congestion_score": result["congestion_score"],
+            "vehicle_count": sum(result["vehicle_count"].values()),
+        }, result["timestamp"])
+
+    def _step(self, alert: dict, met: bool, value: float, timestamp: float, armed: set, events: list):
+        alert["last_value"] = value
+        state = alert["state"]
+        if met:
+            if state == "ok":
+                alert["state"], alert["since"] = "pending", timestamp
+                armed.add(alert["alert_id"])
+                state = "pending"
+            if state == "pending" and timestamp - alert["since"] >= alert["min_duration_seconds"]:
+                alert["state"] = "firing"
+                last = alert["last_notified_at"]
+                alert["notified"] = last is None or timestamp - last >= alert["cooldown_seconds"]
+                if alert["notified"]:
+                    alert["last_notified_at"] = timestamp
+                    events.append(self._event(alert, "triggered", value, timestamp))
+            return
+
+        if state == "pending":
+            alert["state"], alert["since"] = "ok", None
+            armed.discard(alert["alert_id"])
+        elif state == "firing":
+            margin = alert["hysteresis"]
+            cleared = value <= alert["threshold"] - margin if alert["condition"] == "above" else value >= alert["threshold"] + margin
+            if cleared:
+                alert["state"], alert["since"] = "ok", None
+                armed.discard(alert["alert_id"])
+                if alert["notified"]:
+                    events.append(self._event(alert, "resolved", value, timestamp))
+                alert["notified"] = False
+
+    @staticmethod
+    def _event(alert: dict, kind: str, value: float, timestamp: float) -> tuple:
+        event = {
+            "event": kind,
+            "alert_id": alert["alert_id"],
+            "name": alert["name"],
+            "road_id": alert["road_id"],
+            "metric": alert["metric"],
+            "condition": alert["condition"],
+            "threshold": alert["threshold"],
+            "value": value,
+            "timestamp": datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat(),
+        }
+        alert["last_event"] = {"event": kind, "value": value, "timestamp": event["timestamp"]}
+        return event, alert["webhook_url"]
+
+    def stats(self) -> dict:
+        return {
+            "alerts": len(self._alerts),
+            "roads": len(self._indexes),
+            "armed": sum(len(armed) for armed in list(self._armed.values())),
+            "webhooks": self.dispatcher.snapshot() if self.dispatcher is not None else None,
+        }
@@ -2,19 +2,28 @@ import numpy as np
 import onnxruntime as ort
 import cv2
 
-def preprocess_image(image: np.ndarray, target_size=(320, 320)) -> np.ndarray:
-    
-    """Resize and normalize the image for model input."""
-    
-    image_resized = cv2.resize(image, target_size)
-    image_normalized = image_resized.astype(np.float32) / 255.0
+from ..core.batching import MicroBatcher
+from ..core import config
+from ..core.metrics import observe_stage
+from ..core.utils import resize_normalize
+from .roi import crop_to_roi, offset_detections, roi_shape
+
+# One row per detection: box [x1, y1, x2, y2] in frame pixels, score, model (COCO) class id
+DETECTION_DTYPE = np.dtype([("box", np.int32, (4,)), ("score", np.float32), ("class", np.int32)])
 
-    image_transposed = np.transpose(image_normalized, (2, 0, 1))  # HWC to CHW
-    image_batched = np.expand_dims(image_transposed, axis=0)  # Add batch dimension
+# COCO class ids counted as vehicles; every other class counts as "others"
+VEHICLE_CLASSES = {2: "car", 5: "bus", 7: "truck", 3: "motorcycle", 1: "bicycle"}
+# Keys of a vehicle count, in the order counts are reported and stored
+COUNT_CLASSES = ("car", "bus", "truck", "motorcycle", "bicycle", "others")
 
-    return image_batched
+def preprocess_image(image: np.ndarray, target_size=(320, 320), out: np.ndarray = None) -> np.ndarray:
+    
+    """Resize and normalize the image for model input (1x3xHxW, fused; see core.utils.resize_normalize)."""
+    
+    return resize_normalize(image, target_size, out)
 
-def run_detections(session: ort.InferenceSession, input_image: np.ndarray, conf_threshold=0.25) -> dict:
+def run_detections(session: ort.InferenceSession, input_image: np.ndarray, conf_threshold=0.25, roi: tuple = None,
+                   frame_shape: tuple = None) -> np.ndarray:
     
     """
     Run inference on the input image and return detections.
@@ -23,42 +32,116 @@ def run_detections(session: ort.InferenceSession, input_image: np.ndarray, conf_
         session (ort.InferenceSession): The ONNX Runtime inference session.
         input_image (np.ndarray): Preprocessed input image.
         conf_threshold (float): Confidence threshold to filter detections.
+        roi (tuple): (x1, y1, x2, y2) region to detect in; boxes are still full-frame.
+        frame_shape (tuple): full-resolution shape when input_image was decoded at reduced scale.
 
     Returns:
-        List of detections: [{"box": [x1, y1, x2, y2], "score": float, "class_id": int}, ...]
+        Structured array of DETECTION_DTYPE rows ("box", "score", "class").
     """
     
-    input_tensor = preprocess_image(input_image)
+    frame_shape = frame_shape or input_image.shape
+    with observe_stage("preprocess"):
+        input_tensor = preprocess_image(crop_to_roi(input_image, roi, frame_shape))
     inputs = session.get_inputs()[0].name
 
     outputs = session.run(None, {inputs: input_tensor})
 
+    with observe_stage("postprocess_detection"):
+        return offset_detections(postprocess_detections(outputs, roi_shape(roi, frame_shape), conf_threshold), roi)
+
+async def run_detections_async(batcher: MicroBatcher, input_image: np.ndarray, conf_threshold=0.25, roi: tuple = None,
+                               frame_shape: tuple = None) -> np.ndarray:
+    
+    """
+    Same as run_detections, but the inference is queued on a MicroBatcher so
+    concurrent requests share one batched session.run call.
+    """
+    
+    frame_shape = frame_shape or input_image.shape
+    with observe_stage("preprocess"):
+        input_tensor = preprocess_image(crop_to_roi(input_image, roi, frame_shape))
+    outputs = await batcher.submit(input_tensor)
+
+    with observe_stage("postprocess_detection"):
+        return offset_detections(postprocess_detections(outputs, roi_shape(roi, frame_shape), conf_threshold), roi)
+
+def postprocess_detections(outputs: list, image_shape: tuple, conf_threshold=0.25,
+                           iou_threshold=config.DETECTION_IOU_THRESHOLD,
+                           max_detections=config.DETECTION_MAX_DETECTIONS) -> np.ndarray:
+    
+    """
+    Convert raw model outputs for a single frame into detections scaled to image_shape.
+
+    Decoding is vectorized over all predictions, followed by class-aware NMS.
+    The result is a DETECTION_DTYPE array, highest score first.
+    """
+    
     preds = outputs[0][0]  # Assuming the first output contains the predictions
 
-    detections = []
-    for pred in preds:
-        conf = pred[4]
+    preds = preds[preds[:, 4] >= conf_threshold]
+    if len(preds) == 0:
+        return np.empty(0, dtype=DETECTION_DTYPE)
 
-        if conf < conf_threshold:
-            continue
+    # Bound NMS cost on dense frames by keeping only the best-scoring candidates
+    if len(preds) > config.DETECTION_MAX_CANDIDATES:
+        top = np.argpartition(-preds[:, 4], config.DETECTION_MAX_CANDIDATES)[:config.DETECTION_MAX_CANDIDATES]
+        preds = preds[top]
 
-        class_id = np.argmax(pred[5:])
-        x, y, w, h = pred[0:4]
+    scores = preds[:, 4]
+    class_ids = np.argmax(preds[:, 5:], axis=1)
 
-        x1 = int((x - w / 2) * input_image.shape[1])
-        y1 = int((y - h / 2) * input_image.shape[0])
-        x2 = int((x + w / 2) * input_image.shape[1])
-        y2 = int((y + h / 2) * input_image.shape[0])
+    height, width = image_shape[:2]
+    centers, sizes = preds[:, 0:2], preds[:, 2:4]
+    boxes = np.concatenate([centers - sizes / 2, centers + sizes / 2], axis=1) * np.array([width, height, width, height], dtype=np.float32)
 
-        detections.append({"box": [x1, y1, x2, y2], "score": float(conf), "class": int(class_id)})
-    
+    with observe_stage("nms"):
+        keep = non_max_suppression(boxes, scores, class_ids, iou_threshold, max_detections)
+
+    detections = np.empty(len(keep), dtype=DETECTION_DTYPE)
+    detections["box"] = boxes[keep]  # Truncates like int() did
+    detections["score"] = scores[keep]
+    detections["class"] = class_ids[keep]
     return detections
 
-def draw_boxes(image, detections):
-    for det in detections:
-        x1, y1, x2, y2 = det["box"]
-        score = det["score"]
-        class_id = det["class"]
+def non_max_suppression(boxes: np.ndarray, scores: np.ndarray, class_ids: np.ndarray,
+                        iou_threshold=config.DETECTION_IOU_THRESHOLD,
+                        max_detections=config.DETECTION_MAX_DETECTIONS) -> np.ndarray:
+    
+    """
+    Class-aware NMS. Boxes of different classes never suppress each other.
+
+    Args:
+        boxes (np.ndarray): Nx4 array of [x1, y1, x2, y2].
+        scores (np.ndarray): N scores.
+        class_ids (np.ndarray): N integer class IDs.
+
+    Returns:
+        Indices of the kept boxes, highest score first.
+    """
+    
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    xywh = np.concatenate([boxes[:, :2], boxes[:, 2:] - boxes[:, :2]], axis=1).astype(np.float32)
+    scores = scores.astype(np.float32)
+
+    # Run NMS per class: each call only compares boxes that can suppress each other
+    order = np.argsort(class_ids, kind="stable")
+    splits = np.flatnonzero(np.diff(class_ids[order])) + 1
+
+    keep = []
+    for idx in np.split(order, splits):
+        kept = cv2.dnn.NMSBoxes(xywh[idx], scores[idx], 0.0, iou_threshold)
+        keep.append(idx[np.asarray(kept, dtype=np.int64).reshape(-1)])
+
+    keep = np.concatenate(keep)
+    keep = keep[np.argsort(-scores[keep], kind="stable")]
+
+    return keep[:max_detections]
+
+def draw_boxes(image, detections: np.ndarray):
+    for (x1, y1, x2, y2), score, class_id in zip(detections["box"].tolist(), detections["score"].tolist(),
+                                                 detections["class"].tolist()):
 
         # Draw bounding box
         cv2.rectangle(image, (x1, y1), (x2, y2), (0, 255, 0), 2)
@@ -0,0 +1,155 @@
+import threading
+import time
+
+import numpy as np
+
+from ..core import config
+from ..core.utils import scale_shape
+
+
+def roi_from_mask(mask: np.ndarray, image_shape: tuple, threshold: int = config.ROAD_MASK_THRESHOLD,
+                  margin: float = config.DETECTION_ROI_MARGIN, max_area: float = config.DETECTION_ROI_MAX_AREA,
+                  min_road: float = 0.01) -> tuple:
+    """
+    Bounding box of the road in a segmentation mask, in full-frame pixels.
+
+    Rows/columns with less than `min_road` road pixels are ignored so stray
+    blobs do not stretch the box. The box is grown by `margin` (a fraction of
+    the frame size) on every side, since vehicles stick out above the road.
+
+    Returns:
+        (x1, y1, x2, y2), or None when there is no road or the box would cover
+        more than `max_area` of the frame (cropping would not gain anything).
+    """
+    road = mask >= threshold
+    mask_height, mask_width = road.shape[:2]
+    rows = np.flatnonzero(np.count_nonzero(road, axis=1) >= max(1, min_road * mask_width))
+    cols = np.flatnonzero(np.count_nonzero(road, axis=0) >= max(1, min_road * mask_height))
+    if not rows.size or not cols.size:
+        return None
+
+    height, width = image_shape[:2]
+    scale_x, scale_y = width / mask_width, height / mask_height
+    x1 = max(0, int((cols[0] - margin * mask_width) * scale_x))
+    y1 = max(0, int((rows[0] - margin * mask_height) * scale_y))
+    x2 = min(width, int(np.ceil((cols[-1] + 1 + margin * mask_width) * scale_x)))
+    y2 = min(height, int(np.ceil((rows[-1] + 1 + margin * mask_height) * scale_y)))
+
+    if (x2 - x1) * (y2 - y1) > max_area * width * height:
+        return None
+    return (x1, y1, x2, y2)
+
+
+def crop_to_roi(image: np.ndarray, roi: tuple, frame_shape: tuple = None) -> np.ndarray:
+    """
+    View of the ROI of a frame (no copy); the frame itself when roi is None.
+    `roi` is in `frame_shape` pixels when the image was decoded at reduced scale.
+    """
+    if roi is None:
+        return image
+    x1, y1, x2, y2 = roi
+    if frame_shape is not None and tuple(frame_shape[:2]) != image.shape[:2]:
+        scale_y, scale_x = scale_shape(frame_shape, image)
+        x1, y1 = int(x1 / scale_x), int(y1 / scale_y)
+        x2, y2 = int(np.ceil(x2 / scale_x)), int(np.ceil(y2 / scale_y))
+    return image[y1:y2, x1:x2]
+
+
+def roi_shape(roi: tuple, frame_shape: tuple) -> tuple:
+    """
+    Shape of the ROI in frame pixels: what detections on the crop are scaled to.
+    """
+    if roi is None:
+        return tuple(frame_shape)
+    return (roi[3] - roi[1], roi[2] - roi[0], *frame_shape[2:])
+
+
+def offset_detections(detections: np.ndarray, roi: tuple) -> np.ndarray:
+    """
+    Map detections made on an ROI crop back to full-frame coordinates, in place.
+    """
+    if roi is None:
+        return detections
+    detections["box"] += np.array([roi[0], roi[1], roi[0], roi[1]], dtype=detections["box"].dtype)
+    return detections
+
+
+class RoiStore:
+    """
+    Per-camera detection ROIs.
+
+    In "auto" mode the ROI of a camera is derived from its road segmentation
+    masks and recomputed every `refresh_seconds`. ROIs set by hand are kept
+    until cleared and apply in "auto" and "manual" mode. "off" disables
+    cropping. Frames without a camera id are never cropped.
+    """
+
+    def __init__(self, mode: str = "auto", refresh_seconds: float = 60.0, margin: float = config.DETECTION_ROI_MARGIN,
+                 max_area: float = config.DETECTION_ROI_MAX_AREA):
+        if mode not in ("auto", "manual", "off"):
+            raise ValueError(f"Unknown ROI mode: {mode}")
+        self.mode = mode
+        self.refresh_seconds = refresh_seconds
+        self.margin = margin
+        self.max_area = max_area
+        self._rois = {}  # camera id -> {"box", "source", "updated_at"}
+        self._lock = threading.Lock()
+
+    def get(self, camera_id: str, image_shape: tuple) -> tuple:
+        """
+        ROI to crop a frame of `image_shape` from `camera_id` to, or None for the full frame.
+        """
+        if self.mode == "off" or not camera_id:
+            return None
+        entry = self._rois.get(camera_id)
+        if entry is None or entry["box"] is None:
+            return None
+
+        height, width = image_shape[:2]
+        x1, y1, x2, y2 = entry["box"]
+        x1, y1, x2, y2 = max(0, x1), max(0, y1), min(width, x2), min(height, y2)
+        if x2 - x1 < 2 or y2 - y1 < 2 or (x1, y1, x2, y2) == (0, 0, width, height):
+            return None
+        return (x1, y1, x2, y2)
+
+    def update_from_mask(self, camera_id: str, mask: np.ndarray, image_shape: tuple):
+        """
+        Re-derive an automatic ROI from a fresh road mask, at most once per refresh interval.
+        """
+        if self.mode != "auto" or not camera_id or mask is None:
+            return
+        now = time.monotonic()
+        entry = self._rois.get(camera_id)
+        if entry is not None and (entry["source"] == "manual" or now - entry["updated_at"] < self.refresh_seconds):
+            return
+
+        box = roi_from_mask(mask, image_shape, margin=self.margin, max_area=self.max_area)
+        with self._lock:
+            # A manual ROI set meanwhile wins
+            current = self._rois.get(camera_id)
+            if current is None or current["source"] == "auto":
+                self._rois[camera_id] = {"box": box, "source": "auto", "updated_at": now}
+
+    def set(self, camera_id: str, box: list):
+        x1, y1, x2, y2 = (int(v) for v in box)
+        if x2 <= x1 or y2 <= y1:
+            raise ValueError("ROI must be [x1, y1, x2, y2] with x2 > x1 and y2 > y1")
+        with self._lock:
+            self._rois[camera_id] = {"box": (x1, y1, x2, y2), "source": "manual", "updated_at": time.monotonic()}
+
+    def clear(self, camera_id: str) -> bool:
+        with self._lock:
+            return self._rois.pop(camera_id, None) is not None
+
+    def describe(self, camera_id: str) -> dict:
+        entry = self._rois.get(camera_id)
+        return {
+            "camera_id": camera_id,
+            "mode": self.mode,
+            "roi": list(entry["box"]) if entry is not None and entry["box"] is not None else None,
+            "source": entry["source"] if entry is not None else None,
+            "age_seconds": round(time.monotonic() - entry["updated_at"], 3) if entry is not None else None,
+        }
+
+    def cameras(self) -> list:
+        return list(self._rois)
@@ -2,52 +2,77 @@ import numpy as np
 import onnxruntime as ort
 import cv2
 
-def preprocess_image(image: np.ndarray, input_size=(320, 320)) -> np.ndarray:
+from ..core import config
+from ..core.batching import MicroBatcher
+from ..core.metrics import observe_stage
+from ..core.utils import resize_normalize
+
+def preprocess_image(image: np.ndarray, input_size=(320, 320), out: np.ndarray = None) -> np.ndarray:
     """
     Preprocess the input image for the segmentation model.
-    Resize, normalize, and add batch dimension.
+    Resize, normalize to [0, 1], HWC -> CHW and add batch dimension, in one pass.
     """
-    # Resize image
-    image_resized = cv2.resize(image, input_size)
-    # Normalize to [0, 1]
-    image_normalized = image_resized.astype(np.float32) / 255.0
-
-    img = np.transpose(image_normalized, (2, 0, 1))  # Change data layout from HWC to CHW
-    img = np.expand_dims(img, axis=0)  # Add batch dimension
-
-    return img
+    return resize_normalize(image, input_size, out)
 
 
 def run_segmentation(model: ort.InferenceSession, image: np.ndarray) -> np.ndarray:
     """
     Run the segmentation model on the preprocessed image and return the mask.
     """
-    input_tensor = preprocess_image(image)
+    with observe_stage("preprocess"):
+        input_tensor = preprocess_image(image)
 
     #ONNX input name
     input_name = model.get_inputs()[0].name
     outputs = model.run(None, {input_name: input_tensor})
+
+    with observe_stage("postprocess_segmentation"):
+        return postprocess_mask(outputs)
+
+
+async def run_segmentation_async(batcher: MicroBatcher, image: np.ndarray) -> np.ndarray:
+    """
+    Same as run_segmentation, but the inference is queued on a MicroBatcher so
+    concurrent requests share one batched model.run call.
+    """
+    with observe_stage("preprocess"):
+        input_tensor = preprocess_image(image)
+    outputs = await batcher.submit(input_tensor)
+
+    with observe_stage("postprocess_segmentation"):
+        return postprocess_mask(outputs)
+
+
+def postprocess_mask(outputs: list) -> np.ndarray:
+    """
+    Extract the road mask for a single frame from the raw model outputs.
+    """
     mask = outputs[0][0, 0]
 
     mask = (mask * 255).astype(np.uint8)  # Scale mask to [0, 255]
     return mask
 
 
-def apply_mask_to_image(image: np.ndarray, mask: np.ndarray, alpha: float = 0.5) -> np.ndarray:
+def apply_mask_to_image(image: np.ndarray, mask: np.ndarray, alpha: float = 0.5,
+                        threshold: int = config.ROAD_MASK_THRESHOLD) -> np.ndarray:
     """
     Overlay road segmentation mask on top of the original image.
     - image: original BGR frame
-    - mask: 2D binary mask (0 = background, 1 = road)
+    - mask: 2D road mask scaled to 0-255; pixels at or above ROAD_MASK_THRESHOLD are road
     - alpha: transparency of overlay
     """
 
     if mask.ndim == 3:
         mask = mask.squeeze()
+    mask = (mask >= threshold).astype(np.uint8)
 
     # Resize mask to match image size
-    mask_resized = cv2.resize(mask.astype(np.uint8),
-                              (image.shape[1], image.shape[0]),
-                              interpolation=cv2.INTER_NEAREST)
+    if mask.shape[:2] == image.shape[:2]:
+        mask_resized = mask
+    else:
+        mask_resized = cv2.resize(mask,
+                                  (image.shape[1], image.shape[0]),
+                                  interpolation=cv2.INTER_NEAREST)
 
     # Create colored mask (green for road)
     road_color = np.array([0, 255, 0], dtype=np.uint8)
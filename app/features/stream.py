@@ -0,0 +1,386 @@
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import cv2
+
+from .detect import run_detections
+from .segment import run_segmentation
+from .tracking import Tracker, CountingLine
+from .roi import RoiStore
+from ..core.cache import MaskCache, scene_signature
+from ..core.timeseries import CongestionStore
+from ..core.metrics import record_camera_frame
+
+
+class DropOldestQueue:
+    """
+    Bounded thread-safe queue. When full, `put` discards the oldest item so
+    consumers always see the most recent frames.
+    """
+
+    def __init__(self, maxsize: int):
+        self._items = deque(maxlen=max(1, maxsize))
+        self._cond = threading.Condition()
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout: float = None):
+        """
+        Pop the oldest queued item, or return None after `timeout` seconds.
+        """
+        with self._cond:
+            if not self._items:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class StreamPipeline:
+    """
+    Ingest a video file or RTSP stream as a bounded pipeline of threads:
+
+        capture/decode -> [queue] -> preprocess + infer -> [queue] -> aggregate
+
+    Frames are sampled at `target_fps`; skipped frames are grabbed but never
+    decoded. When inference falls behind, the oldest pending frame is dropped.
+    Local files are paced at their native frame rate so they behave like a
+    live camera.
+
+    The models only run on every `detection_interval`-th sampled frame; the
+    tracker propagates boxes on the frames in between. With `rois`, detection
+    is cropped to the road's ROI; with `masks`, keyframes reuse the road's
+    segmentation mask until it expires or the scene changes. Every result is
+    recorded in `history`, if given.
+    """
+
+    def __init__(self, road_id: str, source: str, detection_session, segmentation_session,
+                 target_fps: float = 5.0, queue_size: int = 2, on_result=None,
+                 tracker: Tracker = None, detection_interval: int = 1, rois: RoiStore = None, masks: MaskCache = None,
+                 history: CongestionStore = None):
+        self.road_id = road_id
+        self.source = source
+        self.detection_session = detection_session
+        self.segmentation_session = segmentation_session
+        self.target_fps = target_fps
+        self.on_result = on_result
+        self.tracker = tracker or Tracker()
+        self.detection_interval = max(1, detection_interval)
+        self.rois = rois
+        self.masks = masks
+        self.history = history
+
+        self._frames = DropOldestQueue(queue_size)
+        self._results = DropOldestQueue(queue_size)
+        self._stop = threading.Event()
+        self._threads = []
+
+        self.status = "stopped"
+        self.error = None
+        self.frames_read = 0
+        self.frames_sampled = 0
+        self.frames_processed = 0
+        self.frames_detected = 0
+        self.last_result = None
+        self._inference_times = deque(maxlen=100)
+
+    @property
+    def is_file(self) -> bool:
+        return os.path.exists(self.source)
+
+    def start(self):
+        if self.status == "running":
+            return
+        self._stop.clear()
+        self.status = "running"
+        self.error = None
+        self._threads = [
+            threading.Thread(target=target, name=f"stream-{self.road_id}-{name}", daemon=True)
+            for name, target in (("capture", self._capture), ("infer", self._infer), ("aggregate", self._aggregate))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        if self.status == "running":
+            self.status = "stopped"
+
+    def _open(self):
+        capture = cv2.VideoCapture(self.source)
+        if not capture.isOpened():
+            raise RuntimeError(f"Could not open stream source: {self.source}")
+        return capture
+
+    def _capture(self):
+        try:
+            capture = self._open()
+        except Exception as e:
+            self.status, self.error = "error", str(e)
+            return
+
+        is_file = self.is_file
+        source_fps = capture.get(cv2.CAP_PROP_FPS) or 0.0
+        interval = 1.0 / self.target_fps if self.target_fps > 0 else 0.0
+        started = time.monotonic()
+        next_due = started
+
+        try:
+            while not self._stop.is_set():
+                if is_file and source_fps > 0:
+                    # Pace file playback to real time
+                    delay = started + self.frames_read / source_fps - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+
+                if not capture.grab():
+                    if is_file:
+                        self.status = "finished"
+                        break
+                    # Live source hiccup: reconnect after a short pause
+                    capture.release()
+                    if self._stop.wait(1.0):
+                        break
+                    capture = self._open()
+                    continue
+
+                self.frames_read += 1
+                now = time.monotonic()
+                if now < next_due:
+                    continue
+                next_due = max(next_due + interval, now)
+
+                ok, frame = capture.retrieve()
+                if ok:
+                    self.frames_sampled += 1
+                    self._frames.put((time.time(), frame))
+        except Exception as e:
+            self.status, self.error = "error", str(e)
+        finally:
+            capture.release()
+            # Let the downstream stages drain and exit
+            self._frames.put(None)
+
+    def _infer(self):
+        frames_seen, mask = 0, None
+        while True:
+            item = self._frames.get(timeout=0.5)
+            if item is None:
+                if self._stop.is_set() or self.status != "running":
+                    break
+                continue
+
+            timestamp, frame = item
+            keyframe = mask is None or frames_seen % self.detection_interval == 0
+            frames_seen += 1
+
+            if keyframe:
+                start = time.perf_counter()
+                try:
+                    roi = self.rois.get(self.road_id, frame.shape) if self.rois is not None else None
+                    detections = run_detections(self.detection_session, frame, roi=roi)
+                    mask = self._segment(frame)
+                except Exception as e:
+                    self.status, self.error = "error", str(e)
+                    self._stop.set()  # nothing reads frames anymore: release the source too
+                    break
+                self._inference_times.append(time.perf_counter() - start)
+                self.frames_detected += 1
+                tracks = self.tracker.update(detections, timestamp)
+            else:
+                tracks = self.tracker.predict(timestamp)
+
+            self._results.put((timestamp, frame.shape, tracks, mask, self.tracker.stats()))
+
+        self._results.put(None)
+
+    def _segment(self, frame: np.ndarray) -> np.ndarray:
+        if self.masks is None:
+            mask = run_segmentation(self.segmentation_session, frame)
+        else:
+            signature = scene_signature(frame, self.masks.signature_size)
+            mask = self.masks.lookup(self.road_id, signature, frame.shape)
+            if mask is not None:
+                return mask
+            mask = run_segmentation(self.segmentation_session, frame)
+            self.masks.store(self.road_id, signature, frame.shape, mask)
+
+        if self.rois is not None:
+            self.rois.update_from_mask(self.road_id, mask, frame.shape)
+        return mask
+
+    def _aggregate(self):
+        # Imported here: the aggregation helpers live with their routes
+        from ..routes.congestion import vehicle_count, get_congestion_level, get_congestion_score
+        from ..routes.violations import detect_violation
+
+        while True:
+            item = self._results.get(timeout=0.5)
+            if item is None:
+                if self._stop.is_set() or self.status != "running":
+                    break
+                continue
+
+            timestamp, shape, tracks, mask, tracking = item
+            counts = vehicle_count(tracks)
+            result = {
+                "timestamp": timestamp,
+                "vehicle_count": counts,
+                "congestion": get_congestion_level(counts),
+                "congestion_score": get_congestion_score(counts),
+                "violations": len(detect_violation(tracks, mask, shape)),
+                "detections": len(tracks),
+                **tracking,
+            }
+            self.frames_processed += 1
+            self.last_result = result
+            record_camera_frame(self.road_id)
+            if self.history is not None:
+                self.history.record(self.road_id, timestamp, counts, result["congestion_score"])
+
+            if self.on_result is not None:
+                self.on_result(self.road_id, result, tracks)
+
+    def stats(self) -> dict:
+        times = np.asarray(self._inference_times, dtype=np.float64)
+        return {
+            "status": self.status,
+            "error": self.error,
+            "target_fps": self.target_fps,
+            "frames_read": self.frames_read,
+            "frames_sampled": self.frames_sampled,
+            "frames_processed": self.frames_processed,
+            "frames_detected": self.frames_detected,
+            "detection_interval": self.detection_interval,
+            "frames_dropped": self._frames.dropped + self._results.dropped,
+            "inference_ms": float(times.mean() * 1000.0) if times.size else 0.0,
+            "last_result": self.last_result,
+        }
+
+
+class StreamManager:
+    """
+    Registry of monitored roads and their ingestion pipelines. `on_result` is
+    called with every result of every road unless `start` is given another.
+    """
+
+    def __init__(self, detection_session, segmentation_session, default_fps: float = 5.0, queue_size: int = 2,
+                 detection_interval: int = 1, tracker_options: dict = None, rois: RoiStore = None, masks: MaskCache = None,
+                 history: CongestionStore = None, on_result=None):
+        self.detection_session = detection_session
+        self.segmentation_session = segmentation_session
+        self.default_fps = default_fps
+        self.queue_size = queue_size
+        self.detection_interval = detection_interval
+        self.tracker_options = tracker_options or {}
+        self.rois = rois
+        self.masks = masks
+        self.history = history
+        self.on_result = on_result
+        self.roads = {}
+        self._lock = threading.Lock()
+
+    def register(self, road_id: str, stream_url: str, location: str = None, target_fps: float = None,
+                 detection_interval: int = None, counting_line: list = None, meters_per_pixel: float = None) -> dict:
+        with self._lock:
+            if road_id in self.roads:
+                raise KeyError(f"Road already registered: {road_id}")
+            self.roads[road_id] = {
+                "road_id": road_id,
+                "stream_url": stream_url,
+                "location": location,
+                "target_fps": target_fps or self.default_fps,
+                "detection_interval": detection_interval or self.detection_interval,
+                "counting_line": counting_line,
+                "meters_per_pixel": meters_per_pixel,
+                "pipeline": None,
+            }
+            return self.describe(road_id)
+
+    def update(self, road_id: str, **fields) -> dict:
+        road = self._get(road_id)
+        restart = road["pipeline"] is not None and road["pipeline"].status == "running"
+        if restart and any(fields.get(k) is not None for k in ("stream_url", "target_fps", "detection_interval", "counting_line", "meters_per_pixel")):
+            self.stop(road_id)
+        else:
+            restart = False
+
+        for key, value in fields.items():
+            if value is not None:
+                road[key] = value
+
+        if restart:
+            self.start(road_id)
+        return self.describe(road_id)
+
+    def remove(self, road_id: str):
+        self.stop(road_id)
+        with self._lock:
+            self.roads.pop(road_id, None)
+
+    def start(self, road_id: str, on_result=None) -> dict:
+        road = self._get(road_id)
+        pipeline = road["pipeline"]
+        if pipeline is None or pipeline.status != "running":
+            if pipeline is not None:
+                # A failed or finished pipeline may still hold its source and threads
+                pipeline.stop()
+            tracker = Tracker(
+                counting_line=CountingLine(*road["counting_line"]) if road["counting_line"] else None,
+                meters_per_pixel=road["meters_per_pixel"],
+                **self.tracker_options,
+            )
+            pipeline = StreamPipeline(
+                road_id, road["stream_url"], self.detection_session, self.segmentation_session,
+                target_fps=road["target_fps"], queue_size=self.queue_size, on_result=on_result or self.on_result,
+                tracker=tracker, detection_interval=road["detection_interval"], rois=self.rois, masks=self.masks,
+                history=self.history,
+            )
+            road["pipeline"] = pipeline
+            pipeline.start()
+        return self.describe(road_id)
+
+    def stop(self, road_id: str) -> dict:
+        road = self._get(road_id)
+        if road["pipeline"] is not None:
+            road["pipeline"].stop()
+        return self.describe(road_id)
+
+    def stop_all(self):
+        for road_id in list(self.roads):
+            self.stop(road_id)
+
+    def describe(self, road_id: str) -> dict:
+        road = self._get(road_id)
+        pipeline = road["pipeline"]
+        return {
+            "road_id": road["road_id"],
+            "stream_url": road["stream_url"],
+            "location": road["location"],
+            "target_fps": road["target_fps"],
+            "detection_interval": road["detection_interval"],
+            "counting_line": road["counting_line"],
+            "meters_per_pixel": road["meters_per_pixel"],
+            "ingestion": pipeline.stats() if pipeline is not None else {"status": "stopped"},
+        }
+
+    def _get(self, road_id: str) -> dict:
+        road = self.roads.get(road_id)
+        if road is None:
+            raise KeyError(f"Unknown road: {road_id}")
+        return road
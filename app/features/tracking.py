@@ -0,0 +1,270 @@
+import numpy as np
+
+from .detect import DETECTION_DTYPE
+
+# Confirmed tracks: detection fields plus the persistent track id
+TRACK_DTYPE = np.dtype([("track_id", np.int64), *DETECTION_DTYPE.descr])
+
+
+def box_iou_matrix(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """
+    Pairwise IoU between two sets of [x1, y1, x2, y2] boxes.
+
+    Returns:
+        len(boxes_a) x len(boxes_b) matrix.
+    """
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+
+    area_a = np.prod(np.clip(a[:, 2:] - a[:, :2], 0, None), axis=1)
+    area_b = np.prod(np.clip(b[:, 2:] - b[:, :2], 0, None), axis=1)
+    union = area_a[:, None] + area_b[None, :] - inter
+
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+
+def greedy_match(cost: np.ndarray, threshold: float) -> tuple:
+    """
+    Match rows to columns by descending IoU, skipping pairs below `threshold`.
+
+    Returns:
+        (matches as Kx2 array of (row, col), unmatched rows, unmatched cols)
+    """
+    rows, cols = np.nonzero(cost >= threshold)
+    order = np.argsort(-cost[rows, cols], kind="stable")
+
+    used_rows, used_cols, matches = set(), set(), []
+    for r, c in zip(rows[order].tolist(), cols[order].tolist()):
+        if r in used_rows or c in used_cols:
+            continue
+        used_rows.add(r)
+        used_cols.add(c)
+        matches.append((r, c))
+
+    unmatched_rows = np.array([r for r in range(cost.shape[0]) if r not in used_rows], dtype=np.int64)
+    unmatched_cols = np.array([c for c in range(cost.shape[1]) if c not in used_cols], dtype=np.int64)
+    return np.array(matches, dtype=np.int64).reshape(-1, 2), unmatched_rows, unmatched_cols
+
+
+def _to_state(boxes: np.ndarray) -> np.ndarray:
+    """[x1, y1, x2, y2] -> [cx, cy, w, h]"""
+    return np.concatenate([(boxes[:, :2] + boxes[:, 2:]) / 2, boxes[:, 2:] - boxes[:, :2]], axis=1)
+
+
+def _to_boxes(state: np.ndarray) -> np.ndarray:
+    """[cx, cy, w, h] -> [x1, y1, x2, y2]"""
+    half = state[:, 2:4] / 2
+    return np.concatenate([state[:, :2] - half, state[:, :2] + half], axis=1)
+
+
+class CountingLine:
+    """
+    Virtual line across the road. A track is counted once, the first time its
+    center moves from one side of the line to the other.
+    """
+
+    def __init__(self, x1: float, y1: float, x2: float, y2: float):
+        self.p1 = np.array([x1, y1], dtype=np.float64)
+        self.direction = np.array([x2 - x1, y2 - y1], dtype=np.float64)
+        self.counted = set()
+        self.total = 0
+        self.per_class = {}
+
+    def side(self, points: np.ndarray) -> np.ndarray:
+        rel = points - self.p1
+        return np.sign(self.direction[0] * rel[:, 1] - self.direction[1] * rel[:, 0])
+
+    def update(self, track_ids: np.ndarray, class_ids: np.ndarray, previous: np.ndarray, current: np.ndarray):
+        crossed = (self.side(previous) * self.side(current)) < 0
+        for track_id, class_id in zip(track_ids[crossed].tolist(), class_ids[crossed].tolist()):
+            if track_id in self.counted:
+                continue
+            self.counted.add(track_id)
+            self.total += 1
+            self.per_class[class_id] = self.per_class.get(class_id, 0) + 1
+
+    def forget(self, track_ids: np.ndarray):
+        """Drop retired tracks from the counted set; track ids are never reused."""
+        self.counted.difference_update(track_ids.tolist())
+
+
+class Tracker:
+    """
+    SORT-style multi-object tracker for one camera.
+
+    Every track carries a constant-velocity Kalman filter over [cx, cy, w, h].
+    All tracks are predicted and corrected together with batched matrix ops.
+    Detection keyframes go through `update`; frames in between use `predict`
+    to propagate boxes without running the detector. Line crossings are
+    checked once per call, on the whole movement since the previous one
+    (prediction and correction together).
+    """
+
+    def __init__(self, iou_threshold: float = 0.3, max_age: int = 3, min_hits: int = 2,
+                 counting_line: CountingLine = None, meters_per_pixel: float = None):
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age  # keyframes a track may go unmatched before it is dropped
+        self.min_hits = min_hits  # matched keyframes before a track is reported
+        self.counting_line = counting_line
+        self.meters_per_pixel = meters_per_pixel
+
+        self.state = np.zeros((0, 8))  # [cx, cy, w, h, vx, vy, vw, vh], velocities in px/s
+        self.last_centers = np.zeros((0, 2))  # centers at the end of the previous predict/update
+        self.covariance = np.zeros((0, 8, 8))
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.class_ids = np.zeros(0, dtype=np.int64)
+        self.scores = np.zeros(0, dtype=np.float32)
+        self.hits = np.zeros(0, dtype=np.int64)
+        self.misses = np.zeros(0, dtype=np.int64)
+
+        self.next_id = 1
+        self.confirmed_total = 0
+        self.last_timestamp = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    @staticmethod
+    def _noise(state: np.ndarray, position_weight: float, velocity_weight: float) -> np.ndarray:
+        # Noise scales with box height, as in DeepSORT
+        height = np.maximum(state[:, 3], 1.0)
+        std = np.stack([height * position_weight] * 4 + [height * velocity_weight] * 4, axis=1)
+        return np.einsum("ni,ij->nij", std ** 2, np.eye(8))
+
+    def predict(self, timestamp: float) -> np.ndarray:
+        """
+        Propagate every track to `timestamp` and return the confirmed tracks.
+        """
+        self._propagate(timestamp)
+        self._count_crossings()
+        return self.tracks()
+
+    def _propagate(self, timestamp: float):
+        dt = 0.0 if self.last_timestamp is None else max(0.0, timestamp - self.last_timestamp)
+        self.last_timestamp = timestamp
+
+        if len(self) and dt > 0:
+            transition = np.eye(8)
+            transition[:4, 4:] = np.eye(4) * dt
+            self.state = self.state @ transition.T
+            self.covariance = transition @ self.covariance @ transition.T + self._noise(self.state, 1 / 20, 1 / 2) * dt
+
+    def _count_crossings(self):
+        centers = self.state[:, :2].copy()
+        if self.counting_line is not None and len(self):
+            # A track confirmed in this call is checked from where it was as a tentative track
+            confirmed = self.hits >= self.min_hits
+            self.counting_line.update(self.ids[confirmed], self.class_ids[confirmed],
+                                      self.last_centers[confirmed], centers[confirmed])
+        self.last_centers = centers
+
+    def update(self, detections: np.ndarray, timestamp: float) -> np.ndarray:
+        """
+        Predict to `timestamp`, then associate `detections` (run_detections format)
+        with existing tracks, start new tracks and retire stale ones.
+        """
+        self._propagate(timestamp)
+
+        boxes = detections["box"].astype(np.float64)
+        scores = detections["score"].astype(np.float32)
+        class_ids = detections["class"].astype(np.int64)
+
+        iou = box_iou_matrix(_to_boxes(self.state[:, :4]), boxes)
+        # Tracks only match detections of the same class
+        iou[self.class_ids[:, None] != class_ids[None, :]] = 0.0
+        matches, unmatched_tracks, unmatched_dets = greedy_match(iou, self.iou_threshold)
+
+        if len(matches):
+            self._correct(matches[:, 0], _to_state(boxes[matches[:, 1]]))
+            self.scores[matches[:, 0]] = scores[matches[:, 1]]
+            self.hits[matches[:, 0]] += 1
+            self.misses[matches[:, 0]] = 0
+            self.confirmed_total += int(np.count_nonzero(self.hits[matches[:, 0]] == self.min_hits))
+        self.misses[unmatched_tracks] += 1
+
+        keep = self.misses <= self.max_age
+        self._select(keep)
+        self._spawn(boxes[unmatched_dets], scores[unmatched_dets], class_ids[unmatched_dets])
+        self._count_crossings()
+
+        return self.tracks()
+
+    def _correct(self, idx: np.ndarray, measurements: np.ndarray):
+        state, covariance = self.state[idx], self.covariance[idx]
+
+        innovation = measurements - state[:, :4]
+        measurement_noise = self._noise(state, 1 / 20, 0)[:, :4, :4]
+        innovation_cov = covariance[:, :4, :4] + measurement_noise
+        gain = covariance[:, :, :4] @ np.linalg.inv(innovation_cov)  # (n, 8, 4)
+
+        self.state[idx] = state + np.einsum("nij,nj->ni", gain, innovation)
+        self.covariance[idx] = covariance - gain @ covariance[:, :4, :]
+
+    def _select(self, keep: np.ndarray):
+        if self.counting_line is not None:
+            self.counting_line.forget(self.ids[~keep])
+        self.state, self.covariance = self.state[keep], self.covariance[keep]
+        self.last_centers = self.last_centers[keep]
+        self.ids, self.class_ids, self.scores = self.ids[keep], self.class_ids[keep], self.scores[keep]
+        self.hits, self.misses = self.hits[keep], self.misses[keep]
+
+    def _spawn(self, boxes: np.ndarray, scores: np.ndarray, class_ids: np.ndarray):
+        n = len(boxes)
+        if n == 0:
+            return
+
+        state = np.zeros((n, 8))
+        state[:, :4] = _to_state(boxes)
+        # Velocities are in px/s: allow up to a couple of box heights per second at first
+        covariance = self._noise(state, 2 / 20, 2.0)
+
+        self.state = np.concatenate([self.state, state])
+        self.covariance = np.concatenate([self.covariance, covariance])
+        self.last_centers = np.concatenate([self.last_centers, state[:, :2]])
+        self.ids = np.concatenate([self.ids, np.arange(self.next_id, self.next_id + n)])
+        self.class_ids = np.concatenate([self.class_ids, class_ids])
+        self.scores = np.concatenate([self.scores, scores])
+        self.hits = np.concatenate([self.hits, np.ones(n, dtype=np.int64)])
+        self.misses = np.concatenate([self.misses, np.zeros(n, dtype=np.int64)])
+        self.next_id += n
+        if self.min_hits <= 1:
+            self.confirmed_total += n
+
+    def speeds_kph(self) -> np.ndarray:
+        """
+        Ground speed of each confirmed track, or an empty array if the camera has no scale.
+        """
+        if not self.meters_per_pixel:
+            return np.zeros(0)
+        confirmed = self.hits >= self.min_hits
+        pixels_per_second = np.hypot(self.state[confirmed, 4], self.state[confirmed, 5])
+        return pixels_per_second * self.meters_per_pixel * 3.6
+
+    def avg_speed_kph(self):
+        speeds = self.speeds_kph()
+        return float(speeds.mean()) if speeds.size else None
+
+    def tracks(self) -> np.ndarray:
+        """
+        Confirmed tracks in run_detections format, plus a persistent track_id.
+        """
+        confirmed = np.flatnonzero(self.hits >= self.min_hits)
+        tracks = np.empty(len(confirmed), dtype=TRACK_DTYPE)
+        tracks["track_id"] = self.ids[confirmed]
+        tracks["box"] = _to_boxes(self.state[confirmed, :4])
+        tracks["score"] = self.scores[confirmed]
+        tracks["class"] = self.class_ids[confirmed]
+        return tracks
+
+    def stats(self) -> dict:
+        return {
+            "active_tracks": int(np.count_nonzero(self.hits >= self.min_hits)),
+            "unique_vehicles": self.confirmed_total,
+            "line_crossings": self.counting_line.total if self.counting_line is not None else None,
+            "line_crossings_per_class": {str(k): v for k, v in self.counting_line.per_class.items()} if self.counting_line is not None else None,
+            "avg_speed_kph": self.avg_speed_kph(),
+        }
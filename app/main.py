@@ -1,27 +1,167 @@
+import time
 import uvicorn
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional
-import os
-import aiofiles
-import numpy as np
-import cv2
+from fastapi import FastAPI
 from contextlib import asynccontextmanager
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-from .core.model_loader import load_detection_model, load_segmentation_model
-from .routes import detect, segment, vehicle_count, violations, health, congestion, analyze
+from .core.model_registry import ModelRegistry
+from .core.inference_server import InferenceClient, load_authkey, parse_address
+from .core.batching import MicroBatcher
+from .core.executor import Executors
+from .core.cache import ResultCache, MaskCache
+from .core.timeseries import CongestionStore
+from .core.webhooks import WebhookDispatcher
+from .core.metrics import MetricsMiddleware
+from .core.utils import StageTimings
+from .features.stream import StreamManager
+from .features.roi import RoiStore
+from .features.alerts import AlertEngine
+from .core import config
+from .routes import detect, segment, vehicle_count, violations, health, congestion, analyze, roads, batch, model, alerts
+
+
+def _load_models(app: FastAPI) -> str:
+    app.state.model_registry = ModelRegistry(
+        config.MODEL_DIR,
+        pool_size=config.SESSIONS_PER_MODEL,
+        use_gpu=True,
+        warmup_runs=config.MODEL_WARMUP_RUNS,
+        drain_timeout=config.MODEL_DRAIN_TIMEOUT_SECONDS,
+        precision=config.MODEL_PRECISION,
+        max_batch_size=config.BATCH_MAX_SIZE,
+        intra_op_num_threads=config.ORT_INTRA_OP_THREADS,
+        inter_op_num_threads=config.ORT_INTER_OP_THREADS,
+        optimized_cache_dir=config.MODEL_OPTIMIZED_CACHE_DIR or None,
+    )
+    app.state.model_registry.deploy(config.MODEL_VERSION, lazy=config.MODEL_LAZY_SESSIONS)
+    app.state.detection_session = app.state.model_registry.slots["detection"]
+    app.state.segmentation_session = app.state.model_registry.slots["segmentation"]
+    print(f"Models {config.MODEL_VERSION} ({config.MODEL_PRECISION}) loaded and ready.")
+    return app.state.model_registry.cache_tag
+
+
+def _connect_inference_server(app: FastAPI) -> str:
+    # No models in this worker: model calls go to `python -m app.core.inference_server` through shared memory
+    app.state.model_registry = None
+    app.state.inference_client = InferenceClient(
+        parse_address(config.INFERENCE_SERVER_ADDRESS),
+        load_authkey(config.INFERENCE_SERVER_AUTHKEY, config.INFERENCE_SERVER_AUTHKEY_FILE),
+        slots=config.INFERENCE_SHM_SLOTS,
+        slot_bytes=config.INFERENCE_SHM_SLOT_MB * 1024 * 1024,
+        call_timeout=config.INFERENCE_CALL_TIMEOUT_SECONDS,
+    )
+    app.state.inference_client.connect()
+    app.state.detection_session = app.state.inference_client.sessions["detection"]
+    app.state.segmentation_session = app.state.inference_client.sessions["segmentation"]
+    print(f"Connected to inference server at {config.INFERENCE_SERVER_ADDRESS} ({app.state.inference_client.cache_tag}).")
+    return app.state.inference_client.cache_tag
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    app.state.detection_session = load_detection_model(use_gpu=True)
-    app.state.segmentation_session = load_segmentation_model(use_gpu=True)
-    print("Models loaded and ready.")
+    # Startup phase durations are reported by /system/health
+    startup = StageTimings()
+    app.state.startup_timings = startup.timings
+    started = time.perf_counter()
+
+    # Models are served from versioned slots so new weights can be swapped in at runtime,
+    # or by a separate inference process shared by all workers
+    with startup.stage("models"):
+        model_tag = _connect_inference_server(app) if config.INFERENCE_MODE == "remote" else _load_models(app)
+
+    # Blocking work (inference, decode, encode) never runs on the event loop
+    with startup.stage("executors"):
+        app.state.executors = Executors(
+            inference_workers=2 * config.SESSIONS_PER_MODEL,
+            codec_workers=config.CODEC_WORKERS,
+            codec_kind=config.CODEC_EXECUTOR,
+        )
+
+    # Concurrent requests are batched in front of the shared sessions
+    with startup.stage("batchers"):
+        app.state.detection_batcher = MicroBatcher(app.state.detection_session, config.BATCH_MAX_SIZE, config.BATCH_MAX_WAIT_MS, app.state.executors.inference,
+                                                   name="detection", max_concurrency=config.SESSIONS_PER_MODEL, io_binding=config.ORT_IO_BINDING)
+        app.state.segmentation_batcher = MicroBatcher(app.state.segmentation_session, config.BATCH_MAX_SIZE, config.BATCH_MAX_WAIT_MS, app.state.executors.inference,
+                                                      name="segmentation", max_concurrency=config.SESSIONS_PER_MODEL, io_binding=config.ORT_IO_BINDING)
+        await app.state.detection_batcher.start()
+        await app.state.segmentation_batcher.start()
+
+    app.state.result_cache = ResultCache(
+        max_entries=config.CACHE_MAX_ENTRIES,
+        max_bytes=config.CACHE_MAX_BYTES,
+        ttl_seconds=config.CACHE_TTL_SECONDS,
+        hash_size=config.CACHE_HASH_SIZE,
+        hash_mode=config.CACHE_HASH_MODE,
+        model_version=model_tag,
+    ) if config.CACHE_ENABLED else None
+
+    # Fixed cameras reuse their road mask between scene changes
+    app.state.road_masks = MaskCache(
+        interval_seconds=config.MASK_REUSE_INTERVAL_SECONDS,
+        scene_threshold=config.MASK_REUSE_SCENE_THRESHOLD,
+    ) if config.MASK_REUSE_ENABLED else None
+
+    # Per-camera road ROIs that detection is cropped to
+    app.state.detection_rois = RoiStore(config.DETECTION_ROI, config.DETECTION_ROI_REFRESH_SECONDS)
+
+    # Per-road congestion history behind /traffic/status?time_range=
+    with startup.stage("history"):
+        app.state.congestion_history = CongestionStore(
+            raw_capacity=config.TIMESERIES_RAW_CAPACITY,
+            minute_capacity=config.TIMESERIES_MINUTE_CAPACITY,
+            hour_capacity=config.TIMESERIES_HOUR_CAPACITY,
+            path=config.TIMESERIES_DB_PATH,
+            flush_seconds=config.TIMESERIES_FLUSH_SECONDS,
+            retention_days=config.TIMESERIES_RETENTION_DAYS,
+        )
+        app.state.congestion_history.open()
+
+    # Stats of open /analyze WebSocket connections, by connection id
+    app.state.frame_sockets = {}
+
+    # Congestion alerts are evaluated on every analyzed frame and notify through webhooks
+    app.state.webhooks = WebhookDispatcher(
+        max_concurrency=config.ALERT_WEBHOOK_CONCURRENCY,
+        max_queue=config.ALERT_WEBHOOK_QUEUE_SIZE,
+        timeout=config.ALERT_WEBHOOK_TIMEOUT_SECONDS,
+        retries=config.ALERT_WEBHOOK_RETRIES,
+        backoff=config.ALERT_WEBHOOK_BACKOFF_SECONDS,
+    )
+    await app.state.webhooks.start()
+    app.state.alerts = AlertEngine(app.state.webhooks)
+
+    app.state.streams = StreamManager(
+        app.state.detection_session,
+        app.state.segmentation_session,
+        default_fps=config.STREAM_DEFAULT_FPS,
+        queue_size=config.STREAM_QUEUE_SIZE,
+        detection_interval=config.TRACK_DETECTION_INTERVAL,
+        tracker_options={
+            "iou_threshold": config.TRACK_IOU_THRESHOLD,
+            "max_age": config.TRACK_MAX_AGE,
+            "min_hits": config.TRACK_MIN_HITS,
+        },
+        rois=app.state.detection_rois,
+        masks=app.state.road_masks,
+        history=app.state.congestion_history,
+        on_result=app.state.alerts.evaluate_result,
+    )
+
+    startup.timings["total"] = round((time.perf_counter() - started) * 1000.0, 3)
+    app.state.started_at = time.time()
 
     yield
 
+    app.state.streams.stop_all()
+    app.state.congestion_history.close()
+    await app.state.webhooks.stop()
+    await app.state.detection_batcher.stop()
+    await app.state.segmentation_batcher.stop()
+    app.state.executors.shutdown()
+    if getattr(app.state, "inference_client", None) is not None:
+        app.state.inference_client.close()
+
 app = FastAPI(title="Smart Traffic Analyzer", lifespan=lifespan, description="APi for traffic detection, segmentation, congestion analysis and more", version="1.0.0")
 
 app.add_middleware(
@@ -32,6 +172,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request counts, latency and in-flight gauges for /system/metrics
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(detect.router, prefix="/api/v1/vehicle", tags=["Vehicle Detection"])
 app.include_router(segment.router, prefix="/api/v1/road", tags =["Road Segmentation"])
 app.include_router(vehicle_count.router, prefix="/api/v1/vehicle", tags=["Vehicle Counting"])
@@ -39,6 +182,10 @@ app.include_router(violations.router, prefix="/api/v1/traffic", tags=["Traffic V
 app.include_router(congestion.router, prefix="/api/v1/traffic", tags=["Traffic Congestion"])
 app.include_router(health.router, prefix="/system", tags=["System Health"])
 app.include_router(analyze.router, prefix="/api/v1/traffic", tags=["Full Traffic Analysis"])
+app.include_router(roads.router, prefix="/api/v1/traffic", tags=["Monitored Roads"])
+app.include_router(batch.router, prefix="/api/v1")
+app.include_router(model.router, prefix="/api/v1/model", tags=["Model Management"])
+app.include_router(alerts.router, prefix="/api/v1/traffic", tags=["Alert Management"])
 
 @app.get("/", tags=["Root"])
 def index() :
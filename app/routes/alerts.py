@@ -0,0 +1,83 @@
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import BaseModel, Field
+from typing import Literal, Optional
+
+router = APIRouter()
+
+Metric = Literal["congestion_score", "vehicle_count"]
+Condition = Literal["above", "below"]
+
+
+class AlertCreate(BaseModel):
+    road_id: str
+    threshold: float
+    metric: Metric = "congestion_score"
+    condition: Condition = "above"
+    webhook_url: Optional[str] = None  # POSTed a JSON event when the alert triggers or resolves
+    name: Optional[str] = None
+    hysteresis: float = Field(0.0, ge=0)  # how far back past the threshold the value must go to resolve
+    min_duration_seconds: float = Field(0.0, ge=0)  # how long the condition must hold before triggering
+    cooldown_seconds: float = Field(0.0, ge=0)  # min time between two notifications of a trigger
+    enabled: bool = True
+
+
+class AlertUpdate(BaseModel):
+    road_id: Optional[str] = None
+    threshold: Optional[float] = None
+    metric: Optional[Metric] = None
+    condition: Optional[Condition] = None
+    webhook_url: Optional[str] = None
+    name: Optional[str] = None
+    hysteresis: Optional[float] = Field(None, ge=0)
+    min_duration_seconds: Optional[float] = Field(None, ge=0)
+    cooldown_seconds: Optional[float] = Field(None, ge=0)
+    enabled: Optional[bool] = None
+
+
+@router.post("/alerts", summary="Create a congestion alert subscription", status_code=201)
+async def create_alert(request: Request, alert: AlertCreate):
+    """
+    Watch a road's `metric` (`congestion_score` 0-1 or `vehicle_count`) on
+    every analyzed frame. The alert triggers once the value has been
+    `above`/`below` `threshold` for `min_duration_seconds`, and resolves when
+    it is back past the threshold by `hysteresis`.
+    """
+    try:
+        return request.app.state.alerts.create(**alert.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+@router.get("/alerts", summary="List alert subscriptions")
+async def list_alerts(request: Request, road_id: Optional[str] = None):
+    return request.app.state.alerts.list(road_id)
+
+
+@router.get("/alerts/{alert_id}", summary="Get an alert subscription and its state")
+async def get_alert(request: Request, alert_id: str):
+    try:
+        return request.app.state.alerts.describe(alert_id)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.put("/alerts/{alert_id}", summary="Update threshold conditions for an alert")
+async def update_alert(request: Request, alert_id: str, alert: AlertUpdate):
+    """
+    Changing the road, metric, condition, threshold or `enabled` resets the alert to `ok`.
+    """
+    try:
+        return request.app.state.alerts.update(alert_id, **alert.model_dump())
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+@router.delete("/alerts/{alert_id}", summary="Delete an alert subscription")
+async def delete_alert(request: Request, alert_id: str):
+    try:
+        request.app.state.alerts.delete(alert_id)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"alert_id": alert_id, "deleted": True}
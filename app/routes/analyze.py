@@ -1,15 +1,29 @@
 # app/routes/analyze.py
-from fastapi import APIRouter, UploadFile, File, HTTPException, Request
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request, Query, WebSocket, WebSocketDisconnect
 from fastapi.responses import JSONResponse
+from typing import Optional
+import asyncio
+import time
+import uuid
 import numpy as np
 import cv2
 import base64
 
-from ..features.detect import run_detections
+from ..features.detect import postprocess_detections
+from ..features.detect import preprocess_image as preprocess_detection
 from .violations import detect_violation
 from .congestion import vehicle_count
 from .congestion import get_congestion_level as assess_congestion
-from ..features.segment import run_segmentation, apply_mask_to_image
+from .congestion import get_congestion_score
+from ..features.segment import postprocess_mask, apply_mask_to_image
+from ..features.segment import preprocess_image as preprocess_segmentation
+from ..features.roi import crop_to_roi, offset_detections, roi_shape
+from ..core.model_loader import get_input_size
+from ..core.utils import decode_image_reduced, StageTimings
+from ..core import config
+from ..core.cache import fingerprint_frame, reusable_mask
+from ..core.metrics import observe_stage, record_camera_frame, WEBSOCKET_FRAMES, WEBSOCKET_LAG
+from ..core.encoding import DetectionLayout, RenderMode, ResponseFormat, encode_detections, encode_visual, encode_mask, build_response, dumps_json
 
 # from app.routes.detect import run_detection
 # from app.routes.vehicle_count import count_vehicles
@@ -35,47 +49,306 @@ segmentation_session = None
 #         raise RuntimeError(f"Model loading failed: {str(e)}")
 
 
+def prepare_inputs(image: np.ndarray, detection_size: tuple, segmentation_size: tuple, roi: tuple = None,
+                   frame_shape: tuple = None) -> tuple:
+    """
+    Build the input tensors for both models. Both models normalize the same way,
+    so when their input sizes match (and detection is not cropped to an ROI)
+    the frame is resized and normalized once. A size of None skips that model's tensor.
+    """
+    detection_tensor = preprocess_detection(crop_to_roi(image, roi, frame_shape), detection_size) if detection_size else None
+    if segmentation_size is None:
+        return detection_tensor, None
+    if segmentation_size == detection_size and roi is None:
+        return detection_tensor, detection_tensor
+    return detection_tensor, preprocess_segmentation(image, segmentation_size)
+
+
+def render_overlay(image: np.ndarray, mask: np.ndarray, render: str = "png", quality: int = 90) -> bytes:
+    """
+    Render the road mask over the frame and encode it.
+    """
+    return encode_visual(apply_mask_to_image(image, mask), render, quality)
+
+
+async def run_analysis(state, image: np.ndarray, render: str = "none", quality: int = 90,
+                       timings: StageTimings = None, camera_id: str = None, frame_shape: tuple = None) -> dict:
+    """
+    Run the full analysis graph on a decoded frame:
+
+        [cache lookup] -> preprocess (shared) -> detection | segmentation (concurrent) -> postprocess -> [render]
+
+    Frames with a `camera_id` reuse that camera's last road mask until it
+    expires or the scene changes (see core/cache.MaskCache), skipping segmentation.
+
+    Args:
+        state: application state holding the batchers, executors and result cache.
+        image (np.ndarray): decoded BGR frame.
+        render (str): "none", "jpeg"/"png" road overlay, or "mask" for the model-resolution mask.
+        quality (int): JPEG quality when render is "jpeg".
+        timings (StageTimings): collector for per-stage durations.
+        camera_id (str): source camera, scopes near-duplicate cache hits, per-camera
+            metrics and the detection ROI (see features/roi.py).
+        frame_shape (tuple): full-resolution shape when `image` was decoded at
+            reduced scale; detections and violations are reported in it.
+
+    Returns:
+        dict with vehicle_count, detections (DETECTION_DTYPE array), violations, congestion and, unless
+        render is "none", the encoded image bytes under lane_segmentation.
+    """
+    timings = timings or StageTimings()
+    frame_shape = frame_shape or image.shape
+    executors = state.executors
+    detection_batcher = state.detection_batcher
+    segmentation_batcher = state.segmentation_batcher
+    cache = getattr(state, "result_cache", None)
+    rois = getattr(state, "detection_rois", None)
+    masks = getattr(state, "road_masks", None)
+    roi = rois.get(camera_id, frame_shape) if rois is not None else None
+    record_camera_frame(camera_id)
+
+    # Near-duplicate frames reuse earlier model results and skip inference
+    detections, mask = None, None
+    detection_key, segmentation_key = None, None
+    if cache is not None and camera_id:
+        with timings.stage("fingerprint"):
+            fingerprint = await fingerprint_frame(cache, executors, image, camera_id)
+        detection_key = cache.key("detection", camera_id, frame_shape, fingerprint, roi)
+        segmentation_key = cache.key("segmentation", camera_id, frame_shape, fingerprint)
+        detections = cache.get(detection_key)
+        mask = cache.get(segmentation_key)
+
+    # Fixed cameras keep their road mask until it expires or the scene changes
+    mask_signature = None
+    if mask is None and masks is not None and camera_id:
+        with timings.stage("scene_change"):
+            mask, mask_signature = await reusable_mask(masks, executors, camera_id, image, frame_shape)
+
+    detection_tensor, segmentation_tensor = None, None
+    if detections is None or mask is None:
+        with timings.stage("preprocess"):
+            detection_tensor, segmentation_tensor = await executors.run_codec(
+                prepare_inputs,
+                image,
+                get_input_size(detection_batcher.session) if detections is None else None,
+                get_input_size(segmentation_batcher.session) if mask is None else None,
+                roi,
+                frame_shape,
+                stage="preprocess",
+            )
+
+    async def infer(name, batcher, tensor):
+        if tensor is None:
+            return None
+        with timings.stage(f"inference_{name}"):
+            return await batcher.submit(tensor)
+
+    # Both models run at the same time; the total is the slower of the two
+    with timings.stage("inference"):
+        detection_outputs, segmentation_outputs = await asyncio.gather(
+            infer("detection", detection_batcher, detection_tensor),
+            infer("segmentation", segmentation_batcher, segmentation_tensor),
+        )
+
+    with timings.stage("postprocess"):
+        if detections is None:
+            with observe_stage("postprocess_detection"):
+                detections = offset_detections(postprocess_detections(detection_outputs, roi_shape(roi, frame_shape)), roi)
+            if detection_key is not None:
+                cache.put(detection_key, detections)
+        if mask is None:
+            with observe_stage("postprocess_segmentation"):
+                mask = postprocess_mask(segmentation_outputs)
+            if segmentation_key is not None:
+                cache.put(segmentation_key, mask)
+            if mask_signature is not None:
+                masks.store(camera_id, mask_signature, frame_shape, mask)
+            if rois is not None:
+                rois.update_from_mask(camera_id, mask, frame_shape)
+
+        count_vehicle = vehicle_count(detections)
+        violations = detect_violation(detections, mask, frame_shape)
+        congestion = assess_congestion(count_vehicle)
+
+    alerts = getattr(state, "alerts", None)
+    if alerts is not None and camera_id:
+        alerts.evaluate(camera_id, {"congestion_score": get_congestion_score(count_vehicle), "vehicle_count": sum(count_vehicle.values())})
+
+    result = {
+        "vehicle_count": count_vehicle,
+        "detections": detections,
+        "violations": violations,
+        "congestion": congestion,
+    }
+
+    if render != "none":
+        with timings.stage("render"):
+            if render == "mask":
+                result["lane_segmentation"] = await executors.run_codec(encode_mask, mask, stage="encode")
+            else:
+                result["lane_segmentation"] = await executors.run_codec(render_overlay, image, mask, render, quality, stage="encode")
+
+    return result
+
+
 @router.post("/analyze")
-async def analyze_frame(request: Request, file: UploadFile = File(...)):
+async def analyze_frame(request: Request, file: UploadFile = File(...),
+                        render: RenderMode = "none", quality: int = Query(90, ge=1, le=100),
+                        response_format: ResponseFormat = Query("json", alias="format"),
+                        camera_id: Optional[str] = None, layout: DetectionLayout = "rows"):
     """
     Analyze a single frame for detection, vehicle count, violations,
     congestion, and segmentation.
-    Returns JSON response only.
+    Returns JSON only by default. `render` adds the road segmentation as a
+    jpeg/png overlay or a low-res mask; `format` selects json (base64 image),
+    msgpack or multipart (raw image bytes). `layout=columns` returns the
+    detections as boxes/scores/classes arrays instead of one object per box.
     """
     try:
-        # Read image
+        timings = StageTimings()
+
+        # Read image; without a full-resolution overlay to render, large JPEGs are decoded at reduced scale
         file_bytes = await file.read()
-        np_arr = np.frombuffer(file_bytes, np.uint8)
-        image = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+        min_side = config.DECODE_MIN_SIDE if render in ("none", "mask") else 0
+        with timings.stage("decode"):
+            image, frame_shape = await request.app.state.executors.run_codec(decode_image_reduced, file_bytes, min_side, stage="decode")
 
         if image is None:
             raise HTTPException(status_code=400, detail="Invalid image file")
 
-        detection_session = request.app.state.detection_session
-        segmentation_session = request.app.state.segmentation_session
-
         # --- Run pipeline ---
-        detections = run_detections(detection_session, image)
-        segmentations = run_segmentation(segmentation_session, image)
-        segmentation_result = apply_mask_to_image(image, segmentations)  # For visualization if needed
-        
-        _, img_encoded = cv2.imencode('.png', segmentation_result)
-        img_bytes = img_encoded.tobytes()
-        
-        count_vehicle = vehicle_count(detections)
-        violations = detect_violation(detections, segmentations, image.shape)
-        congestion = assess_congestion(count_vehicle)
-
-        # --- Build response ---
-        result = {
-            "vehicle_count": count_vehicle,
-            "detections": detections,
-            "violations": violations,
-            "congestion": congestion,
-            "lane_segmentation": base64.b64encode(img_bytes).decode("utf-8")  # Base64 encoded image
-        }
+        result = await run_analysis(request.app.state, image, render=render, quality=quality, timings=timings,
+                                    camera_id=camera_id, frame_shape=frame_shape)
+        result["detections"] = encode_detections(result["detections"], layout)
+        result["timings_ms"] = timings.timings
 
-        return JSONResponse(content=result)
+        return build_response(result, response_format)
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error analyzing frame: {str(e)}")
+
+
+class LatestFrame:
+    """
+    Single-slot mailbox between a WebSocket reader and its analysis loop.
+
+    `put` never blocks: a frame still waiting is replaced by the new one, so
+    the loop always analyzes the newest frame and a slow server sheds load
+    instead of queueing it.
+    """
+
+    def __init__(self):
+        self._item = None
+        self._ready = asyncio.Event()
+
+    def put(self, item) -> bool:
+        """
+        Store `item`; returns True when it replaced (dropped) a waiting frame.
+        """
+        dropped = self._item is not None
+        self._item = item
+        self._ready.set()
+        return dropped
+
+    async def get(self):
+        await self._ready.wait()
+        self._ready.clear()
+        item, self._item = self._item, None
+        return item
+
+
+def compact_result(result: dict, seq: int, lag: float, stats: dict) -> str:
+    """
+    Per-frame WebSocket message: counts and detections as columns, no images.
+    """
+    detections = encode_detections(result["detections"], "columns")
+    detections["scores"] = detections["scores"].astype(np.float64).round(3)
+    return dumps_json({
+        "type": "result",
+        "seq": seq,
+        "lag_ms": round(lag * 1000.0, 2),
+        "vehicle_count": result["vehicle_count"],
+        "congestion": result["congestion"],
+        "congestion_score": get_congestion_score(result["vehicle_count"]),
+        "violations": len(result["violations"]),
+        "detections": detections,
+        "frames_dropped": stats["frames_dropped"],
+    }).decode("utf-8")
+
+
+@router.websocket("/analyze/ws/{camera_id}")
+async def analyze_stream(websocket: WebSocket, camera_id: str):
+    """
+    Continuous analysis of one camera's frames over a WebSocket.
+
+    Send JPEG frames as binary messages; each analyzed frame gets a JSON text
+    message back (see `compact_result`). Only the newest frame waiting for
+    analysis is kept: frames that arrive while one is pending replace it and
+    are counted in `frames_dropped`. `seq` numbers the received frames, and
+    `lag_ms` is the time from receipt to the result being sent.
+    """
+    await websocket.accept()
+    state = websocket.app.state
+    slot = LatestFrame()
+    connection_id = uuid.uuid4().hex
+    stats = {
+        "connection_id": connection_id,
+        "camera_id": camera_id,
+        "connected_at": time.time(),
+        "frames_received": 0,
+        "frames_processed": 0,
+        "frames_dropped": 0,
+        "frames_failed": 0,
+        "lag_ms": {"last": 0.0, "mean": 0.0, "max": 0.0},
+    }
+    connections = getattr(state, "frame_sockets", None)
+    if connections is not None:
+        connections[connection_id] = stats
+
+    async def analyze_frames():
+        while True:
+            seq, received_at, data = await slot.get()
+            try:
+                image, frame_shape = await state.executors.run_codec(decode_image_reduced, data, config.DECODE_MIN_SIDE, stage="decode")
+                if image is None:
+                    raise ValueError("Invalid image")
+                result = await run_analysis(state, image, camera_id=camera_id, frame_shape=frame_shape)
+            except Exception as e:
+                stats["frames_failed"] += 1
+                WEBSOCKET_FRAMES.inc(1, "failed")
+                await websocket.send_text(dumps_json({"type": "error", "seq": seq, "detail": str(e)}).decode("utf-8"))
+                continue
+
+            lag = time.perf_counter() - received_at
+            stats["frames_processed"] += 1
+            lags = stats["lag_ms"]
+            lags["last"] = round(lag * 1000.0, 2)
+            lags["mean"] = round(lags["mean"] + (lags["last"] - lags["mean"]) / stats["frames_processed"], 2)
+            lags["max"] = max(lags["max"], lags["last"])
+            WEBSOCKET_FRAMES.inc(1, "processed")
+            WEBSOCKET_LAG.observe(lag)
+            await websocket.send_text(compact_result(result, seq, lag, stats))
+
+    worker = asyncio.create_task(analyze_frames())
+    try:
+        while not worker.done():
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            data = message.get("bytes")
+            if not data:
+                continue
+            stats["frames_received"] += 1
+            WEBSOCKET_FRAMES.inc(1, "received")
+            if slot.put((stats["frames_received"], time.perf_counter(), data)):
+                stats["frames_dropped"] += 1
+                WEBSOCKET_FRAMES.inc(1, "dropped")
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if connections is not None:
+            connections.pop(connection_id, None)
+        worker.cancel()
+        await asyncio.gather(worker, return_exceptions=True)
@@ -0,0 +1,243 @@
+import asyncio
+import base64
+import tarfile
+import time
+import zipfile
+from typing import List, Optional
+
+import numpy as np
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from ..features.detect import postprocess_detections
+from ..features.detect import preprocess_image as preprocess_detection
+from ..features.segment import postprocess_mask
+from ..core.model_loader import get_input_size
+from ..core.utils import decode_image_reduced
+from ..core.encoding import DetectionLayout, encode_detections, encode_mask, dumps_json
+from .analyze import prepare_inputs
+from .violations import detect_violation, road_coverage
+from .congestion import vehicle_count
+from .congestion import get_congestion_level as assess_congestion
+from ..core import config
+from ..core.metrics import observe_inference, observe_stage
+
+router = APIRouter()
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+
+def iter_images(files: List[UploadFile], archive: Optional[UploadFile]):
+    """
+    Yield (name, encoded bytes) for every uploaded image, then for every image
+    inside the archive. Archives are read member by member from the spooled
+    upload, so only one encoded image is held at a time.
+    """
+    for upload in files:
+        upload.file.seek(0)
+        yield upload.filename, upload.file.read()
+
+    if archive is None:
+        return
+
+    archive.file.seek(0)
+    if zipfile.is_zipfile(archive.file):
+        archive.file.seek(0)
+        with zipfile.ZipFile(archive.file) as zf:
+            for info in zf.infolist():
+                if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS):
+                    yield info.filename, zf.read(info)
+        return
+
+    archive.file.seek(0)
+    # Stream mode: members are read sequentially without seeking back
+    with tarfile.open(fileobj=archive.file, mode="r|*") as tf:
+        for member in tf:
+            if member.isfile() and member.name.lower().endswith(IMAGE_EXTENSIONS):
+                yield member.name, tf.extractfile(member).read()
+
+
+def _take(iterator, n: int) -> list:
+    items = []
+    for item in iterator:
+        items.append(item)
+        if len(items) == n:
+            break
+    return items
+
+
+async def _decode_chunk(executors, items: list) -> list:
+    # Nothing is rendered at full resolution here, so large JPEGs are decoded at reduced scale
+    decoded = await asyncio.gather(*[executors.run_codec(decode_image_reduced, data, config.DECODE_MIN_SIDE, stage="decode") for _, data in items])
+    return [(name, image, frame_shape) for (name, _), (image, frame_shape) in zip(items, decoded)]
+
+
+async def _run_batch(state, name: str, session, tensors: list):
+    """
+    Run one real N>1 batch directly on a pooled session. Models exported with
+    a fixed batch dimension get slices of that size.
+    """
+    batch = np.concatenate(tensors, axis=0)
+    model_input = session.get_inputs()[0]
+
+    session_run = session.run_bound if config.ORT_IO_BINDING and hasattr(session, "run_bound") else session.run
+
+    async def run(tensor):
+        with observe_inference(name, len(tensor)):
+            return await state.executors.run_inference(session_run, None, {model_input.name: tensor})
+
+    step = model_input.shape[0]
+    if not isinstance(step, int) or step <= 0 or step >= len(batch):
+        return await run(batch)
+
+    parts = await asyncio.gather(*[run(batch[i:i + step]) for i in range(0, len(batch), step)])
+    return [np.concatenate(outputs, axis=0) for outputs in zip(*parts)]
+
+
+def _split(outputs: list, i: int, batch_size: int) -> list:
+    return [output[i:i + 1] if output.ndim and output.shape[0] == batch_size else output for output in outputs]
+
+
+async def _process_chunk(state, kind: str, frames: list, layout: str = "rows") -> list:
+    """
+    Preprocess, infer and post-process one chunk of decoded (name, image, frame_shape) frames.
+
+    Returns:
+        One result dict per frame, in order.
+    """
+    executors = state.executors
+    valid = [i for i, (_, image, _) in enumerate(frames) if image is not None]
+    results = [{"name": name, "error": "Invalid image file"} for name, _, _ in frames]
+    if not valid:
+        return results
+
+    images = [frames[i][1] for i in valid]
+    detection_size = get_input_size(state.detection_session) if kind in ("analyze", "detect") else None
+    segmentation_size = get_input_size(state.segmentation_session) if kind in ("analyze", "segment") else None
+
+    if kind == "detect":
+        tensors = await asyncio.gather(*[executors.run_codec(preprocess_detection, image, detection_size, stage="preprocess") for image in images])
+        detection_tensors, segmentation_tensors = list(tensors), None
+    else:
+        pairs = await asyncio.gather(*[executors.run_codec(prepare_inputs, image, detection_size, segmentation_size, stage="preprocess") for image in images])
+        detection_tensors = [pair[0] for pair in pairs] if detection_size else None
+        segmentation_tensors = [pair[1] for pair in pairs]
+
+    async def infer(name, session, tensors):
+        if tensors is None:
+            return None
+        return await _run_batch(state, name, session, tensors)
+
+    detection_outputs, segmentation_outputs = await asyncio.gather(
+        infer("detection", state.detection_session, detection_tensors),
+        infer("segmentation", state.segmentation_session, segmentation_tensors),
+    )
+
+    batch_size = len(images)
+    for j, i in enumerate(valid):
+        shape = frames[i][2]
+        result = {"name": frames[i][0]}
+
+        detections = None
+        if detection_outputs is not None:
+            with observe_stage("postprocess_detection"):
+                detections = postprocess_detections(_split(detection_outputs, j, batch_size), shape)
+        mask = None
+        if segmentation_outputs is not None:
+            with observe_stage("postprocess_segmentation"):
+                mask = postprocess_mask(_split(segmentation_outputs, j, batch_size))
+
+        if kind == "detect":
+            result["detections"] = encode_detections(detections, layout)
+        elif kind == "segment":
+            road_mask = mask >= config.ROAD_MASK_THRESHOLD
+            result["road_fraction"] = float(road_coverage(np.array([[0, 0, shape[1], shape[0]]]), road_mask, shape)[0])
+            result["mask_png"] = base64.b64encode(await executors.run_codec(encode_mask, mask, stage="encode")).decode("utf-8")
+        else:
+            counts = vehicle_count(detections)
+            result.update({
+                "vehicle_count": counts,
+                "detections": encode_detections(detections, layout),
+                "violations": detect_violation(detections, mask, shape),
+                "congestion": assess_congestion(counts),
+            })
+
+        results[i] = result
+
+    return results
+
+
+def _stream_results(state, kind: str, files: List[UploadFile], archive: Optional[UploadFile], layout: str = "rows"):
+    """
+    NDJSON stream: one line per image, in upload/archive order, then a summary line.
+
+    At most two chunks are in memory at a time: the one being inferred and the
+    next one, which is read and decoded meanwhile.
+    """
+    chunk_size = max(1, config.BATCH_UPLOAD_CHUNK_SIZE)
+
+    async def generate():
+        started = time.perf_counter()
+        iterator = iter_images(files, archive)
+        total = errors = 0
+
+        async def load_next():
+            items = await asyncio.to_thread(_take, iterator, chunk_size)
+            return await _decode_chunk(state.executors, items) if items else []
+
+        next_chunk = asyncio.create_task(load_next())
+        try:
+            while True:
+                frames = await next_chunk
+                if not frames:
+                    break
+                next_chunk = asyncio.create_task(load_next())
+
+                for result in await _process_chunk(state, kind, frames, layout):
+                    total += 1
+                    errors += "error" in result
+                    yield dumps_json(result) + b"\n"
+        finally:
+            if not next_chunk.done():
+                next_chunk.cancel()
+
+        summary = {"images": total, "errors": errors, "elapsed_ms": round((time.perf_counter() - started) * 1000.0, 3)}
+        yield dumps_json({"summary": summary}) + b"\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+def _check_inputs(files: List[UploadFile], archive: Optional[UploadFile]):
+    if not files and archive is None:
+        raise HTTPException(status_code=400, detail="Upload one or more `files` or an `archive` (zip/tar)")
+
+
+@router.post("/traffic/analyze/batch", tags=["Batch Analysis"])
+async def analyze_batch(request: Request, files: List[UploadFile] = File(default=[]), archive: Optional[UploadFile] = File(default=None),
+                        layout: DetectionLayout = "rows"):
+    """
+    Analyze many frames in one request: multiple `files` and/or one zip/tar `archive`.
+    Frames are decoded in parallel and inferred in real batches; results stream back as NDJSON.
+    """
+    _check_inputs(files, archive)
+    return _stream_results(request.app.state, "analyze", files, archive, layout)
+
+
+@router.post("/vehicle/detect/batch", tags=["Batch Analysis"])
+async def detect_batch(request: Request, files: List[UploadFile] = File(default=[]), archive: Optional[UploadFile] = File(default=None),
+                       layout: DetectionLayout = "rows"):
+    """
+    Run vehicle detection on many frames; results stream back as NDJSON.
+    """
+    _check_inputs(files, archive)
+    return _stream_results(request.app.state, "detect", files, archive, layout)
+
+
+@router.post("/road/segment/batch", tags=["Batch Analysis"])
+async def segment_batch(request: Request, files: List[UploadFile] = File(default=[]), archive: Optional[UploadFile] = File(default=None)):
+    """
+    Run road segmentation on many frames; results stream back as NDJSON with
+    the road fraction and the model-resolution mask as base64 PNG.
+    """
+    _check_inputs(files, archive)
+    return _stream_results(request.app.state, "segment", files, archive)
@@ -2,34 +2,29 @@ import cv2
 import numpy as np
 import onnxruntime as ort
 from fastapi import APIRouter, UploadFile, File, Request, HTTPException
-from typing import List
+from typing import Optional
 
-from ..features.detect import run_detections
+from ..features.detect import COUNT_CLASSES, VEHICLE_CLASSES, run_detections_async
+from ..core.utils import decode_image_reduced
+from ..core import config
+from ..core.cache import fingerprint_frame, cached
+from ..core.metrics import record_camera_frame
+from ..core.encoding import DetectionLayout, encode_detections, build_response
 
 router = APIRouter()
 
-def vehicle_count(detections: List[dict]) -> dict:
+# Class id -> position in COUNT_CLASSES; ids past the table are clipped onto its last ("others") entry
+_COUNT_SLOTS = np.full(max(VEHICLE_CLASSES) + 2, COUNT_CLASSES.index("others"), dtype=np.intp)
+for _class_id, _name in VEHICLE_CLASSES.items():
+    _COUNT_SLOTS[_class_id] = COUNT_CLASSES.index(_name)
+
+def vehicle_count(detections: np.ndarray) -> dict:
     """
-    Count
+    Count detections (or tracks) per vehicle class with a single np.bincount.
     """
-
-    counts = {
-        "car": 0,
-        "bus": 0,
-        "truck": 0,
-        "motorcycle": 0,
-        "bicycle": 0,
-        "others": 0
-    }
-
-    for det in detections:
-        label = det.get("class")
-        if label in counts:
-            counts[label] += 1
-        else:
-            counts["others"] += 1
-
-    return counts
+    class_ids = np.minimum(detections["class"], len(_COUNT_SLOTS) - 1)
+    counts = np.bincount(_COUNT_SLOTS[class_ids], minlength=len(COUNT_CLASSES))
+    return dict(zip(COUNT_CLASSES, counts.tolist()))
 
 def get_congestion_level(counts: dict) -> str:
     total_vehicles = sum(counts.values())
@@ -39,34 +34,51 @@ def get_congestion_level(counts: dict) -> str:
         return "Moderate"
     else:
         return "High"
+
+def get_congestion_score(counts: dict, saturation: int = 30) -> float:
+    """
+    Congestion on a 0-1 scale: the vehicle count relative to the "High" level, capped at 1.
+    """
+    return round(min(1.0, sum(counts.values()) / saturation), 4)
     
 @router.post("/congestion", summary="Analyze congestion level from an image")
-async def analyze_congestion(request: Request, file: UploadFile = File(...)):
+async def analyze_congestion(request: Request, file: UploadFile = File(...), camera_id: Optional[str] = None,
+                             layout: DetectionLayout = "rows"):
     """
     
     """
 
     try:
         contents = await file.read()
-        nparr = np.frombuffer(contents, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        # Only detections are returned, so large JPEGs are decoded at reduced scale
+        image, frame_shape = await request.app.state.executors.run_codec(decode_image_reduced, contents, config.DECODE_MIN_SIDE, stage="decode")
         if image is None:
             raise HTTPException(status_code=400, detail="Invalid image file")
         
-        detection_session: ort.InferenceSession = request.app.state.detection_session
-        if detection_session is None:
+        detection_batcher = getattr(request.app.state, "detection_batcher", None)
+        if detection_batcher is None:
             raise HTTPException(status_code=500, detail="Detection model not loaded")
+        record_camera_frame(camera_id)
         
-        detections = run_detections(detection_session, image)
+        cache = getattr(request.app.state, "result_cache", None)
+        rois = getattr(request.app.state, "detection_rois", None)
+        roi = rois.get(camera_id, frame_shape) if rois is not None else None
+        fingerprint = await fingerprint_frame(cache, request.app.state.executors, image, camera_id)
+        detection_key = cache.key("detection", camera_id, frame_shape, fingerprint, roi) if cache is not None else None
+        detections = await cached(cache, detection_key, lambda: run_detections_async(detection_batcher, image, roi=roi, frame_shape=frame_shape))
         counts = vehicle_count(detections)
 
         congestion_level = get_congestion_level(counts)
 
-        return {
+        alerts = getattr(request.app.state, "alerts", None)
+        if alerts is not None and camera_id:
+            alerts.evaluate(camera_id, {"congestion_score": get_congestion_score(counts), "vehicle_count": sum(counts.values())})
+
+        return build_response({
             "vehicle counts": counts,
             "congestion_level": congestion_level,
-            "detections": detections
-        }
+            "detections": encode_detections(detections, layout)
+        })
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
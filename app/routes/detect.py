@@ -1,37 +1,46 @@
 import base64
-from fastapi import APIRouter, File, UploadFile, Request
+from typing import Literal
+from fastapi import APIRouter, File, UploadFile, Request, Query
 import cv2
 import numpy as np
-from ..features.detect import run_detections, draw_boxes
+from ..features.detect import run_detections_async, draw_boxes
+from ..core.utils import decode_image_reduced
+from ..core import config
+from ..core.encoding import DetectionLayout, ResponseFormat, encode_detections, encode_visual, build_response
 import onnxruntime as ort
 
 router = APIRouter()
 
 @router.post("/detect")
-async def detect_objects(request: Request, file: UploadFile = File(...)):
+async def detect_objects(request: Request, file: UploadFile = File(...),
+                         render: Literal["none", "jpeg", "png"] = "jpeg", quality: int = Query(90, ge=1, le=100),
+                         response_format: ResponseFormat = Query("json", alias="format"),
+                         layout: DetectionLayout = "rows"):
     if not file.filename.lower().endswith(('.png', '.jpg', '.jpeg')):
         return {"error": "Invalid file type. Please upload a PNG or JPG image."}
 
+    executors = request.app.state.executors
+
+    # Boxes drawn on the image need the full-resolution frame; bare detections do not
     contents = await file.read()
-    nparr = np.frombuffer(contents, np.uint8)
-    image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    min_side = config.DECODE_MIN_SIDE if render == "none" else 0
+    image, frame_shape = await executors.run_codec(decode_image_reduced, contents, min_side, stage="decode")
 
     if image is None:
         return {"error": "Could not read the image. Please ensure the file is a valid image."}
 
-    detection_session: ort.InferenceSession = request.app.state.detection_session
-    detections = run_detections(detection_session, image)
-
-    # Draw bounding boxes
-    annotated_image = draw_boxes(image.copy(), detections)
-
-    # Encode image to base64 for JSON-safe transfer
-    _, img_encoded = cv2.imencode('.jpg', annotated_image)
-    img_base64 = base64.b64encode(img_encoded).decode("utf-8")
+    detection_batcher = request.app.state.detection_batcher
+    detections = await run_detections_async(detection_batcher, image, frame_shape=frame_shape)
 
-    return {
+    result = {
         "filename": file.filename,
         "content_type": file.content_type,
-        "detections": detections,
-        "annotated_image": img_base64  # JSON-safe string
+        "detections": encode_detections(detections, layout),
     }
+
+    if render != "none":
+        # Draw bounding boxes
+        annotated_image = await executors.run_codec(draw_boxes, image.copy(), detections, stage="render")
+        result["annotated_image"] = await executors.run_codec(encode_visual, annotated_image, render, quality, stage="encode")
+
+    return build_response(result, response_format)
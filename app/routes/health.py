@@ -1,46 +1,96 @@
-from fastapi import APIRouter, Request
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, File, HTTPException, Query, Request, UploadFile
+from fastapi.responses import JSONResponse, PlainTextResponse
+from typing import List, Literal
+import asyncio
 import time
+import numpy as np
+import onnxruntime as ort
+
+from ..core import config, metrics
+from ..core.encoding import build_response
+from ..core.model_loader import get_input_size, variant_path
+from ..core.model_registry import dummy_inputs
+from ..core.profiling import capture_profile
+from ..core.utils import decode_image
+from ..features.detect import preprocess_image as preprocess_detection
+from ..features.segment import preprocess_image as preprocess_segmentation
+
+PREPROCESS = {"detection": preprocess_detection, "segmentation": preprocess_segmentation}
+_profile_lock = asyncio.Lock()
 
 router = APIRouter()
 
-metrics = {
-    "request_total": 0,
-    "last_request_time": None,
-    "errors_total": 0,
-    "uptime_start": time.time()
-}
 
-# @router.middleware_stack("http")
-# async def count_requests(request, call_next):
-#     """
-    
-#     """
+@router.get("/metrics", summary="Prometheus metrics")
+async def get_metrics(format: Literal["prometheus", "json"] = "prometheus"):
+    """
+    Request, per-stage latency, inference and per-camera metrics in Prometheus
+    text format. `format=json` returns the short summary served previously.
+    """
+
+    if format == "json":
+        last_request_time = metrics.LAST_REQUEST.value()
+        return {
+            "request_total": int(metrics.HTTP_REQUESTS.total()),
+            "errors_total": int(metrics.HTTP_ERRORS.total()),
+            "last_request_time": last_request_time or None,
+            "uptime_seconds": int(time.time() - metrics.START_TIME)
+        }
+
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
-#     metrics["request_total"] += 1
-#     metrics["last_request_time"] = time.time()
 
-#     try:
-#         response = call_next(request)
+@router.get("/batching", summary="Inference micro-batching statistics")
+async def batching_stats(request: Request):
+    """
+    Batch size distribution and queue wait times for each model's batcher
+    """
+
+    stats = {}
+    for name in ("detection", "segmentation"):
+        batcher = getattr(request.app.state, f"{name}_batcher", None)
+        if batcher is None:
+            continue
+        stats[name] = {
+            "max_batch_size": batcher.max_batch_size,
+            "max_wait_ms": batcher.max_wait * 1000.0,
+            **batcher.stats.snapshot()
+        }
 
-#     except Exception:
-#         metrics["errors_total"] += 1
-#         raise
+    return stats
 
 
-@router.get("/metrics")
-async def get_metrics():
+@router.get("/cache", summary="Near-duplicate frame cache statistics")
+async def cache_stats(request: Request):
     """
+    Hit/miss counters, size and eviction counts of the model result cache,
+    and how often per-camera road masks were reused
     """
 
-    uptime_seconds = int(time.time() - metrics["uptime_start"])
+    cache = getattr(request.app.state, "result_cache", None)
+    masks = getattr(request.app.state, "road_masks", None)
+    stats = {"enabled": True, **cache.stats()} if cache is not None else {"enabled": False}
+    stats["road_masks"] = {"enabled": True, **masks.stats()} if masks is not None else {"enabled": False}
+    return stats
 
-    return {
-        "request_total": metrics["request_total"],
-        "errors_total": metrics["errors_total"],
-        "last_request_time": metrics["last_request_time"],
-        "uptime_seconds": uptime_seconds
-    }
+
+@router.get("/alerts", summary="Alert engine and webhook delivery statistics")
+async def alert_stats(request: Request):
+    """
+    Subscriptions, alerts currently pending or firing, and webhook delivery counters
+    """
+
+    alerts = getattr(request.app.state, "alerts", None)
+    return alerts.stats() if alerts is not None else {}
+
+
+@router.get("/websockets", summary="Open frame WebSocket connections")
+async def websocket_stats(request: Request):
+    """
+    Received, processed, dropped and failed frames and result lag for each open /analyze WebSocket
+    """
+
+    return list(getattr(request.app.state, "frame_sockets", {}).values())
 
 
 @router.get("/ready", summary="Check API health status")
@@ -60,9 +110,89 @@ async def health_check(request: Request):
 
 
 @router.get("/health", tags=["System Health"])
-async def health_check():
+async def health_check(request: Request):
     """
-    Health check endpoint to verify system is healthy
+    Health check endpoint to verify system is healthy, with uptime, startup
+    phase timings and how the models were loaded
     """
 
-    return JSONResponse(content={"status": "ok", "message": "System is healthy"})
\ No newline at end of file
+    state = request.app.state
+    registry = getattr(state, "model_registry", None)
+    client = getattr(state, "inference_client", None)
+    started_at = getattr(state, "started_at", None)
+
+    model = None
+    if registry is not None:
+        model = {
+            "version": registry.active_version,
+            "precision": registry.precision,
+            "sessions": {name: slot.size for name, slot in registry.slots.items()},
+            "deployment": registry.deployment,
+        }
+    elif client is not None:
+        # INFERENCE_MODE=remote: models run in the inference server
+        model = client.describe()
+
+    return JSONResponse(content={
+        "status": "ok",
+        "message": "System is healthy",
+        "uptime_seconds": round(time.time() - started_at, 3) if started_at else None,
+        "startup_ms": getattr(state, "startup_timings", {}),
+        "available_providers": ort.get_available_providers(),
+        "model": model,
+    })
+
+@router.post("/profile", summary="Capture an ONNX Runtime operator profile of a model")
+async def profile_model(request: Request, model: Literal["detection", "segmentation"] = "detection",
+                        runs: int = Query(20, ge=1, le=1000), warmup: int = Query(3, ge=0, le=100),
+                        batch_size: int = Query(1, ge=1, le=64), top: int = Query(15, ge=1, le=500),
+                        trace: bool = False, save: bool = False, files: List[UploadFile] = File(default=[])):
+    """
+    Build a temporary profiling-enabled session of the deployed `model`
+    (same version, precision and session settings as the serving pools, which
+    are never profiled) and time `runs` batches of `batch_size` through it.
+
+    Uploaded `files` are preprocessed like real frames; without any,
+    zero-filled inputs are used. Returns the mean/p50/p95 run time and the top
+    `top` operator types and nodes by kernel time. `trace=true` also returns
+    the Chrome trace events (the response opens as-is in Perfetto or
+    chrome://tracing); `save=true` keeps the trace file under PROFILE_DIR.
+    One capture runs at a time, and it competes with serving for CPU.
+    """
+    registry = getattr(request.app.state, "model_registry", None)
+    if registry is None:
+        raise HTTPException(status_code=503, detail="Models run in the inference server; profile it there")
+    if _profile_lock.locked():
+        raise HTTPException(status_code=409, detail="A profile capture is already running")
+
+    async with _profile_lock:
+        slot = registry.slots[model]
+        version = registry.active_version
+        precision = registry.model_precisions.get(model, "fp32")
+        path = variant_path(registry.model_path(version, model), precision)
+
+        if files:
+            images = [decode_image(await upload.read()) for upload in files]
+            if any(image is None for image in images):
+                raise HTTPException(status_code=400, detail="Invalid image file")
+            size = get_input_size(slot)
+            tensors = [PREPROCESS[model](image, size) for image in images]
+        else:
+            tensors = list(dummy_inputs(slot).values())[:1]
+
+        # Consecutive frames make up each batch, cycling through the uploads
+        input_name = slot.get_inputs()[0].name
+        feeds = [
+            {input_name: np.concatenate([tensors[(i * batch_size + j) % len(tensors)] for j in range(batch_size)])}
+            for i in range(max(1, -(-len(tensors) // batch_size)))
+        ]
+
+        profile = await asyncio.to_thread(
+            capture_profile, path, feeds, runs, warmup, config.PROFILE_DIR if save else None, top,
+            use_gpu=registry.use_gpu, **registry.session_kwargs,
+        )
+
+    if not trace:
+        del profile["traceEvents"]
+    return build_response({"model": model, "version": version, "precision": precision, "batch_size": batch_size,
+                           "frames": len(files), **profile})
@@ -0,0 +1,121 @@
+import asyncio
+from fastapi import APIRouter, HTTPException, Request, UploadFile, File, Form
+from typing import Literal, Optional
+
+from ..core.model_loader import PRECISIONS
+from ..core.model_registry import ModelVersionError
+
+router = APIRouter()
+
+
+def _registry(state):
+    registry = getattr(state, "model_registry", None)
+    if registry is None:
+        # INFERENCE_MODE=remote: the inference server process owns the models
+        raise HTTPException(status_code=503, detail="Models are managed by the inference server; restart it to change versions")
+    return registry
+
+
+def _invalidate_cache(state):
+    # Results cached under the previous version must not be served for the new one
+    def on_activate(cache_tag: str):
+        cache = getattr(state, "result_cache", None)
+        if cache is not None:
+            cache.model_version = cache_tag
+            cache.clear()
+        masks = getattr(state, "road_masks", None)
+        if masks is not None:
+            masks.clear()
+    return on_activate
+
+
+async def _deploy(state, version: str, precision: str = None):
+    registry = _registry(state)
+    try:
+        return await asyncio.to_thread(registry.deploy, version, _invalidate_cache(state), precision=precision)
+    except ModelVersionError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+
+def _start_deploy(state, version: str, precision: str = None):
+    """
+    Deploy `version` in the background; progress is reported by GET /model/version.
+    """
+    if _registry(state).deployment.get("state") == "loading":
+        raise HTTPException(status_code=409, detail="Another model deployment is in progress")
+
+    task = asyncio.create_task(_deploy(state, version, precision))
+    # Failures are recorded in registry.deployment; keep the exception from being logged as unretrieved
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    state.model_deploy_task = task
+
+
+@router.get("/version", summary="Deployed model version")
+async def model_version(request: Request):
+    """
+    Active version, when it was deployed, model I/O signatures, the state of
+    the latest deployment and every stored version.
+    """
+    registry = _registry(request.app.state)
+    return {**registry.describe(), "versions": await asyncio.to_thread(registry.versions)}
+
+
+@router.post("/reload", summary="Hot reload model weights", status_code=202)
+async def reload_model(request: Request, version: Optional[str] = None, wait: bool = False,
+                       precision: Optional[Literal[PRECISIONS]] = None):
+    """
+    Load `version` (default: re-read the active version from disk), warm it up
+    and swap it in without dropping requests. Returns immediately unless `wait`.
+    `precision` switches between FP32 and stored INT8 variants.
+    """
+    state = request.app.state
+    version = version or _registry(state).active_version
+
+    try:
+        state.model_registry.version_dir(version)
+    except ModelVersionError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+    if wait:
+        return await _deploy(state, version, precision)
+
+    _start_deploy(state, version, precision)
+    return {"deployment": dict(state.model_registry.deployment)}
+
+
+@router.post("/upload", summary="Upload a new model version", status_code=201)
+async def upload_model(request: Request, version: str = Form(...),
+                       detection: Optional[UploadFile] = File(default=None),
+                       segmentation: Optional[UploadFile] = File(default=None),
+                       activate: bool = Form(default=False)):
+    """
+    Store a new version from one or both `.onnx` files. A model that is not
+    uploaded is carried over from the active version. With `activate`, the new
+    version is deployed in the background.
+    """
+    state = request.app.state
+    _registry(state)
+    files = {name: upload.file for name, upload in (("detection", detection), ("segmentation", segmentation)) if upload is not None}
+
+    try:
+        stored = await asyncio.to_thread(state.model_registry.save_version, version, files)
+    except ModelVersionError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+    if activate:
+        _start_deploy(state, version)
+
+    return {"version": stored, "deployment": dict(state.model_registry.deployment)}
+
+
+@router.delete("/version/{version_id}", summary="Delete a stored model version")
+async def delete_model_version(request: Request, version_id: str):
+    """
+    Remove a stored version. The active version cannot be deleted.
+    """
+    try:
+        await asyncio.to_thread(_registry(request.app.state).delete_version, version_id)
+    except ModelVersionError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+    return {"version": version_id, "deleted": True}
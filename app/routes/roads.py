@@ -0,0 +1,250 @@
+import asyncio
+import re
+from fastapi import APIRouter, HTTPException, Request
+from datetime import datetime, timedelta, timezone
+from pydantic import BaseModel, conlist
+from typing import List, Literal, Optional
+
+from ..core.timeseries import COLUMNS, summarize
+from .congestion import get_congestion_level
+
+router = APIRouter()
+
+# [x1, y1, x2, y2] in frame pixels
+LineCoords = conlist(float, min_length=4, max_length=4)
+
+
+class RoadCreate(BaseModel):
+    road_id: str
+    stream_url: str
+    location: Optional[str] = None
+    target_fps: Optional[float] = None
+    detection_interval: Optional[int] = None
+    counting_line: Optional[LineCoords] = None
+    meters_per_pixel: Optional[float] = None  # ground scale used for speed estimates
+    start: bool = True
+
+
+class CameraRoi(BaseModel):
+    roi: List[int]  # [x1, y1, x2, y2] in frame pixels
+
+
+class RoadUpdate(BaseModel):
+    stream_url: Optional[str] = None
+    location: Optional[str] = None
+    target_fps: Optional[float] = None
+    detection_interval: Optional[int] = None
+    counting_line: Optional[LineCoords] = None
+    meters_per_pixel: Optional[float] = None
+
+
+_DURATION = re.compile(r"^P(?:(?P<days>\d+(?:\.\d+)?)D)?(?:T(?:(?P<hours>\d+(?:\.\d+)?)H)?(?:(?P<minutes>\d+(?:\.\d+)?)M)?(?:(?P<seconds>\d+(?:\.\d+)?)S)?)?$")
+
+
+def _parse_instant(value: str) -> datetime:
+    instant = datetime.fromisoformat(value)
+    return instant.astimezone(timezone.utc) if instant.tzinfo is not None else instant.replace(tzinfo=timezone.utc)
+
+
+def _parse_duration(value: str) -> timedelta:
+    match = _DURATION.match(value)
+    if match is None or not any(match.groupdict().values()):
+        raise ValueError(f"Invalid ISO8601 duration: {value}")
+    return timedelta(**{k: float(v) for k, v in match.groupdict().items() if v})
+
+
+def parse_time_range(value: str, now: datetime = None) -> tuple:
+    """
+    Parse an ISO8601 interval into (start, end) datetimes in UTC.
+
+    Accepts "<start>/<end>" (also comma-separated), "<start>/" (until now),
+    "<start>/<duration>", "<duration>/<end>" and a bare "<duration>" such as
+    "PT15M", which ends now. Times without an offset are taken as UTC.
+    """
+    now = now or datetime.now(timezone.utc)
+    parts = [part.strip() for part in re.split(r"[/,]", value.strip(), maxsplit=1)]
+    if len(parts) == 1:
+        start, end = now - _parse_duration(parts[0]), now
+    elif parts[0].startswith("P"):
+        end = _parse_instant(parts[1]) if parts[1] else now
+        start = end - _parse_duration(parts[0])
+    else:
+        start = _parse_instant(parts[0])
+        if not parts[1]:
+            end = now
+        elif parts[1].startswith("P"):
+            end = start + _parse_duration(parts[1])
+        else:
+            end = _parse_instant(parts[1])
+    if end < start:
+        raise ValueError("time_range ends before it starts")
+    return start, end
+
+
+def _isoformat(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat()
+
+
+@router.get("/status", summary="Congestion snapshot for a monitored road")
+async def road_status(request: Request, road_id: str, time_range: Optional[str] = None,
+                      resolution: Literal["auto", "raw", "1m", "1h"] = "auto", series: bool = True):
+    """
+    Latest aggregated result of a road's stream, including the tracker's
+    average speed and line-crossing counts.
+
+    With `time_range` (ISO8601 interval), the road's recorded history over
+    that range instead: sample-weighted averages and, unless `series` is
+    false, the points at `resolution` as columns.
+    """
+    streams = request.app.state.streams
+    history = getattr(request.app.state, "congestion_history", None)
+    if time_range is not None:
+        if history is None or not (road_id in streams.roads or history.has(road_id)):
+            raise HTTPException(status_code=404, detail=f"Unknown road: {road_id}")
+        try:
+            start, end = parse_time_range(time_range)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=f"Invalid time_range: {e}")
+
+        window = await asyncio.to_thread(history.query, road_id, start.timestamp(), end.timestamp(), resolution)
+        timestamps, values = window["timestamps"], window["values"]
+        summary = summarize(values)
+        response = {
+            "road_id": road_id,
+            "time_range": {"start": start.isoformat(), "end": end.isoformat()},
+            "resolution": window["resolution"],
+            "timestamp": _isoformat(timestamps[-1]) if timestamps.size else None,
+            **summary,
+        }
+        if summary["samples"]:
+            response["congestion"] = get_congestion_level({"total": summary["vehicle_count"]})
+        if series:
+            response["series"] = {"timestamp": timestamps.round(3).tolist(),
+                                  **{name: values[:, i].astype(float).round(4).tolist() for i, name in enumerate(COLUMNS)}}
+        return response
+
+    if road_id not in streams.roads:
+        raise HTTPException(status_code=404, detail=f"Unknown road: {road_id}")
+
+    pipeline = streams.roads[road_id]["pipeline"]
+    result = pipeline.last_result if pipeline is not None else None
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"No data yet for road: {road_id}")
+
+    return {
+        "road_id": road_id,
+        "timestamp": _isoformat(result["timestamp"]),
+        "avg_speed_kph": result["avg_speed_kph"],
+        "vehicle_count": sum(result["vehicle_count"].values()),
+        "unique_vehicles": result["unique_vehicles"],
+        "line_crossings": result["line_crossings"],
+        "congestion": result["congestion"],
+        "congestion_score": result["congestion_score"],
+    }
+
+
+@router.get("/roads", summary="List all monitored roads")
+async def list_roads(request: Request):
+    streams = request.app.state.streams
+    return [streams.describe(road_id) for road_id in list(streams.roads)]
+
+
+@router.post("/roads", summary="Register a new monitored road/stream")
+async def create_road(request: Request, road: RoadCreate):
+    """
+    Register a road with its video source (rtsp:// URL or local video file)
+    and, unless `start` is false, begin ingesting it immediately.
+    """
+    streams = request.app.state.streams
+    try:
+        streams.register(
+            road.road_id, road.stream_url, road.location, road.target_fps,
+            road.detection_interval, road.counting_line, road.meters_per_pixel,
+        )
+    except KeyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    if road.start:
+        return await asyncio.to_thread(streams.start, road.road_id)
+    return streams.describe(road.road_id)
+
+
+@router.get("/roads/{road_id}", summary="Get a monitored road and its ingestion stats")
+async def get_road(request: Request, road_id: str):
+    try:
+        return request.app.state.streams.describe(road_id)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.put("/roads/{road_id}", summary="Update metadata of an existing road")
+async def update_road(request: Request, road_id: str, road: RoadUpdate):
+    """
+    Changing the stream URL or target FPS restarts a running ingestion.
+    """
+    try:
+        return await asyncio.to_thread(request.app.state.streams.update, road_id, **road.model_dump())
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.delete("/roads/{road_id}", summary="Remove a monitored road (stop ingestion)")
+async def delete_road(request: Request, road_id: str):
+    streams = request.app.state.streams
+    if road_id not in streams.roads:
+        raise HTTPException(status_code=404, detail=f"Unknown road: {road_id}")
+    await asyncio.to_thread(streams.remove, road_id)
+    return {"road_id": road_id, "deleted": True}
+
+
+@router.post("/roads/{road_id}/start", summary="Start ingesting a road's stream")
+async def start_road(request: Request, road_id: str):
+    try:
+        return await asyncio.to_thread(request.app.state.streams.start, road_id)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.post("/roads/{road_id}/stop", summary="Stop ingesting a road's stream")
+async def stop_road(request: Request, road_id: str):
+    try:
+        return await asyncio.to_thread(request.app.state.streams.stop, road_id)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.get("/cameras/{camera_id}/roi", summary="Detection ROI of a camera")
+async def get_camera_roi(request: Request, camera_id: str):
+    """
+    The region detection is cropped to for frames from `camera_id` (a
+    `camera_id` query parameter or a monitored road id), and whether it was
+    derived from road masks or set by hand.
+    """
+    return request.app.state.detection_rois.describe(camera_id)
+
+
+@router.put("/cameras/{camera_id}/roi", summary="Set a camera's detection ROI by hand")
+async def set_camera_roi(request: Request, camera_id: str, body: CameraRoi):
+    """
+    Crop detection to `roi` for this camera. Hand-set ROIs are never replaced
+    by ones derived from road masks.
+    """
+    rois = request.app.state.detection_rois
+    if len(body.roi) != 4:
+        raise HTTPException(status_code=422, detail="roi must be [x1, y1, x2, y2]")
+    try:
+        rois.set(camera_id, body.roi)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return rois.describe(camera_id)
+
+
+@router.delete("/cameras/{camera_id}/roi", summary="Reset a camera's detection ROI")
+async def delete_camera_roi(request: Request, camera_id: str):
+    """
+    Drop the camera's ROI; in auto mode it is derived again from the next road mask.
+    """
+    rois = request.app.state.detection_rois
+    if not rois.clear(camera_id):
+        raise HTTPException(status_code=404, detail=f"No ROI for camera: {camera_id}")
+    return rois.describe(camera_id)
@@ -1,6 +1,8 @@
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, HTTPException, Request, Query
 from fastapi import UploadFile, File
-from ..features.segment import preprocess_image, run_segmentation, apply_mask_to_image
+from ..features.segment import run_segmentation_async, apply_mask_to_image
+from ..core.utils import decode_image
+from ..core.encoding import RenderMode, ResponseFormat, encode_visual, encode_mask, build_response
 import numpy as np
 import cv2
 from contextlib import asynccontextmanager
@@ -19,30 +21,34 @@ import base64
 router = APIRouter()
 
 @router.post("/segment")
-async def segment_image(request: Request, file: UploadFile = File(...)):
+async def segment_image(request: Request, file: UploadFile = File(...),
+                        render: RenderMode = "png", quality: int = Query(90, ge=1, le=100),
+                        response_format: ResponseFormat = Query("json", alias="format")):
     # Read image
 
+    executors = request.app.state.executors
+
     img_bytes = await file.read()
-    nparr = np.frombuffer(img_bytes, np.uint8)
-    image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    image = await executors.run_codec(decode_image, img_bytes, stage="decode")
 
     if image is None:
         raise HTTPException(status_code=400, detail="Invalid image file")
     
-    segmentation_session = request.app.state.segmentation_session
+    segmentation_batcher = request.app.state.segmentation_batcher
 
     # Preprocess image
-    mask = run_segmentation(segmentation_session, image)
-    overlay = apply_mask_to_image(image, mask)
-
-    # Encode image to send back
-    _, img_encoded = cv2.imencode('.png', overlay)
-    img_bytes = img_encoded.tobytes()  
+    mask = await run_segmentation_async(segmentation_batcher, image)
 
-    img_base64 = base64.b64encode(img_bytes).decode("utf-8")
-    
-    return {
+    result = {
         "filename": file.filename,
         "content_type": file.content_type,
-        "segmented_image": img_base64
-    }
\ No newline at end of file
+    }
+
+    # Encode image to send back
+    if render == "mask":
+        result["segmented_image"] = await executors.run_codec(encode_mask, mask, stage="encode")
+    elif render != "none":
+        overlay = await executors.run_codec(apply_mask_to_image, image, mask, stage="render")
+        result["segmented_image"] = await executors.run_codec(encode_visual, overlay, render, quality, stage="encode")
+
+    return build_response(result, response_format)
@@ -1,32 +1,33 @@
 from fastapi import APIRouter, UploadFile, File, Request
 import cv2
 import numpy as np
-from ..features.detect import run_detections
+from ..features.detect import VEHICLE_CLASSES, run_detections_async
+from ..core.utils import decode_image_reduced
+from ..core import config
+from ..core.encoding import DetectionLayout, encode_detections, build_response
 
 router = APIRouter()
 
 @router.post("/count")
-async def count_vehicles(request: Request, file: UploadFile = File(...)):
+async def count_vehicles(request: Request, file: UploadFile = File(...), layout: DetectionLayout = "rows"):
     """
     Count vehicles in the uploaded image.
 
     Args:
         request (Request): FastAPI request object to access app state.
         file (UploadFile): Uploaded image file.
+        layout (str): "rows" (one object per detection) or "columns" (boxes/scores/classes arrays).
     """
 
     contents = await file.read()
-    nparr = np.frombuffer(contents, np.uint8)
-    image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    image, frame_shape = await request.app.state.executors.run_codec(decode_image_reduced, contents, config.DECODE_MIN_SIDE, stage="decode")
 
     if image is None:
         return {"error": "Invalid image"}
 
-    detection_session = request.app.state.detection_session
-    detections = run_detections(detection_session, image)
+    detection_batcher = request.app.state.detection_batcher
+    detections = await run_detections_async(detection_batcher, image, frame_shape=frame_shape)
 
-    vehicle_classes = {2, 3, 4, 5}
+    vehicle_detection = detections[np.isin(detections["class"], list(VEHICLE_CLASSES))]
 
-    vehicle_detection = [d for d in detections if d['class'] in vehicle_classes]
-
-    return {"vehicle_count": len(vehicle_detection), "detections": vehicle_detection}
\ No newline at end of file
+    return build_response({"vehicle_count": len(vehicle_detection), "detections": encode_detections(vehicle_detection, layout)})
\ No newline at end of file
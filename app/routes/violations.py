@@ -1,93 +1,174 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Request
+from fastapi import APIRouter, HTTPException, UploadFile, File, Request, Query
+import asyncio
 import numpy as np
 import cv2
 import base64
-from typing import List
-from ..features.segment import run_segmentation
-from ..features.detect import run_detections
+from typing import List, Optional
+from ..features.segment import run_segmentation_async
+from ..features.detect import run_detections_async
+from ..core.utils import decode_image_reduced
+from ..core import config
+from ..core.cache import fingerprint_frame, cached, reusable_mask
+from ..core.metrics import record_camera_frame
+from ..core.encoding import DetectionLayout, RenderMode, ResponseFormat, encode_detections, encode_visual, encode_mask, build_response
 
 router = APIRouter()
 
-def detect_violation(detections: List[dict], segmentation_mask: np.ndarray, image_shape: tuple) -> List[dict]:
+def road_coverage(boxes: np.ndarray, road_mask: np.ndarray, image_shape: tuple) -> np.ndarray:
     """
-    Detect off-road violations based on vehicle detections and segmentation mask.
-    """
-    violations = []
-
-    # Resize mask to match image
-    mask_resized = cv2.resize(segmentation_mask, (image_shape[1], image_shape[0]), interpolation=cv2.INTER_NEAREST)
-    
-    for det in detections:
-        # Support both 'bbox' and 'box' keys
-        bbox = det.get('bbox') or det.get('box')
-        if bbox is None or not isinstance(bbox, (list, tuple)) or len(bbox) != 4:
-            continue
-
-        x1, y1, x2, y2 = bbox
-
-        # Clip to image boundaries
-        x1, y1 = max(0, x1), max(0, y1)
-        x2, y2 = min(image_shape[1], x2), min(image_shape[0], y2)
+    Fraction of each box covered by road, computed at mask resolution.
 
-        vehicle_area = mask_resized[y1:y2, x1:x2]
+    A summed-area table of the binary road mask makes every box an O(1)
+    lookup, evaluated for all boxes at once.
 
-        if vehicle_area.size == 0:
-            continue
+    Args:
+        boxes (np.ndarray): Nx4 [x1, y1, x2, y2] in image coordinates.
+        road_mask (np.ndarray): 2D boolean/0-1 road mask at model resolution.
+        image_shape (tuple): shape of the image the boxes refer to.
 
-        if np.any(vehicle_area == 0):  # Non-road pixel
-            violations.append({
-                "type": "Off-road driving",
-                "bbox": bbox,
-                "class_id": det.get('class_id', det.get('class')),
-                "confidence": det.get('confidence', det.get('score'))
-            })
+    Returns:
+        N road fractions in [0, 1]; NaN for boxes that fall outside the image.
+    """
+    mask_h, mask_w = road_mask.shape[:2]
+    image_h, image_w = image_shape[:2]
+
+    table = cv2.integral(road_mask.astype(np.uint8))  # (mask_h + 1) x (mask_w + 1)
+
+    # Clip to image boundaries, then map outward onto the mask grid
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    x1 = np.clip(boxes[:, 0], 0, image_w)
+    y1 = np.clip(boxes[:, 1], 0, image_h)
+    x2 = np.clip(boxes[:, 2], 0, image_w)
+    y2 = np.clip(boxes[:, 3], 0, image_h)
+    valid = (x2 > x1) & (y2 > y1)
+
+    scale_x, scale_y = mask_w / image_w, mask_h / image_h
+    mx1 = np.clip(np.floor(x1 * scale_x), 0, mask_w - 1).astype(np.int64)
+    my1 = np.clip(np.floor(y1 * scale_y), 0, mask_h - 1).astype(np.int64)
+    mx2 = np.clip(np.ceil(x2 * scale_x), mx1 + 1, mask_w).astype(np.int64)
+    my2 = np.clip(np.ceil(y2 * scale_y), my1 + 1, mask_h).astype(np.int64)
+
+    road = table[my2, mx2] - table[my1, mx2] - table[my2, mx1] + table[my1, mx1]
+    area = (mx2 - mx1) * (my2 - my1)
+
+    coverage = road / area
+    coverage[~valid] = np.nan
+    return coverage
+
+def detect_violation(detections: np.ndarray, segmentation_mask: np.ndarray, image_shape: tuple,
+                     off_road_threshold: float = config.VIOLATION_OFF_ROAD_FRACTION,
+                     road_threshold: int = config.ROAD_MASK_THRESHOLD) -> List[dict]:
+    """
+    Detect off-road violations based on vehicle detections and segmentation mask.
 
-    return violations
+    A vehicle is flagged when more than `off_road_threshold` of its box lies
+    off the road. Mask pixels >= `road_threshold` (mask values are 0-255)
+    count as road. The mask is used at its native resolution.
+    """
+    if len(detections) == 0:
+        return []
+
+    if segmentation_mask.ndim == 3:
+        segmentation_mask = segmentation_mask.squeeze()
+    road_mask = segmentation_mask >= road_threshold
+
+    off_road = 1.0 - road_coverage(detections["box"], road_mask, image_shape)
+    flagged = off_road > off_road_threshold  # NaN (outside image) never matches
+    if not flagged.any():
+        return []
+
+    violators = detections[flagged]
+    return [
+        {
+            "type": "Off-road driving",
+            "bbox": bbox,
+            "class_id": class_id,
+            "confidence": score,
+            "off_road_fraction": round(fraction, 4),
+        }
+        for bbox, class_id, score, fraction in zip(violators["box"].tolist(), violators["class"].tolist(),
+                                                   violators["score"].tolist(), off_road[flagged].tolist())
+    ]
 
-def create_overlay(image: np.ndarray, segmentation_mask: np.ndarray) -> str:
+def create_overlay(image: np.ndarray, segmentation_mask: np.ndarray, render: str = "png", quality: int = 90) -> bytes:
     """
-    Create a colored overlay of the segmentation mask on the original image and return as base64 string.
+    Create a colored overlay of the segmentation mask on the original image and return it encoded as `render` (jpeg/png).
     """
-    mask_resized = cv2.resize(segmentation_mask, (image.shape[1], image.shape[0]), interpolation=cv2.INTER_NEAREST)
+    road_mask = (segmentation_mask >= config.ROAD_MASK_THRESHOLD).astype(np.uint8)
+    mask_resized = cv2.resize(road_mask, (image.shape[1], image.shape[0]), interpolation=cv2.INTER_NEAREST)
     colored_mask = np.zeros_like(image)
     road_color = [0, 255, 0]  # Green for road
     colored_mask[mask_resized == 1] = road_color
 
     overlay = cv2.addWeighted(image, 0.7, colored_mask, 0.3, 0)
-    _, buffer = cv2.imencode(".png", overlay)
-    overlay_base64 = base64.b64encode(buffer).decode("utf-8")
-    return overlay_base64
+    return encode_visual(overlay, render, quality)
 
 @router.post("/violations")
-async def analyze_violations(request: Request, file: UploadFile = File(...)):
+async def analyze_violations(request: Request, file: UploadFile = File(...),
+                             render: RenderMode = "png", quality: int = Query(90, ge=1, le=100),
+                             response_format: ResponseFormat = Query("json", alias="format"),
+                             camera_id: Optional[str] = None, layout: DetectionLayout = "rows"):
     try:
         # Read image
+        executors = request.app.state.executors
+
+        # Without a full-resolution overlay to render, large JPEGs are decoded at reduced scale
         image_bytes = await file.read()
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        min_side = config.DECODE_MIN_SIDE if render in ("none", "mask") else 0
+        image, frame_shape = await executors.run_codec(decode_image_reduced, image_bytes, min_side, stage="decode")
 
         if image is None:
             raise HTTPException(status_code=400, detail="Invalid image file")
-
-        # Get model sessions
-        detection_session = request.app.state.detection_session
-        segmentation_session = request.app.state.segmentation_session
-
-        # Run models
-        detections = run_detections(detection_session, image)
-        segmentation_mask = run_segmentation(segmentation_session, image)
+        record_camera_frame(camera_id)
+
+        # Get model batchers
+        detection_batcher = request.app.state.detection_batcher
+        segmentation_batcher = request.app.state.segmentation_batcher
+
+        # Near-duplicate frames reuse earlier model results
+        cache = getattr(request.app.state, "result_cache", None)
+        # Detection only looks at the camera's road ROI, if known
+        rois = getattr(request.app.state, "detection_rois", None)
+        roi = rois.get(camera_id, frame_shape) if rois is not None else None
+        fingerprint = await fingerprint_frame(cache, executors, image, camera_id)
+        detection_key = cache.key("detection", camera_id, frame_shape, fingerprint, roi) if cache is not None else None
+        segmentation_key = cache.key("segmentation", camera_id, frame_shape, fingerprint) if cache is not None else None
+        # A fixed camera's road mask is reused until it expires or the scene changes
+        masks = getattr(request.app.state, "road_masks", None)
+        reused_mask, mask_signature = await reusable_mask(masks, executors, camera_id, image, frame_shape)
+
+        async def segment():
+            if reused_mask is not None:
+                return reused_mask
+            mask = await cached(cache, segmentation_key, lambda: run_segmentation_async(segmentation_batcher, image))
+            if mask_signature is not None:
+                masks.store(camera_id, mask_signature, frame_shape, mask)
+            return mask
+
+        detections, segmentation_mask = await asyncio.gather(
+            cached(cache, detection_key, lambda: run_detections_async(detection_batcher, image, roi=roi, frame_shape=frame_shape)),
+            segment(),
+        )
+        if rois is not None:
+            rois.update_from_mask(camera_id, segmentation_mask, frame_shape)
 
         # Detect violations
-        violations = detect_violation(detections, segmentation_mask, image.shape)
+        violations = detect_violation(detections, segmentation_mask, frame_shape)
 
-        # Create overlay for visualization
-        overlay_base64 = create_overlay(image, segmentation_mask)
-
-        return {
+        result = {
             "violations": violations,
-            "detections": detections,
-            "overlay_image": overlay_base64
+            "detections": encode_detections(detections, layout),
         }
 
+        # Create overlay for visualization
+        if render == "mask":
+            result["overlay_image"] = await executors.run_codec(encode_mask, segmentation_mask, stage="encode")
+        elif render != "none":
+            result["overlay_image"] = await executors.run_codec(create_overlay, image, segmentation_mask, render, quality, stage="encode")
+
+        return build_response(result, response_format)
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,339 @@
+"""
+End-to-end multi-camera load test against a running API.
+
+N simulated cameras replay the same frames (a directory of images, a local
+video, or synthetic frames) at `--fps` each. The load is open loop: a
+camera sends its next frame on schedule whether or not the previous one was
+answered, like a real camera. Latency is measured from the scheduled send
+time, so requests an overloaded server leaves waiting count against it.
+
+For every endpoint in turn the camera count is ramped through `--cameras`.
+Each level reports offered and achieved requests/s, p50/p95/p99 latency and
+error rate. The saturation point is the first level that misses the SLO:
+p95 above `--slo-p95-ms`, error rate above `--slo-error-rate`, or achieved
+throughput below 95% of offered. The ramp of an endpoint stops there.
+
+Usage:
+    python -m benchmarks.load_test --start-server --workers 2 --cameras 1 2 4 8 16
+    python -m benchmarks.load_test --url http://127.0.0.1:8000 --frames samples/frames/ --fps 5
+    python -m benchmarks.load_test --start-server --env ORT_INTRA_OP_THREADS=2 --output load.json
+    python -m benchmarks.load_test --start-server --baseline load.json     # compare with an earlier run
+
+Frames loop per camera, and each camera starts at a different frame. With
+fewer frames than fps x CACHE_TTL_SECONDS, a camera repeats frames while
+their results are still cached; pass `--env CACHE_ENABLED=0` to measure the
+models on every frame. Results depend on the machine and on what else runs
+on it: compare builds and settings on the same hardware.
+"""
+import argparse
+import asyncio
+import contextlib
+import glob
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+
+import numpy as np
+import cv2
+import httpx
+
+from .synthetic import make_frame
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Name -> (path, query parameters)
+ENDPOINTS = {
+    "analyze": ("/api/v1/traffic/analyze", {}),
+    "congestion": ("/api/v1/traffic/congestion", {}),
+    "violations": ("/api/v1/traffic/violations", {"render": "none"}),
+}
+
+# Achieved throughput below this fraction of the offered load counts as saturated
+MIN_THROUGHPUT_RATIO = 0.95
+
+
+def load_frames(frames_dir: str = None, video: str = None, count: int = 64, quality: int = 90) -> list:
+    """
+    JPEG bytes of the frames to replay. JPEG files are sent as they are.
+    """
+    if frames_dir:
+        encoded = []
+        for path in sorted(glob.glob(os.path.join(frames_dir, "*")))[:count]:
+            if path.lower().endswith((".jpg", ".jpeg")):
+                with open(path, "rb") as f:
+                    encoded.append(f.read())
+                continue
+            frame = cv2.imread(path, cv2.IMREAD_COLOR)
+            if frame is not None:
+                encoded.append(cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes())
+        if not encoded:
+            raise SystemExit(f"No readable frames in {frames_dir}")
+        return encoded
+
+    if video:
+        capture = cv2.VideoCapture(video)
+        frames = []
+        while len(frames) < count:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            frames.append(frame)
+        capture.release()
+        if not frames:
+            raise SystemExit(f"No readable frames in {video}")
+    else:
+        frames = [make_frame("720p", seed=i) for i in range(count)]
+    return [cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes() for frame in frames]
+
+
+async def _send(client: httpx.AsyncClient, path: str, params: dict, frame: bytes, scheduled: float, samples: list):
+    try:
+        response = await client.post(path, params=params, files={"file": ("frame.jpg", frame, "image/jpeg")})
+        ok = response.status_code == 200
+    except httpx.HTTPError:
+        ok = False
+    samples.append((scheduled, time.perf_counter(), ok))
+
+
+async def _camera(client: httpx.AsyncClient, path: str, params: dict, frames: list, fps: float, first_frame: int,
+                  start: float, end: float, samples: list):
+    interval = 1.0 / fps
+    sends = []
+    for k in range(int((end - start) * fps) + 1):
+        scheduled = start + k * interval
+        if scheduled >= end:
+            break
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        frame = frames[(first_frame + k) % len(frames)]
+        sends.append(asyncio.create_task(_send(client, path, params, frame, scheduled, samples)))
+    await asyncio.gather(*sends)
+
+
+def percentile_ms(latencies: np.ndarray, q: float):
+    return round(float(np.percentile(latencies, q)) * 1000.0, 3) if latencies.size else None
+
+
+async def run_level(client: httpx.AsyncClient, endpoint: str, frames: list, cameras: int, fps: float,
+                    duration: float, warmup: float) -> dict:
+    """
+    Drive `cameras` cameras at `fps` for `warmup` + `duration` seconds; only
+    requests scheduled after the warm-up are measured.
+    """
+    path, params = ENDPOINTS[endpoint]
+    samples = []
+    begin = time.perf_counter() + 0.1
+    measure_from, end = begin + warmup, begin + warmup + duration
+
+    # Cameras are spread evenly over one frame interval instead of all sending at once
+    await asyncio.gather(*[
+        _camera(client, path, {**params, "camera_id": f"load-{i}"}, frames, fps, i * len(frames) // cameras,
+                begin + i / (fps * cameras), end, samples)
+        for i in range(cameras)
+    ])
+
+    measured = [(scheduled, done, ok) for scheduled, done, ok in samples if scheduled >= measure_from]
+    latencies = np.array([done - scheduled for scheduled, done, ok in measured if ok])
+    errors = sum(not ok for _, _, ok in measured)
+    # Until the last measured response: a server that falls behind drains its backlog after `end`
+    elapsed = max([end, *(done for _, done, _ in measured)]) - measure_from
+    return {
+        "cameras": cameras,
+        "requests": len(measured),
+        "errors": errors,
+        "error_rate": round(errors / len(measured), 4) if measured else None,
+        "offered_rps": round(cameras * fps, 2),
+        "achieved_rps": round(latencies.size / elapsed, 2) if elapsed > 0 else None,
+        "p50_ms": percentile_ms(latencies, 50),
+        "p95_ms": percentile_ms(latencies, 95),
+        "p99_ms": percentile_ms(latencies, 99),
+        "max_ms": round(float(latencies.max()) * 1000.0, 3) if latencies.size else None,
+    }
+
+
+def meets_slo(level: dict, slo_p95_ms: float, slo_error_rate: float) -> bool:
+    if not level["requests"] or level["p95_ms"] is None:
+        return False
+    return (level["p95_ms"] <= slo_p95_ms and level["error_rate"] <= slo_error_rate
+            and level["achieved_rps"] >= MIN_THROUGHPUT_RATIO * level["offered_rps"])
+
+
+def print_level(endpoint: str, level: dict):
+    def ms(value):
+        return f"{value:>9.1f}" if value is not None else f"{'-':>9}"
+    print(f"{endpoint:<11} {level['cameras']:>7} {level['offered_rps']:>10.1f} {level['achieved_rps'] or 0:>10.1f}"
+          f" {ms(level['p50_ms'])} {ms(level['p95_ms'])} {ms(level['p99_ms'])} {level['error_rate'] or 0:>7.2%}"
+          f"  {'ok' if level['slo_met'] else 'SLO missed'}", flush=True)
+
+
+async def run(url: str, endpoints: list, frames: list, camera_levels: list, fps: float, duration: float,
+              warmup: float, timeout: float, slo_p95_ms: float, slo_error_rate: float, cooldown: float = 1.0) -> dict:
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=max(camera_levels) * 4)
+    results = {}
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits, trust_env=False) as client:
+        server = (await client.get("/system/health")).json().get("model")
+
+        print(f"{'endpoint':<11} {'cameras':>7} {'offered/s':>10} {'achieved/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+        for endpoint in endpoints:
+            levels, within_slo, saturated_at = [], None, None
+            for cameras in camera_levels:
+                level = await run_level(client, endpoint, frames, cameras, fps, duration, warmup)
+                level["slo_met"] = meets_slo(level, slo_p95_ms, slo_error_rate)
+                levels.append(level)
+                print_level(endpoint, level)
+                if not level["slo_met"]:
+                    saturated_at = cameras
+                    break
+                within_slo = cameras
+                await asyncio.sleep(cooldown)
+
+            results[endpoint] = {
+                "levels": levels,
+                "max_cameras_within_slo": within_slo,
+                "saturated_at_cameras": saturated_at,
+                "max_achieved_rps": max((level["achieved_rps"] or 0 for level in levels), default=0),
+            }
+
+    return {"server": server, "endpoints": results}
+
+
+def environment(args) -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "url": args.url,
+        "started_server": args.start_server,
+        "workers": args.workers if args.start_server else None,
+        "server_env": dict(args.env),
+        "fps": args.fps,
+        "duration_seconds": args.duration,
+        "frames": args.frames or args.video or "synthetic",
+        "slo": {"p95_ms": args.slo_p95_ms, "error_rate": args.slo_error_rate, "min_throughput_ratio": MIN_THROUGHPUT_RATIO},
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextlib.contextmanager
+def local_server(workers: int, env: dict, ready_timeout: float = 180.0):
+    """
+    Start `uvicorn app.main:app` from the repository root and yield its URL once /system/ready answers.
+    """
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=ROOT, env={**os.environ, **env},
+    )
+    try:
+        deadline = time.monotonic() + ready_timeout
+        while True:
+            if process.poll() is not None:
+                raise SystemExit(f"Server exited with status {process.returncode} before becoming ready")
+            try:
+                if httpx.get(f"{url}/system/ready", timeout=2.0, trust_env=False).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                raise SystemExit(f"Server not ready after {ready_timeout:.0f}s")
+            time.sleep(0.5)
+        yield url
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def compare(current: dict, baseline: dict):
+    """
+    Print saturation and p95 per level against an earlier report.
+    """
+    print("\nagainst baseline")
+    for endpoint, result in current["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(endpoint)
+        if before is None:
+            continue
+        print(f"{endpoint:<11} max cameras within SLO {before['max_cameras_within_slo']} -> {result['max_cameras_within_slo']},"
+              f" max achieved/s {before['max_achieved_rps']} -> {result['max_achieved_rps']}")
+        previous = {level["cameras"]: level for level in before["levels"]}
+        for level in result["levels"]:
+            old = previous.get(level["cameras"])
+            if old is None or old["p95_ms"] is None or level["p95_ms"] is None:
+                continue
+            change = (level["p95_ms"] / old["p95_ms"] - 1) * 100 if old["p95_ms"] else 0.0
+            print(f"  {level['cameras']:>4} cameras: p95 {old['p95_ms']:.1f} -> {level['p95_ms']:.1f} ms ({change:+.1f}%)")
+
+
+def _env_pair(value: str) -> tuple:
+    key, sep, val = value.partition("=")
+    if not sep or not key:
+        raise argparse.ArgumentTypeError(f"expected KEY=VALUE, got {value!r}")
+    return key, val
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Replay frames as N cameras against the API and report SLO capacity")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", default="http://127.0.0.1:8000", help="base URL of a running server")
+    target.add_argument("--start-server", action="store_true", help="start uvicorn app.main:app locally for the run")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers with --start-server")
+    parser.add_argument("--env", type=_env_pair, action="append", default=[], metavar="KEY=VALUE",
+                        help="server environment with --start-server (repeatable)")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--frames", help="directory of frames to replay (default: synthetic 720p frames)")
+    source.add_argument("--video", help="local video file to replay")
+    parser.add_argument("--max-frames", type=int, default=64)
+    parser.add_argument("--endpoints", nargs="+", default=list(ENDPOINTS), choices=list(ENDPOINTS))
+    parser.add_argument("--cameras", nargs="+", type=int, default=[1, 2, 4, 8, 16], help="camera counts to ramp through")
+    parser.add_argument("--fps", type=float, default=5.0, help="frames per second per camera")
+    parser.add_argument("--duration", type=float, default=20.0, help="measured seconds per level")
+    parser.add_argument("--warmup", type=float, default=3.0, help="unmeasured seconds at the start of each level")
+    parser.add_argument("--timeout", type=float, default=30.0, help="request timeout; timeouts count as errors")
+    parser.add_argument("--slo-p95-ms", type=float, default=500.0)
+    parser.add_argument("--slo-error-rate", type=float, default=0.01)
+    parser.add_argument("--output", help="write the report JSON here")
+    parser.add_argument("--baseline", help="earlier report JSON to compare against")
+    args = parser.parse_args(argv)
+
+    frames = load_frames(args.frames, args.video, args.max_frames)
+    camera_levels = sorted(set(args.cameras))
+
+    with contextlib.ExitStack() as stack:
+        if args.start_server:
+            args.url = stack.enter_context(local_server(args.workers, dict(args.env)))
+        result = asyncio.run(run(args.url, args.endpoints, frames, camera_levels, args.fps, args.duration,
+                                 args.warmup, args.timeout, args.slo_p95_ms, args.slo_error_rate))
+
+    report = {"environment": environment(args), **result}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"Wrote {args.output}", file=sys.stderr)
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(report, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
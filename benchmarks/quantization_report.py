@@ -0,0 +1,190 @@
+"""
+Accuracy/latency report for INT8 model variants against FP32.
+
+For every available variant (see app/core/quantization.py) this measures
+session.run latency and throughput at batch 1 and 8, and how far the
+post-processed outputs drift from FP32 on the same frames:
+
+- detection:    per-frame count delta, recall/precision of FP32 boxes matched
+                at IoU >= 0.5 (same class), mean IoU of matched boxes
+- segmentation: IoU of the road masks (ROAD_MASK_THRESHOLD)
+
+Usage:
+    python -m benchmarks.quantization_report --version v1 --frames samples/frames/
+    python -m benchmarks.quantization_report --synthetic     # synthetic models, quantized on the fly
+
+Use frames from the cameras you serve; synthetic frames only exercise the
+pipeline. Results depend on the CPU (VNNI/AMX) and are machine specific.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+import cv2
+
+from .run import environment, measure
+from .synthetic import RESOLUTIONS, build_models, make_frame, make_session
+from app.core import config
+from app.core.model_loader import PRECISIONS, get_input_size, variant_path
+from app.core.model_registry import MODEL_FILES
+from app.features.detect import preprocess_image, postprocess_detections
+from app.features.segment import postprocess_mask
+from app.features.tracking import box_iou_matrix, greedy_match
+
+MATCH_IOU = 0.5
+BATCH_SIZES = (1, 8)
+
+
+def load_frames(frames_dir: str = None, count: int = 32) -> list:
+    if not frames_dir:
+        return [make_frame(list(RESOLUTIONS)[i % len(RESOLUTIONS)], seed=i) for i in range(count)]
+    paths = sorted(glob.glob(os.path.join(frames_dir, "*")))
+    frames = [frame for frame in (cv2.imread(path, cv2.IMREAD_COLOR) for path in paths) if frame is not None]
+    if not frames:
+        raise SystemExit(f"No readable frames in {frames_dir}")
+    return frames[:count]
+
+
+def run_model(session, frames: list) -> list:
+    input_name = session.get_inputs()[0].name
+    size = get_input_size(session)
+    return [session.run(None, {input_name: preprocess_image(frame, size)}) for frame in frames]
+
+
+def latency(session, frame: np.ndarray, repeat: int) -> dict:
+    input_name = session.get_inputs()[0].name
+    tensor = preprocess_image(frame, get_input_size(session))
+    results = {}
+    for batch_size in BATCH_SIZES:
+        batch = np.repeat(tensor, batch_size, axis=0)
+        result = measure(lambda: session.run(None, {input_name: batch}), repeat)
+        result["frames_per_s"] = round(result["ops_per_s"] * batch_size, 2) if result["ops_per_s"] else None
+        results[f"batch_{batch_size}"] = result
+    return results
+
+
+def detection_agreement(reference: list, candidate: list, frames: list) -> dict:
+    """
+    How well the candidate's detections reproduce the reference (FP32) ones.
+    """
+    matched = total_reference = total_candidate = 0
+    ious, count_deltas = [], []
+    for ref_outputs, cand_outputs, frame in zip(reference, candidate, frames):
+        ref = postprocess_detections(ref_outputs, frame.shape)
+        cand = postprocess_detections(cand_outputs, frame.shape)
+        total_reference += len(ref)
+        total_candidate += len(cand)
+        count_deltas.append(len(cand) - len(ref))
+
+        # Only boxes of the same class can match
+        for class_id in np.intersect1d(ref["class"], cand["class"]):
+            ref_boxes = ref["box"][ref["class"] == class_id]
+            cand_boxes = cand["box"][cand["class"] == class_id]
+            iou = box_iou_matrix(ref_boxes, cand_boxes)
+            matches, _, _ = greedy_match(iou, MATCH_IOU)
+            matched += len(matches)
+            ious.extend(iou[matches[:, 0], matches[:, 1]].tolist())
+
+    deltas = np.abs(count_deltas)
+    return {
+        "reference_detections": total_reference,
+        "candidate_detections": total_candidate,
+        "recall": round(matched / total_reference, 4) if total_reference else None,
+        "precision": round(matched / total_candidate, 4) if total_candidate else None,
+        "mean_matched_iou": round(float(np.mean(ious)), 4) if ious else None,
+        "mean_abs_count_delta": round(float(deltas.mean()), 3),
+        "max_abs_count_delta": int(deltas.max()),
+    }
+
+
+def segmentation_agreement(reference: list, candidate: list) -> dict:
+    ious = []
+    for ref_outputs, cand_outputs in zip(reference, candidate):
+        ref = postprocess_mask(ref_outputs) >= config.ROAD_MASK_THRESHOLD
+        cand = postprocess_mask(cand_outputs) >= config.ROAD_MASK_THRESHOLD
+        union = np.count_nonzero(ref | cand)
+        ious.append(np.count_nonzero(ref & cand) / union if union else 1.0)
+    return {"mean_mask_iou": round(float(np.mean(ious)), 4), "min_mask_iou": round(float(np.min(ious)), 4)}
+
+
+def report(model_paths: dict, frames: list, repeat: int, threads: int) -> dict:
+    """
+    model_paths: model name -> FP32 path. Variants are looked up next to it.
+    """
+    results = {}
+    for name, fp32_path in model_paths.items():
+        reference_session = make_session(fp32_path, threads)
+        reference = run_model(reference_session, frames)
+        results[name] = {"fp32": {"size_bytes": os.path.getsize(fp32_path), "latency": latency(reference_session, frames[0], repeat)}}
+
+        for precision in PRECISIONS[1:]:
+            path = variant_path(fp32_path, precision)
+            if not os.path.isfile(path):
+                continue
+            session = make_session(path, threads)
+            outputs = run_model(session, frames)
+            agreement = detection_agreement(reference, outputs, frames) if name == "detection" else segmentation_agreement(reference, outputs)
+            results[name][precision] = {"size_bytes": os.path.getsize(path), "latency": latency(session, frames[0], repeat), "agreement": agreement}
+
+    return {"environment": environment(threads), "frames": len(frames), "models": results}
+
+
+def print_report(result: dict):
+    for name, variants in result["models"].items():
+        fp32 = variants["fp32"]["latency"]
+        print(f"\n{name}")
+        print(f"  {'precision':<14} {'size MB':>8} {'b1 ms':>9} {'b8 fps':>9} {'speedup':>8}  agreement")
+        for precision, data in variants.items():
+            lat = data["latency"]
+            speedup = fp32["batch_1"]["median_ms"] / lat["batch_1"]["median_ms"]
+            agreement = " ".join(f"{k}={v}" for k, v in data.get("agreement", {}).items())
+            print(f"  {precision:<14} {data['size_bytes'] / 1e6:>8.2f} {lat['batch_1']['median_ms']:>9.3f} "
+                  f"{lat['batch_8']['frames_per_s']:>9.1f} {speedup:>7.2f}x  {agreement}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compare INT8 model variants against FP32")
+    parser.add_argument("--version", default=config.MODEL_VERSION)
+    parser.add_argument("--model-dir", default=config.MODEL_DIR)
+    parser.add_argument("--synthetic", action="store_true", help="use synthetic models and quantize them in a temp dir")
+    parser.add_argument("--frames", help="directory of sample frames (default: synthetic frames)")
+    parser.add_argument("--max-frames", type=int, default=32)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--output", help="write the report JSON here")
+    args = parser.parse_args(argv)
+
+    cv2.setNumThreads(args.threads)
+    frames = load_frames(args.frames, args.max_frames)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.synthetic:
+            from app.core.quantization import quantize_model
+
+            calibration_dir = os.path.join(tmp, "frames")
+            os.makedirs(calibration_dir)
+            for i, frame in enumerate(frames):
+                cv2.imwrite(os.path.join(calibration_dir, f"{i:04d}.png"), frame)
+            model_paths = dict(zip(("detection", "segmentation"), build_models(tmp)))
+            for path in model_paths.values():
+                quantize_model(path, "int8-dynamic")
+                quantize_model(path, "int8-static", calibration_dir)
+        else:
+            model_paths = {name: os.path.join(args.model_dir, args.version, file_name) for name, file_name in MODEL_FILES.items()}
+
+        result = report(model_paths, frames, args.repeat, args.threads)
+
+    print_report(result)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+        print(f"Wrote {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+"""
+Offline micro-benchmarks for the per-frame pipeline functions.
+
+Measures latency and throughput of decode, preprocess, inference,
+post-processing, violation checks, overlay rendering and the encoders on
+synthetic 720p/1080p/4K frames with synthetic ONNX models (see
+benchmarks/synthetic.py), so it needs neither the real weights nor a GPU.
+
+Usage:
+    python -m benchmarks.run                                  # print results
+    python -m benchmarks.run --save-baseline                  # write benchmarks/baseline.json
+    python -m benchmarks.run --baseline benchmarks/baseline.json --threshold 0.2
+
+With --baseline, the run exits with status 1 when any benchmark's median
+latency is more than `threshold` (a fraction) slower than the baseline.
+Baselines are machine specific: record them on the machine that gates.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import cv2
+import onnxruntime as ort
+
+from .synthetic import RESOLUTIONS, build_models, make_frame, make_session
+from app.core.utils import decode_image, encode_image
+from app.core.encoding import encode_visual, encode_mask, encode_detections, dumps_json
+from app.features.detect import preprocess_image as preprocess_detection, postprocess_detections, non_max_suppression
+from app.features.segment import preprocess_image as preprocess_segmentation, postprocess_mask, apply_mask_to_image
+from app.routes.analyze import prepare_inputs
+from app.routes.violations import detect_violation
+from app.routes.congestion import vehicle_count
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+def measure(func, repeat: int = 30, min_sample_s: float = 0.002) -> dict:
+    """
+    Time `func()`: one warm-up call, then `repeat` samples. Fast functions are
+    looped inside each sample (calibrated to at least `min_sample_s`) so timer
+    resolution does not dominate.
+    """
+    func()
+
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        if time.perf_counter() - start >= min_sample_s or number >= 10000:
+            break
+        number *= 2
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - start) * 1000.0 / number)
+
+    samples.sort()
+    median = statistics.median(samples)
+    return {
+        "median_ms": round(median, 4),
+        "p95_ms": round(samples[min(len(samples) - 1, int(0.95 * len(samples)))], 4),
+        "min_ms": round(samples[0], 4),
+        "ops_per_s": round(1000.0 / median, 2) if median else None,
+    }
+
+
+def benchmark_cases(detection_session, segmentation_session, resolution: str) -> dict:
+    """
+    Benchmark name -> zero-argument callable, for one frame resolution.
+    """
+    frame = make_frame(resolution)
+    jpeg = encode_image(frame, ".jpg", [cv2.IMWRITE_JPEG_QUALITY, 90])
+
+    detection_tensor = preprocess_detection(frame)
+    segmentation_tensor = preprocess_segmentation(frame)
+    detection_outputs = detection_session.run(None, {detection_session.get_inputs()[0].name: detection_tensor})
+    segmentation_outputs = segmentation_session.run(None, {segmentation_session.get_inputs()[0].name: segmentation_tensor})
+
+    detections = postprocess_detections(detection_outputs, frame.shape)
+    mask = postprocess_mask(segmentation_outputs)
+    overlay = apply_mask_to_image(frame, mask)
+
+    # Raw candidates as postprocess_detections hands them to NMS
+    preds = detection_outputs[0][0]
+    preds = preds[preds[:, 4] >= 0.25]
+    height, width = frame.shape[:2]
+    boxes = np.concatenate([preds[:, 0:2] - preds[:, 2:4] / 2, preds[:, 0:2] + preds[:, 2:4] / 2], axis=1) * np.array([width, height, width, height], dtype=np.float32)
+    scores, class_ids = preds[:, 4], np.argmax(preds[:, 5:], axis=1)
+
+    return {
+        "decode_jpeg": lambda: decode_image(jpeg),
+        "preprocess_detection": lambda: preprocess_detection(frame),
+        "preprocess_segmentation": lambda: preprocess_segmentation(frame),
+        "prepare_inputs": lambda: prepare_inputs(frame, (320, 320), (320, 320)),
+        "postprocess_detections": lambda: postprocess_detections(detection_outputs, frame.shape),
+        "non_max_suppression": lambda: non_max_suppression(boxes, scores, class_ids),
+        "postprocess_mask": lambda: postprocess_mask(segmentation_outputs),
+        "detect_violation": lambda: detect_violation(detections, mask, frame.shape),
+        "vehicle_count": lambda: vehicle_count(detections),
+        "serialize_detections_rows": lambda: dumps_json(encode_detections(detections, "rows")),
+        "serialize_detections_columns": lambda: dumps_json(encode_detections(detections, "columns")),
+        "apply_mask_to_image": lambda: apply_mask_to_image(frame, mask),
+        "encode_jpeg": lambda: encode_visual(overlay, "jpeg", 90),
+        "encode_png": lambda: encode_visual(overlay, "png"),
+        "encode_mask": lambda: encode_mask(mask),
+    }
+
+
+def inference_cases(detection_session, segmentation_session) -> dict:
+    """
+    session.run on the synthetic models; independent of the frame resolution.
+    """
+    tensor = preprocess_detection(make_frame("720p"))
+    cases = {}
+    for name, session in (("detection", detection_session), ("segmentation", segmentation_session)):
+        input_name = session.get_inputs()[0].name
+        cases[f"inference_{name}"] = lambda session=session, input_name=input_name: session.run(None, {input_name: tensor})
+    return cases
+
+
+def environment(threads: int) -> dict:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "threads": threads,
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "onnxruntime": ort.__version__,
+    }
+
+
+def run(resolutions: list, repeat: int, threads: int, only: list = None) -> dict:
+    cv2.setNumThreads(threads)
+
+    with tempfile.TemporaryDirectory() as models_dir:
+        detection_path, segmentation_path = build_models(models_dir)
+        detection_session = make_session(detection_path, threads)
+        segmentation_session = make_session(segmentation_path, threads)
+
+        groups = {"model": inference_cases(detection_session, segmentation_session)}
+        for resolution in resolutions:
+            groups[resolution] = benchmark_cases(detection_session, segmentation_session, resolution)
+
+        results = {}
+        for group, cases in groups.items():
+            for name, func in cases.items():
+                key = f"{group}/{name}"
+                if only and not any(pattern in key for pattern in only):
+                    continue
+                results[key] = measure(func, repeat)
+                print(f"{key:<40} {results[key]['median_ms']:>10.3f} ms  {results[key]['ops_per_s']:>10.1f} ops/s", file=sys.stderr)
+
+    return {"environment": environment(threads), "results": results}
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    """
+    Benchmarks whose median latency regressed by more than `threshold` (a
+    fraction) against the baseline, as (name, baseline_ms, current_ms, ratio).
+    """
+    regressions = []
+    for name, result in current["results"].items():
+        reference = baseline["results"].get(name)
+        if reference is None or not reference["median_ms"]:
+            continue
+        ratio = result["median_ms"] / reference["median_ms"]
+        if ratio > 1.0 + threshold:
+            regressions.append((name, reference["median_ms"], result["median_ms"], ratio))
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the frame pipeline on synthetic models and frames")
+    parser.add_argument("--resolutions", nargs="+", default=list(RESOLUTIONS), choices=list(RESOLUTIONS))
+    parser.add_argument("--repeat", type=int, default=30, help="timed samples per benchmark")
+    parser.add_argument("--threads", type=int, default=1, help="OpenCV and ONNX Runtime threads (fixed for reproducibility)")
+    parser.add_argument("--only", nargs="+", help="run benchmarks whose name contains any of these substrings")
+    parser.add_argument("--output", help="write the results JSON here")
+    parser.add_argument("--baseline", help="compare against this baseline JSON and fail on regressions")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, help="write the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed median slowdown vs baseline, as a fraction")
+    args = parser.parse_args(argv)
+
+    current = run(args.resolutions, args.repeat, args.threads, args.only)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(current, f, indent=2, sort_keys=True)
+            print(f"Wrote {path}", file=sys.stderr)
+
+    if not args.baseline:
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    if baseline.get("environment", {}).get("threads") != current["environment"]["threads"]:
+        print("warning: baseline was recorded with a different thread count", file=sys.stderr)
+
+    regressions = compare(current, baseline, args.threshold)
+    for name, before, after, ratio in regressions:
+        print(f"REGRESSION {name}: {before:.3f} ms -> {after:.3f} ms ({(ratio - 1) * 100:+.1f}%)", file=sys.stderr)
+    if regressions:
+        return 1
+
+    print(f"No regressions beyond {args.threshold * 100:.0f}% against {args.baseline}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
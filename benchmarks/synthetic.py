@@ -0,0 +1,186 @@
+"""
+Synthetic ONNX models and frames for offline benchmarking.
+
+The models are tiny and deterministic but have the same I/O contract as the
+real weights under app/models/v1/, so every pre/post-processing function sees
+realistically shaped data:
+
+- detection:    images (N, 3, 320, 320) -> output (N, 6400, 5 + classes), YOLO-style
+                [cx, cy, w, h, objectness, class scores...] normalized to [0, 1]
+- segmentation: input (N, 3, 320, 320) -> output (N, 1, 320, 320) road probability
+
+Usage:
+    python -m benchmarks.synthetic --out app/models/v1
+"""
+import argparse
+import os
+
+import numpy as np
+import cv2
+import onnxruntime as ort
+
+RESOLUTIONS = {
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+    "4k": (3840, 2160),
+}
+
+DETECTION_MODEL = "object-detection.onnx"
+SEGMENTATION_MODEL = "road-segmentation.onnx"
+
+ROAD_GREY = 110
+
+
+def _onnx():
+    try:
+        import onnx
+    except ImportError as e:  # only needed to build the models
+        raise SystemExit("Building synthetic models requires the 'onnx' package (pip install onnx)") from e
+    return onnx
+
+
+def build_detection_model(path: str, num_classes: int = 80, input_size: int = 320, stride: int = 4, seed: int = 0):
+    """
+    One strided convolution per output cell, reshaped to (N, cells, 5 + classes)
+    and squashed by a sigmoid. Biases keep boxes small and objectness low so
+    only a few hundred candidates per frame pass the default 0.25 threshold.
+    """
+    onnx = _onnx()
+    from onnx import helper, numpy_helper, TensorProto
+
+    rng = np.random.default_rng(seed)
+    channels = 5 + num_classes
+    cells = (input_size // stride) ** 2
+
+    weights = (rng.standard_normal((channels, 3, stride, stride)) * 0.15).astype(np.float32)
+    weights[4] *= 4.0  # wider objectness spread, so the score depends on the content
+    bias = np.zeros(channels, dtype=np.float32)
+    bias[2:4] = -2.5  # box width/height ~8% of the frame
+    bias[4] = -0.5    # objectness: a few percent of the cells score >= 0.25
+    initializers = [
+        numpy_helper.from_array(weights, "W"),
+        numpy_helper.from_array(bias, "B"),
+        numpy_helper.from_array(np.array([0, channels, cells], dtype=np.int64), "shape"),
+    ]
+    nodes = [
+        helper.make_node("Conv", ["images", "W", "B"], ["features"], kernel_shape=[stride, stride], strides=[stride, stride]),
+        helper.make_node("Reshape", ["features", "shape"], ["flat"]),
+        helper.make_node("Transpose", ["flat"], ["cells"], perm=[0, 2, 1]),
+        helper.make_node("Sigmoid", ["cells"], ["output"]),
+    ]
+    graph = helper.make_graph(
+        nodes, "synthetic-detection",
+        [helper.make_tensor_value_info("images", TensorProto.FLOAT, ["N", 3, input_size, input_size])],
+        [helper.make_tensor_value_info("output", TensorProto.FLOAT, ["N", cells, channels])],
+        initializers,
+    )
+    _save(onnx, helper, graph, path)
+
+
+def build_segmentation_model(path: str, input_size: int = 320):
+    """
+    Road probability from local brightness: a 3x3 mean filter, then a peak
+    around the synthetic road grey, `sigmoid(2 - 40 * |mean - road|)`.
+    """
+    onnx = _onnx()
+    from onnx import helper, numpy_helper, TensorProto
+
+    initializers = [
+        numpy_helper.from_array(np.full((1, 3, 3, 3), 1.0 / 27.0, dtype=np.float32), "W"),
+        numpy_helper.from_array(np.array([-ROAD_GREY / 255.0], dtype=np.float32), "B"),
+        numpy_helper.from_array(np.array(-40.0, dtype=np.float32), "scale"),
+        numpy_helper.from_array(np.array(2.0, dtype=np.float32), "offset"),
+    ]
+    nodes = [
+        helper.make_node("Conv", ["input", "W", "B"], ["distance"], kernel_shape=[3, 3], pads=[1, 1, 1, 1]),
+        helper.make_node("Abs", ["distance"], ["abs_distance"]),
+        helper.make_node("Mul", ["abs_distance", "scale"], ["scaled"]),
+        helper.make_node("Add", ["scaled", "offset"], ["logits"]),
+        helper.make_node("Sigmoid", ["logits"], ["output"]),
+    ]
+    graph = helper.make_graph(
+        nodes, "synthetic-segmentation",
+        [helper.make_tensor_value_info("input", TensorProto.FLOAT, ["N", 3, input_size, input_size])],
+        [helper.make_tensor_value_info("output", TensorProto.FLOAT, ["N", 1, input_size, input_size])],
+        initializers,
+    )
+    _save(onnx, helper, graph, path)
+
+
+def _save(onnx, helper, graph, path: str):
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8  # loadable by older onnxruntime releases too
+    onnx.checker.check_model(model)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    onnx.save(model, path)
+
+
+def build_models(directory: str) -> tuple:
+    """
+    Write both synthetic models into `directory` using the app's file names.
+
+    Returns:
+        (detection_path, segmentation_path)
+    """
+    detection_path = os.path.join(directory, DETECTION_MODEL)
+    segmentation_path = os.path.join(directory, SEGMENTATION_MODEL)
+    build_detection_model(detection_path)
+    build_segmentation_model(segmentation_path)
+    return detection_path, segmentation_path
+
+
+def make_frame(resolution: str, seed: int = 0) -> np.ndarray:
+    """
+    Deterministic traffic-like BGR frame: sky, a grey road trapezoid with lane
+    markings, and coloured rectangles for vehicles, plus mild sensor noise so
+    JPEG/PNG encoders do representative work.
+    """
+    width, height = RESOLUTIONS[resolution]
+    rng = np.random.default_rng(seed)
+
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    frame[:] = (60, 120, 60)  # verge
+    frame[: height // 3] = (200, 170, 140)  # sky
+
+    road = np.array([[width * 0.42, height / 3], [width * 0.58, height / 3], [width * 0.95, height], [width * 0.05, height]], dtype=np.int32)
+    cv2.fillPoly(frame, [road], (ROAD_GREY, ROAD_GREY, ROAD_GREY))
+    for lane in (0.4, 0.6):
+        top = (int(width * (0.42 + 0.16 * lane)), height // 3)
+        bottom = (int(width * (0.05 + 0.9 * lane)), height)
+        cv2.line(frame, top, bottom, (230, 230, 230), max(2, width // 400))
+
+    scale = width / 1280
+    for _ in range(25):
+        y = int(rng.uniform(height * 0.4, height * 0.95))
+        depth = (y - height / 3) / (height * 2 / 3)
+        w, h = int(60 * scale * (0.4 + depth)), int(40 * scale * (0.4 + depth))
+        x = int(rng.uniform(width * 0.1, width * 0.9 - w))
+        color = tuple(int(c) for c in rng.integers(0, 255, 3))
+        cv2.rectangle(frame, (x, y - h), (x + w, y), color, -1)
+
+    noise = rng.integers(-6, 7, frame.shape, dtype=np.int16)
+    return np.clip(frame.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+
+def make_session(path: str, threads: int) -> ort.InferenceSession:
+    """
+    CPU session for a benchmark model, with `threads` intra-op threads and no
+    inter-op parallelism so timings are comparable between runs.
+    """
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = threads
+    options.inter_op_num_threads = 1
+    return ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic detection/segmentation ONNX models")
+    parser.add_argument("--out", default="app/models/v1", help="directory to write the models into")
+    args = parser.parse_args()
+
+    for path in build_models(args.out):
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import pytest
+
+from app.features.alerts import AlertEngine, ThresholdIndex
+
+
+class RecordingDispatcher:
+    def __init__(self):
+        self.sent = []
+
+    def submit(self, url, event):
+        self.sent.append((url, event["event"]))
+
+
+def events(engine, road_id, score, timestamp):
+    return [event["event"] for event in engine.evaluate(road_id, {"congestion_score": score}, timestamp)]
+
+
+def test_threshold_index_matching():
+    index = ThresholdIndex()
+    for threshold, alert_id in [(0.5, "b"), (0.2, "a"), (0.8, "c"), (0.5, "b2")]:
+        index.add(threshold, alert_id)
+
+    assert index.matching(0.5, "above") == ["a", "b", "b2"]
+    assert index.matching(0.5, "below") == ["b", "b2", "c"]
+    assert index.matching(0.1, "above") == []
+
+    index.remove(0.5, "b2")
+    assert index.ids == ["a", "b", "c"]
+    assert len(index) == 3
+
+
+def test_fires_once_and_resolves_past_hysteresis():
+    dispatcher = RecordingDispatcher()
+    engine = AlertEngine(dispatcher)
+    alert = engine.create("r1", 0.6, hysteresis=0.1, webhook_url="http://hook")
+
+    assert events(engine, "r1", 0.5, 0) == []
+    assert events(engine, "r1", 0.7, 1) == ["triggered"]
+    assert events(engine, "r1", 0.9, 2) == []
+    assert events(engine, "r1", 0.55, 3) == []  # within the hysteresis band
+    assert engine.describe(alert["alert_id"])["state"] == "firing"
+    assert events(engine, "r1", 0.45, 4) == ["resolved"]
+    assert engine.describe(alert["alert_id"])["state"] == "ok"
+    assert dispatcher.sent == [("http://hook", "triggered"), ("http://hook", "resolved")]
+
+
+def test_below_condition():
+    engine = AlertEngine()
+    engine.create("r1", 5, metric="vehicle_count", condition="below")
+    assert [e["event"] for e in engine.evaluate("r1", {"vehicle_count": 3}, 0)] == ["triggered"]
+    assert [e["event"] for e in engine.evaluate("r1", {"vehicle_count": 6}, 1)] == ["resolved"]
+
+
+def test_min_duration_requires_condition_to_hold():
+    engine = AlertEngine()
+    alert_id = engine.create("r1", 0.5, min_duration_seconds=10)["alert_id"]
+
+    assert events(engine, "r1", 0.8, 0) == []
+    assert engine.describe(alert_id)["state"] == "pending"
+    assert events(engine, "r1", 0.2, 5) == []
+    assert engine.describe(alert_id)["state"] == "ok"
+
+    assert events(engine, "r1", 0.8, 10) == []
+    assert events(engine, "r1", 0.8, 20) == ["triggered"]
+
+
+def test_cooldown_suppresses_retrigger_and_its_resolve():
+    engine = AlertEngine()
+    alert_id = engine.create("r1", 0.5, cooldown_seconds=60)["alert_id"]
+
+    assert events(engine, "r1", 0.8, 0) == ["triggered"]
+    assert events(engine, "r1", 0.2, 10) == ["resolved"]
+    assert events(engine, "r1", 0.8, 20) == []
+    assert engine.describe(alert_id)["state"] == "firing"
+    assert events(engine, "r1", 0.2, 30) == []
+    assert events(engine, "r1", 0.8, 70) == ["triggered"]
+
+
+def test_alerts_are_scoped_to_their_road():
+    engine = AlertEngine()
+    engine.create("r1", 0.5)
+    assert events(engine, "r2", 0.9, 0) == []
+    assert events(engine, "r1", 0.9, 0) == ["triggered"]
+
+
+def test_update_of_match_fields_resets_state():
+    engine = AlertEngine()
+    alert_id = engine.create("r1", 0.5)["alert_id"]
+    events(engine, "r1", 0.8, 0)
+
+    assert engine.update(alert_id, name="renamed")["state"] == "firing"
+    assert engine.update(alert_id, threshold=0.9)["state"] == "ok"
+    assert events(engine, "r1", 0.8, 1) == []
+    assert events(engine, "r1", 0.95, 2) == ["triggered"]
+
+
+def test_disabled_and_deleted_alerts_are_not_evaluated():
+    engine = AlertEngine()
+    alert_id = engine.create("r1", 0.5, enabled=False)["alert_id"]
+    assert events(engine, "r1", 0.8, 0) == []
+
+    engine.update(alert_id, enabled=True)
+    assert events(engine, "r1", 0.8, 1) == ["triggered"]
+
+    engine.delete(alert_id)
+    assert events(engine, "r1", 0.8, 2) == []
+    assert engine.stats()["roads"] == 0
+    with pytest.raises(KeyError):
+        engine.describe(alert_id)
+
+
+@pytest.mark.parametrize("fields", [{"metric": "speed"}, {"condition": "equal"}, {"hysteresis": -1}])
+def test_invalid_alerts_are_rejected(fields):
+    with pytest.raises(ValueError):
+        AlertEngine().create("r1", 0.5, **fields)
@@ -0,0 +1,65 @@
+import time
+
+import numpy as np
+
+from app.core.cache import ResultCache, frame_hash
+
+
+def test_lru_eviction_by_entries():
+    cache = ResultCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "b" is now least recently used
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.evictions == 1
+
+
+def test_eviction_by_bytes_and_oversized_values():
+    cache = ResultCache(max_bytes=3000)
+    cache.put("a", np.zeros(1000, dtype=np.uint8))
+    cache.put("b", np.zeros(1000, dtype=np.uint8))
+    cache.put("c", np.zeros(1500, dtype=np.uint8))
+    assert cache.get("a") is None
+    assert cache.bytes <= 3000
+
+    cache.put("huge", np.zeros(4000, dtype=np.uint8))
+    assert cache.get("huge") is None
+
+
+def test_expired_entries_are_misses():
+    cache = ResultCache(ttl_seconds=0.05)
+    cache.put("a", 1)
+    assert cache.get("a") == 1
+    time.sleep(0.06)
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_key_includes_model_version_frame_shape_and_roi():
+    cache = ResultCache(model_version="v1")
+    key = cache.key("detection", "cam", (720, 1280, 3), "ab")
+    assert key != cache.key("detection", "cam", (1080, 1920, 3), "ab")
+    assert key != cache.key("detection", "cam", (720, 1280, 3), "ab", roi=(0, 200, 1280, 720))
+    cache.model_version = "v2"
+    assert key != cache.key("detection", "cam", (720, 1280, 3), "ab")
+
+
+def test_frames_without_camera_id_are_not_cached():
+    cache = ResultCache()
+    assert cache.key("detection", None, (720, 1280, 3), "ab") is None
+    assert cache.key("detection", "", (720, 1280, 3), "ab") is None
+
+
+def test_dhash_ignores_small_noise():
+    rng = np.random.default_rng(0)
+    frame = np.repeat(np.linspace(0, 255, 640, dtype=np.float32)[None, :], 360, axis=0)
+    frame = np.stack([frame] * 3, axis=2).astype(np.uint8)
+    noisy = np.clip(frame.astype(np.int16) + rng.integers(-2, 3, frame.shape), 0, 255).astype(np.uint8)
+
+    assert frame_hash(frame) == frame_hash(noisy)
+    assert frame_hash(frame, mode="exact") != frame_hash(noisy, mode="exact")
+    assert frame_hash(frame) != frame_hash(frame[:, ::-1])
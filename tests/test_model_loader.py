@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from app.core.model_loader import load_onnx_model, run_bound
+
+pytest.importorskip("onnx")
+from benchmarks.synthetic import build_segmentation_model  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def session(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("models") / "road-segmentation.onnx")
+    build_segmentation_model(path, input_size=64)
+    return load_onnx_model(path)
+
+
+def test_run_bound_matches_run(session):
+    feed = {"input": np.random.default_rng(0).random((3, 3, 64, 64), dtype=np.float32)}
+    expected = session.run(None, feed)
+    outputs = run_bound(session, None, feed)
+    assert len(outputs) == 1
+    np.testing.assert_allclose(outputs[0], expected[0], rtol=1e-6)
+
+
+def test_run_bound_writes_into_allocated_arrays(session):
+    allocated = []
+
+    def allocate(shape, dtype):
+        allocated.append(np.full(shape, -1.0, dtype=dtype))
+        return allocated[-1]
+
+    feed = {"input": np.zeros((2, 3, 64, 64), dtype=np.float32)}
+    outputs = run_bound(session, None, feed, allocate=allocate)
+    assert outputs[0] is allocated[0]
+    assert allocated[0].shape == (2, 1, 64, 64)
+    assert (allocated[0] >= 0).all()
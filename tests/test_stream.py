@@ -0,0 +1,53 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from app.features.stream import StreamManager
+
+
+class FailingSession:
+    def __getattr__(self, name):
+        raise RuntimeError("model unavailable")
+
+
+@pytest.fixture
+def video(tmp_path):
+    path = str(tmp_path / "road.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 30, (64, 48))
+    for i in range(300):  # 10 s of playback, paced to real time
+        writer.write(np.full((48, 64, 3), i % 255, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+
+def capture_threads(road_id):
+    return [t for t in threading.enumerate() if t.name == f"stream-{road_id}-capture" and t.is_alive()]
+
+
+def test_failed_pipeline_releases_its_source_and_is_replaced_cleanly(video):
+    streams = StreamManager(FailingSession(), FailingSession())
+    streams.register("r1", video, target_fps=30)
+    streams.start("r1")
+    failed = streams.roads["r1"]["pipeline"]
+    old_threads = list(failed._threads)
+
+    assert wait_for(lambda: failed.status == "error")
+    assert failed.error == "model unavailable"
+    assert wait_for(lambda: not any(t.is_alive() for t in old_threads))
+
+    streams.start("r1")
+    assert streams.roads["r1"]["pipeline"] is not failed
+    assert not any(t.is_alive() for t in old_threads)
+
+    streams.stop_all()
+    assert wait_for(lambda: not capture_threads("r1"))
@@ -0,0 +1,115 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from app.core.timeseries import COLUMNS, CongestionStore, RingSeries, summarize
+from app.routes.roads import parse_time_range
+
+NOW = datetime(2026, 5, 1, 12, 0, tzinfo=timezone.utc)
+T0 = time.time() // 3600 * 3600 - 86400  # start of an hour within the retention period
+
+
+def row(value: float) -> np.ndarray:
+    values = np.zeros(len(COLUMNS), dtype=np.float32)
+    values[0] = value
+    values[COLUMNS.index("samples")] = 1.0
+    return values
+
+
+def test_ring_range_across_wraparound():
+    ring = RingSeries(4, complete=True)
+    for t in range(6):
+        ring.append(float(t), row(t))
+
+    assert not ring.complete
+    assert ring.oldest == 2.0
+    timestamps, values = ring.range(1.0, 4.0)
+    assert timestamps.tolist() == [2.0, 3.0, 4.0]
+    assert values[:, 0].tolist() == [2.0, 3.0, 4.0]
+    assert ring.covers(2.0) and not ring.covers(1.0)
+
+
+def test_minute_rollup_is_sample_weighted():
+    store = CongestionStore()
+    for i, (cars, score) in enumerate([(2, 0.1), (4, 0.3), (6, 0.2)]):
+        store.record("r1", T0 + 10 * i, {"car": cars}, score)
+    store.record("r1", T0 + 60, {"car": 1}, 0.0)  # closes the first minute
+
+    window = store.query("r1", T0, T0 + 59, "1m")
+    assert window["timestamps"].tolist() == [T0]
+    closed = dict(zip(COLUMNS, window["values"][0].tolist()))
+    assert closed["vehicle_count"] == pytest.approx(4.0)
+    assert closed["car"] == pytest.approx(4.0)
+    assert closed["congestion_score"] == pytest.approx(0.2)
+    assert closed["congestion_score_max"] == pytest.approx(0.3)
+    assert closed["samples"] == 3
+
+
+def test_rollup_query_includes_open_bucket():
+    store = CongestionStore()
+    store.record("r1", T0 + 5, {"car": 3}, 0.1)
+    store.record("r1", T0 + 15, {"car": 1}, 0.1)
+    window = store.query("r1", T0, T0 + 3600, "1m")
+    assert window["timestamps"].tolist() == [T0]
+    assert summarize(window["values"])["vehicle_count"] == 2.0
+    assert summarize(window["values"])["samples"] == 2
+
+
+def test_auto_resolution_falls_back_once_raw_is_overwritten():
+    store = CongestionStore(raw_capacity=10)
+    for i in range(20):
+        store.record("r1", T0 + 30 * i, {"car": 1}, 0.0)
+
+    assert store.query("r1", T0 + 500, T0 + 600)["resolution"] == "raw"
+    assert store.query("r1", T0, T0 + 600)["resolution"] == "1m"
+    assert store.query("unknown", T0, T0 + 600)["values"].shape == (0, len(COLUMNS))
+
+
+def test_clock_stepping_back_keeps_rings_sorted():
+    store = CongestionStore()
+    store.record("r1", T0 + 10, {"car": 1}, 0.0)
+    store.record("r1", T0 + 5, {"car": 2}, 0.0)
+    timestamps = store.query("r1", T0, T0 + 60, "raw")["timestamps"]
+    assert timestamps.tolist() == [T0 + 10, T0 + 10]
+
+
+def test_rollups_survive_restart(tmp_path):
+    path = str(tmp_path / "history.sqlite")
+    store = CongestionStore(path=path, flush_seconds=0.01)
+    store.open()
+    for minute in range(3):
+        store.record("r1", T0 + 60 * minute, {"bus": minute}, 0.5)
+    store.close()
+
+    reopened = CongestionStore(path=path)
+    reopened.open()
+    try:
+        window = reopened.query("r1", T0, T0 + 3600)
+        assert window["resolution"] == "1m"
+        assert window["timestamps"].tolist() == [T0, T0 + 60]
+        assert window["values"][:, COLUMNS.index("bus")].tolist() == [0.0, 1.0]
+    finally:
+        reopened.close()
+
+
+def test_summarize_empty():
+    assert summarize(np.empty((0, len(COLUMNS)), dtype=np.float32)) == {"samples": 0}
+
+
+@pytest.mark.parametrize("value, start, end", [
+    ("PT15M", NOW - timedelta(minutes=15), NOW),
+    ("2026-05-01T10:00:00Z/2026-05-01T11:00:00Z", NOW - timedelta(hours=2), NOW - timedelta(hours=1)),
+    ("2026-05-01T10:00:00/PT30M", NOW - timedelta(hours=2), NOW - timedelta(hours=1, minutes=30)),
+    ("P1D/2026-05-01T12:00:00+00:00", NOW - timedelta(days=1), NOW),
+    ("2026-05-01T13:00:00+02:00/", NOW - timedelta(hours=1), NOW),
+])
+def test_parse_time_range(value, start, end):
+    assert parse_time_range(value, now=NOW) == (start, end)
+
+
+@pytest.mark.parametrize("value", ["P", "PT5X", "2026-05-01T12:00:00Z/2026-05-01T11:00:00Z", "yesterday"])
+def test_parse_time_range_rejects_invalid(value):
+    with pytest.raises(ValueError):
+        parse_time_range(value, now=NOW)
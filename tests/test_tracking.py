@@ -0,0 +1,90 @@
+import numpy as np
+
+from app.features.detect import DETECTION_DTYPE
+from app.features.tracking import CountingLine, Tracker, box_iou_matrix, greedy_match
+
+
+def detections(*boxes, class_id=2):
+    dets = np.zeros(len(boxes), dtype=DETECTION_DTYPE)
+    dets["box"] = np.array(boxes).reshape(-1, 4)
+    dets["score"] = 0.9
+    dets["class"] = class_id
+    return dets
+
+
+def test_box_iou_matrix():
+    iou = box_iou_matrix([[0, 0, 10, 10]], [[0, 0, 10, 10], [5, 0, 15, 10], [20, 20, 30, 30]])
+    np.testing.assert_allclose(iou, [[1.0, 1 / 3, 0.0]], rtol=1e-6)
+
+
+def test_greedy_match_prefers_highest_iou():
+    cost = np.array([[0.9, 0.8], [0.85, 0.1]])
+    matches, rows, cols = greedy_match(cost, threshold=0.3)
+    assert matches.tolist() == [[0, 0]]
+    assert rows.tolist() == [1] and cols.tolist() == [1]
+
+
+def test_track_keeps_id_and_is_confirmed_after_min_hits():
+    tracker = Tracker(min_hits=2)
+    assert len(tracker.update(detections([100, 100, 140, 130]), 0.0)) == 0
+
+    tracks = tracker.update(detections([104, 100, 144, 130]), 0.1)
+    assert tracks["track_id"].tolist() == [1]
+    assert tracker.stats()["unique_vehicles"] == 1
+
+    tracks = tracker.update(detections([108, 100, 148, 130]), 0.2)
+    assert tracks["track_id"].tolist() == [1]
+
+
+def test_tracks_only_match_their_class():
+    tracker = Tracker(min_hits=1)
+    tracker.update(detections([100, 100, 140, 130], class_id=2), 0.0)
+    tracks = tracker.update(detections([100, 100, 140, 130], class_id=7), 0.1)
+    assert sorted(tracks["track_id"].tolist()) == [1, 2]
+
+
+def test_stale_tracks_are_dropped():
+    tracker = Tracker(min_hits=1, max_age=1)
+    tracker.update(detections([100, 100, 140, 130]), 0.0)
+    tracker.update(detections(), 0.1)
+    assert len(tracker) == 1
+    tracker.update(detections(), 0.2)
+    assert len(tracker) == 0
+
+
+def test_crossing_made_by_correction_is_counted():
+    # Center 190 -> 205 across x=200, then the vehicle stops (queue at a stop line)
+    line = CountingLine(200, 0, 200, 500)
+    tracker = Tracker(min_hits=2, counting_line=line)
+    tracker.update(detections([170, 100, 210, 130]), 0.0)
+    tracker.update(detections([185, 100, 225, 130]), 0.1)
+    for k in range(2, 6):
+        tracker.update(detections([185, 100, 225, 130]), k * 0.1)
+
+    assert line.total == 1
+    assert line.per_class == {2: 1}
+
+
+def test_crossing_during_predicted_frames_is_counted_once():
+    line = CountingLine(200, 0, 200, 500)
+    tracker = Tracker(min_hits=2, counting_line=line)
+    for k in range(3):
+        tracker.update(detections([140 + 10 * k, 100, 180 + 10 * k, 130]), k * 0.1)
+    for k in range(3, 12):
+        tracker.predict(k * 0.1)
+    tracker.update(detections([250, 100, 290, 130]), 1.2)
+
+    assert line.total == 1
+
+
+def test_counted_ids_are_forgotten_when_tracks_retire():
+    line = CountingLine(200, 0, 200, 500)
+    tracker = Tracker(min_hits=2, max_age=0, counting_line=line)
+    tracker.update(detections([170, 100, 210, 130]), 0.0)
+    tracker.update(detections([185, 100, 225, 130]), 0.1)
+    assert line.counted == {1}
+
+    tracker.update(detections(), 0.2)
+    assert len(tracker) == 0
+    assert line.counted == set()
+    assert line.total == 1
@@ -0,0 +1,29 @@
+import numpy as np
+
+from app.routes.violations import road_coverage
+
+
+def test_road_coverage_at_mask_resolution():
+    # Road on the left half of a 100x100 mask for a 200x400 (h x w) image
+    road = np.zeros((100, 100), dtype=bool)
+    road[:, :50] = True
+    boxes = np.array([
+        [0, 0, 100, 100],     # fully on road
+        [300, 0, 400, 100],   # fully off road
+        [150, 0, 250, 100],   # half on road
+        [500, 500, 600, 600], # outside the image
+    ])
+
+    coverage = road_coverage(boxes, road, (200, 400))
+    np.testing.assert_allclose(coverage[:3], [1.0, 0.0, 0.5], atol=0.02)
+    assert np.isnan(coverage[3])
+
+
+def test_road_coverage_matches_direct_count():
+    rng = np.random.default_rng(1)
+    road = rng.random((80, 80)) > 0.4
+    x1, y1 = rng.integers(0, 60, 20), rng.integers(0, 60, 20)
+    boxes = np.stack([x1, y1, x1 + rng.integers(1, 20, 20), y1 + rng.integers(1, 20, 20)], axis=1)
+
+    expected = [road[b[1]:b[3], b[0]:b[2]].mean() for b in boxes]
+    np.testing.assert_allclose(road_coverage(boxes, road, (80, 80)), expected, rtol=1e-6)